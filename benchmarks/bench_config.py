@@ -0,0 +1,65 @@
+"""
+Measures bringing a vehicle side server up from a fleet configuration with StanagServer.setup_from_config, from
+compiling the configuration to the sockets, here a LoopbackBus, being ready, as the fleet grows. Every vehicle
+hosts the four stations of one station set and reports its own tail number and call sign,
+run from the repository root with:
+    PYTHONPATH=. python benchmarks/bench_config.py
+"""
+
+import asyncio
+import logging
+import time
+
+from stanag4586vsm.stanag_server import *
+
+
+def fleet_config(vehicle_count):
+
+    return {
+        'server': {'mode': 'vehicle', 'metrics': False},
+        'station_sets': {
+            'ugv': [
+                {'name': 'base', 'station': 0},
+                {'name': 'eo', 'station': 1, 'payload_type': 'EOIR'},
+                {'name': 'mast', 'station': 2, 'payload_type': 'MAST'},
+                {'name': 'lrf', 'station': 4, 'payload_type': 'LRF'},
+            ],
+        },
+        'vehicles': [{
+            'first_vehicle_id': 1,
+            'count': vehicle_count,
+            'vehicle_type': 'UGV',
+            'stations': 'ugv',
+            'tail_number': 'UGV-{vehicle_id:05d}',
+            'call_sign': 'UNIT{index}',
+        }],
+    }
+
+
+async def startup(vehicle_count):
+
+    loop = asyncio.get_running_loop()
+    config = fleet_config(vehicle_count)
+
+    started = time.perf_counter()
+    server = StanagServer(logging.ERROR)
+    await server.setup_from_config(loop, config, transport_bus=LoopbackBus(logging.ERROR))
+    elapsed = time.perf_counter() - started
+
+    await server.cleanup_service()
+
+    return elapsed
+
+
+async def main():
+
+    print("{:>8} {:>9} {:>12} {:>16}".format("vehicles", "stations", "startup ms", "us per station"))
+
+    for vehicle_count in (10, 100, 1000, 10000):
+        elapsed = await startup(vehicle_count)
+        stations = vehicle_count * 4
+        print("{:>8} {:>9} {:>12.1f} {:>16.1f}".format(vehicle_count, stations, elapsed * 1e3, elapsed * 1e6 / stations))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Measures the per packet cost of StanagProtocol.datagram_received.
+
+The legacy implementation is reproduced below so that the before and after numbers
+can be compared on the same machine, run from the repository root with:
+    PYTHONPATH=. python benchmarks/bench_decode.py
+"""
+
+import logging
+import timeit
+
+from stanag4586vsm.stanag_protocol import *
+
+ITERATIONS = 200000
+
+
+class NullLoop:
+    """Stands in for the asyncio loop, the scheduled callback is never run."""
+
+    def call_soon(self, callback, *args):
+        pass
+
+
+class LegacyStanagProtocol(StanagProtocol):
+    """datagram_received as it was before the decoder registry was introduced"""
+
+    def datagram_received(self, data, addr):
+
+        if not self.rx_enabled:
+            self.logger.warn("Rx is disabled and yet got a message on this socket.")
+            return
+
+        self.logger.debug("Got packet of len [{}]".format(len(data)))
+
+        wrapper = MessageWrapper(data)
+        self.logger.debug("Got message [{:}]".format(wrapper.message_type))
+
+        msg = None
+
+        known_messages = {
+            1 : Message01,
+            20 : Message20,
+            21 : Message21,
+            200 : Message200,
+            201 : Message201,
+            300 : Message300,
+            301 : Message301,
+            302 : Message302,
+            1200 : Message1200,
+            20000 : Message20000,
+            20010 : Message20010,
+            20020 : Message20020,
+            20030 : Message20030,
+            20040 : Message20040,
+        }
+
+        if wrapper.message_type in known_messages.keys():
+            msg_type_to_instantiate = known_messages[wrapper.message_type]
+            msg = msg_type_to_instantiate(data[MessageWrapper.MSGLEN:])
+
+        if msg is not None:
+            self.logger.debug("callback scheduled")
+            self.loop.call_soon(self.on_msg_rx_callback, wrapper, msg)
+
+
+def make_datagram():
+    msg01 = Message01(Message01.MSGNULL)
+    msg01.make_discovery_message(0xA0)
+
+    wrapper = MessageWrapper(MessageWrapper.MSGNULL)
+    return wrapper.wrap_message(1, 1, msg01, False)
+
+
+def measure(protocol_class, data):
+    protocol = protocol_class(NullLoop(), logging.INFO, None, None)
+    seconds = timeit.timeit(lambda: protocol.datagram_received(data, None), number=ITERATIONS)
+    return seconds / ITERATIONS * 1e9
+
+
+if __name__ == "__main__":
+    data = make_datagram()
+
+    before = measure(LegacyStanagProtocol, data)
+    after = measure(StanagProtocol, data)
+
+    print("legacy decode  : {:8.1f} ns/packet".format(before))
+    print("registry decode: {:8.1f} ns/packet".format(after))
+    print("speedup        : {:8.2f}x".format(before / after))
@@ -0,0 +1,62 @@
+"""
+Measures the cost of routing a unicast message to a station in StanagServer.on_msg_rx
+as the number of payload stations on the vehicle grows.
+
+The legacy linear scan over every entity is reproduced for comparison, run from the
+repository root with:
+    PYTHONPATH=. python benchmarks/bench_dispatch.py
+"""
+
+import logging
+import timeit
+
+from stanag4586vsm.stanag_server import *
+from stanag4586edav1.message200 import *
+
+ITERATIONS = 20000
+STATION_COUNTS = [4, 16, 64, 256]
+
+
+def make_server(station_count):
+    server = StanagServer(logging.INFO)
+
+    for station_id in range(station_count):
+        server.add_entity("station{}".format(station_id), ControllableEntity(
+            None, logging.INFO, station_id, 0, 0, 0, 0, server.tx_data))
+
+    return server
+
+
+def make_message(station_id):
+    msg200 = Message200(Message200.MSGNULL)
+    msg200.station_number = station_id
+
+    wrapper = MessageWrapper(MessageWrapper.MSGNULL)
+    wrapper.wrap_message(1, 200, msg200, False)
+
+    return wrapper, msg200
+
+
+def legacy_dispatch(entities, wrapper, msg):
+    """The linear scan on_msg_rx fell back to for every message"""
+    for entity in entities:
+        if True == entity.handle_message(wrapper, msg):
+            return
+
+
+if __name__ == "__main__":
+
+    print("{:>9} {:>14} {:>14}".format("stations", "legacy ns/msg", "indexed ns/msg"))
+
+    for station_count in STATION_COUNTS:
+        server = make_server(station_count)
+        entities = [server.get_entity("station{}".format(i)) for i in range(station_count)]
+
+        # address the last station, the worst case for the linear scan
+        wrapper, msg = make_message(station_count - 1)
+
+        legacy = timeit.timeit(lambda: legacy_dispatch(entities, wrapper, msg), number=ITERATIONS)
+        indexed = timeit.timeit(lambda: server.on_msg_rx(wrapper, msg), number=ITERATIONS)
+
+        print("{:>9} {:>14.1f} {:>14.1f}".format(
+            station_count, legacy / ITERATIONS * 1e9, indexed / ITERATIONS * 1e9))
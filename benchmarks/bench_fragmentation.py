@@ -0,0 +1,84 @@
+"""
+Measures the throughput of large Message 20020 query responses, from 1 KB to 1 MB, sent as Message 20900
+fragments over the LoopbackBus and rebuilt on the cucs side. A lossy run drops the given share of the
+fragments on the bus, the missing ones are recovered through selective retransmit requests,
+run from the repository root with:
+    PYTHONPATH=. python benchmarks/bench_fragmentation.py
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+from stanag4586vsm.stanag_server import *
+from stanag4586edav1.message20010 import *
+from stanag4586vsm.fragmentation import FRAGMENT_MESSAGE_TYPE
+
+_OFFSET_MESSAGE_TYPE = MessageWrapper.message_type.offset
+
+
+class LossyBus(LoopbackBus):
+    """Drops a share of the fragments, the other datagrams are always delivered"""
+
+    def __init__(self, debug_level, loss):
+        super().__init__(debug_level)
+        self.loss = loss
+
+    def deliver(self, group, data, source = None):
+        if self.loss > 0 and int.from_bytes(data[_OFFSET_MESSAGE_TYPE:_OFFSET_MESSAGE_TYPE + 4], 'big') == \
+                FRAGMENT_MESSAGE_TYPE and random.random() < self.loss:
+            return
+        super().deliver(group, data, source)
+
+
+async def run(size, loss, rounds):
+
+    loop = asyncio.get_running_loop()
+    bus = LossyBus(logging.ERROR, loss)
+    response = "x" * size
+
+    vehicle = StanagServer(logging.ERROR)
+    await vehicle.setup_service(loop, StanagServer.MODE_VEHICLE, metrics=False, transport_bus=bus,
+        fragmentation_options={})
+    vehicle.get_entity('eo').register_query_handler(Message20010.QUERY_TYPE_SEND_CONFIG, lambda entity, msg: response)
+
+    cucs = StanagServer(logging.ERROR)
+    await cucs.setup_service(loop, StanagServer.MODE_CUCS, metrics=False, transport_bus=bus,
+        discovery_options={'burst_count': 1, 'min_interval': 3600.0, 'max_interval': 3600.0},
+        fragmentation_options={'nack_interval': 0.01})
+    controller = cucs.get_entity_controller()
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        msg = await controller.query_request_async(0, 0x1, timeout=5.0, retries=0)
+        assert len(get_query_response(msg)) == size
+    elapsed = time.perf_counter() - started
+
+    stats = cucs.get_fragmentation_stats()
+
+    await vehicle.cleanup_service()
+    await cucs.cleanup_service()
+
+    return elapsed, stats
+
+
+async def main():
+
+    random.seed(4586)
+
+    print("{:>9} {:>6} {:>12} {:>10} {:>11} {:>9}".format(
+        "response", "loss", "ms/response", "MB/s", "fragments", "nacks"))
+
+    for size in (1024, 10 * 1024, 100 * 1024, 1024 * 1024):
+        rounds = max(5, (4 * 1024 * 1024) // size)
+        rounds = min(rounds, 500)
+        for loss in (0.0, 0.01, 0.05):
+            elapsed, stats = await run(size, loss, rounds)
+            print("{:>8}K {:>5.0f}% {:>12.2f} {:>10.1f} {:>11} {:>9}".format(
+                size // 1024, loss * 100, elapsed * 1e3 / rounds, size * rounds / elapsed / 1e6,
+                stats['rx_fragments'] // rounds, stats['rx_nacks_sent']))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
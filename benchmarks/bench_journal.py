@@ -0,0 +1,71 @@
+"""
+Measures how long a vehicle side server takes to restore control ownership from its OwnershipJournal as the
+journal grows, before and after compaction, and the cost of recording a change. The journal is filled with
+grants and releases churning over 1000 stations and 10 cucs, run from the repository root with:
+    PYTHONPATH=. python benchmarks/bench_journal.py
+"""
+
+import logging
+import os
+import random
+import tempfile
+import time
+
+from stanag4586vsm.ownership_journal import *
+
+STATION_COUNT = 1000
+CUCS_IDS = [0xA0 + index for index in range(10)]
+
+
+def fill(path, record_count):
+    """Returns the seconds per recorded change"""
+
+    journal = OwnershipJournal(path, logging.ERROR, compact_threshold=2 ** 62)
+    generator = random.Random(record_count)
+
+    started = time.perf_counter()
+    changes = 0
+    while journal.get_stats()['records'] < record_count:
+        station = generator.randrange(STATION_COUNT)
+        controller = generator.choice([0] + CUCS_IDS)
+        monitors = generator.sample(CUCS_IDS, generator.randrange(3))
+        journal.record(station // 4, station % 4, controller, monitors)
+        changes += 1
+    elapsed = time.perf_counter() - started
+
+    journal.close()
+    return elapsed / changes
+
+
+def restore(path):
+
+    started = time.perf_counter()
+    journal = OwnershipJournal(path, logging.ERROR, compact_threshold=2 ** 62)
+    elapsed = time.perf_counter() - started
+
+    stats = journal.get_stats()
+    return journal, elapsed, stats
+
+
+if __name__ == "__main__":
+
+    print("{:>10} {:>12} {:>12} {:>14} {:>16} {:>14}".format(
+        "records", "size KiB", "restore ms", "record us", "compacted to", "restore ms"))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for record_count in (1000, 10000, 100000, 1000000):
+            path = os.path.join(directory, "ownership-{}.journal".format(record_count))
+
+            record_cost = fill(path, record_count)
+            size = os.path.getsize(path)
+
+            journal, elapsed, stats = restore(path)
+            journal.compact()
+            journal.close()
+
+            journal, compacted_elapsed, compacted_stats = restore(path)
+            journal.close()
+
+            print("{:>10} {:>12.0f} {:>12.1f} {:>14.1f} {:>16} {:>14.1f}".format(
+                stats['records'], size / 1024, elapsed * 1e3, record_cost * 1e6,
+                compacted_stats['records'], compacted_elapsed * 1e3))
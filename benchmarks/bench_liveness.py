@@ -0,0 +1,59 @@
+"""
+Measures the cost of a liveness tick of the EntityController with 10 to 10000 tracked vehicles, all of
+them alive, against a periodic full scan of the last seen times. Traffic pushes deadlines back on the
+timer wheel and is not part of the tick, run from the repository root with:
+    PYTHONPATH=. python benchmarks/bench_liveness.py
+"""
+
+import time
+
+from stanag4586vsm.timer_wheel import TimerWheel
+
+TIMEOUT = 15.0
+TICK = 0.5
+TICKS = 2000
+VEHICLE_COUNTS = [10, 100, 1000, 10000]
+
+
+def full_scan(last_seen, now):
+    return [key for key, seen in last_seen.items() if seen + TIMEOUT <= now]
+
+
+if __name__ == "__main__":
+
+    print("{:>9} {:>14} {:>14} {:>8}".format("vehicles", "scan us/tick", "wheel us/tick", "lost"))
+
+    for vehicle_count in VEHICLE_COUNTS:
+
+        now = 0.0
+        last_seen = {}
+        wheel = TimerWheel(TICK, now)
+        for vehicle_id in range(vehicle_count):
+            last_seen[vehicle_id] = now
+            wheel.schedule(vehicle_id, now + TIMEOUT)
+
+        scan_seconds = 0.0
+        wheel_seconds = 0.0
+        lost = 0
+        next_vehicle = 0
+
+        for _ in range(TICKS):
+            now += TICK
+
+            # every vehicle answers a discovery round every 5 seconds, spread over the ticks
+            for _ in range(max(1, int(vehicle_count * TICK / 5.0))):
+                vehicle_id = next_vehicle
+                next_vehicle = (next_vehicle + 1) % vehicle_count
+                last_seen[vehicle_id] = now
+                wheel.schedule(vehicle_id, now + TIMEOUT)
+
+            started = time.perf_counter()
+            full_scan(last_seen, now)
+            scan_seconds += time.perf_counter() - started
+
+            started = time.perf_counter()
+            lost += len(wheel.advance(now))
+            wheel_seconds += time.perf_counter() - started
+
+        print("{:>9} {:>14.2f} {:>14.2f} {:>8}".format(
+            vehicle_count, scan_seconds / TICKS * 1e6, wheel_seconds / TICKS * 1e6, lost))
@@ -0,0 +1,102 @@
+"""
+Compares the per entity LOI path with the LoiTable on a vehicle side StanagServer hosting many stations:
+the loi_granted and loi_authorized of one cucs on every station, and a handover moving control and monitoring
+of every station from one cucs to another. The per entity handover goes through handle_loi_request, which also
+encodes the Message 21 reply, the table applies the whole batch and updates the entities that changed,
+run from the repository root with:
+    PYTHONPATH=. python benchmarks/bench_loi_table.py
+"""
+
+import logging
+import timeit
+
+from stanag4586vsm.stanag_server import *
+from stanag4586vsm.stanag_protocol import *
+
+ITERATIONS = 5
+CUCS_FROM = 0xA0
+CUCS_TO = 0xB0
+STATIONS = [('base', 0x0, None), ('eo', 0x1, Message300.PAYLOAD_TYPE_EOIR), ('mast', 0x2, Message300.PAYLOAD_TYPE_MAST),
+    ('lrf', 0x4, Message300.PAYLOAD_TYPE_LRF)]
+
+
+def make_server(vehicle_count):
+
+    server = StanagServer(logging.ERROR)
+    for vehicle_id in range(vehicle_count):
+        server.add_vehicle(vehicle_id, stations = STATIONS)
+
+    entities = [server.get_entity(name, vehicle_id) for vehicle_id in range(vehicle_count) for name, _, _ in STATIONS]
+    return server, entities
+
+
+def handover_requests(entities, from_cucs, to_cucs):
+    """Release by from_cucs then request by to_cucs of control and monitoring of every station"""
+
+    requests = []
+    for mode, cucs_id in ((0, from_cucs), (1, to_cucs)):
+        for entity in entities:
+            control = Message01.LOI_05 if entity.getStationId() == 0 else Message01.LOI_03
+            requests.append((entity.getVehicleId(), entity.getStationId(), cucs_id, control | Message01.LOI_02, mode))
+
+    return requests
+
+
+def decoded_requests(requests):
+
+    messages = []
+    for vehicle_id, station_id, cucs_id, loi, mode in requests:
+        msg01 = Message01(Message01.MSGNULL)
+        msg01.vehicle_id = vehicle_id
+        msg01.cucs_id = cucs_id
+        msg01.controlled_station = station_id
+        msg01.requested_handover_loi = loi
+        msg01.controlled_station_mode = mode
+        data = bytes(MessageWrapper(MessageWrapper.MSGNULL).wrap_message(1, 1, msg01, False))
+        messages.append((MessageWrapper.from_buffer_copy(data), Message01.from_buffer_copy(data, MessageWrapper.MSGLEN)))
+
+    return messages
+
+
+def measure(operation):
+    return min(timeit.repeat(operation, number=1, repeat=ITERATIONS)) * 1e6
+
+
+if __name__ == "__main__":
+
+    print("{:>9} {:>26} {:>12} {:>12} {:>9}".format("stations", "operation", "entity us", "table us", "speedup"))
+
+    for vehicle_count in (25, 250, 2500):
+        server, entities = make_server(vehicle_count)
+        table = server.enable_loi_table()
+        station_count = len(entities)
+
+        # a monitored and controlled fleet, as left by the previous handover
+        table.apply_handover(handover_requests(entities, CUCS_TO, CUCS_FROM))
+
+        per_entity = measure(lambda: ([entity.get_loi_granted(CUCS_FROM) for entity in entities],
+            [entity.get_loi_authorized(CUCS_FROM) for entity in entities]))
+        bulk = measure(lambda: (table.get_granted(CUCS_FROM), table.get_authorized(CUCS_FROM)))
+        print("{:>9} {:>26} {:>12.0f} {:>12.0f} {:>8.1f}x".format(station_count, "granted + authorized", per_entity, bulk, per_entity / bulk))
+
+        forward = decoded_requests(handover_requests(entities, CUCS_FROM, CUCS_TO))
+        backward = decoded_requests(handover_requests(entities, CUCS_TO, CUCS_FROM))
+
+        routes = {(entity.getVehicleId(), entity.getStationId()): entity for entity in entities}
+
+        def entity_handover():
+            for messages in (forward, backward):
+                for wrapper, msg in messages:
+                    routes[(msg.vehicle_id, msg.controlled_station)].handle_loi_request(wrapper, msg)
+
+        forward_batch = handover_requests(entities, CUCS_FROM, CUCS_TO)
+        backward_batch = handover_requests(entities, CUCS_TO, CUCS_FROM)
+
+        def table_handover():
+            table.apply_handover(forward_batch)
+            table.apply_handover(backward_batch)
+
+        # both move the fleet to the other cucs and back
+        per_entity = measure(entity_handover) / 2
+        bulk = measure(table_handover) / 2
+        print("{:>9} {:>26} {:>12.0f} {:>12.0f} {:>8.1f}x".format(station_count, "handover", per_entity, bulk, per_entity / bulk))
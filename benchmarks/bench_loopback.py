@@ -0,0 +1,68 @@
+"""
+Measures discovery over the in-memory LoopbackBus with many vehicle and cucs servers in one event loop. Every
+vehicle is hosted by its own server, every cucs sends a single discovery and the round ends once every cucs
+knows every vehicle, the bus delivers each datagram to all the servers of its group as multicast would,
+run from the repository root with:
+    PYTHONPATH=. python benchmarks/bench_loopback.py
+"""
+
+import asyncio
+import logging
+import time
+
+from stanag4586vsm.stanag_server import *
+
+"""A single discovery per cucs, the round is timed until every vehicle is known"""
+DISCOVERY_OPTIONS = {'burst_count': 1, 'min_interval': 3600.0, 'max_interval': 3600.0}
+
+
+async def discovery_round(vehicle_count, cucs_count):
+
+    loop = asyncio.get_running_loop()
+    bus = LoopbackBus(logging.ERROR)
+
+    servers = []
+    for vehicle_id in range(vehicle_count):
+        server = StanagServer(logging.ERROR)
+        await server.setup_service(loop, StanagServer.MODE_VEHICLE, create_default_vehicle=False,
+            metrics=False, transport_bus=bus)
+        server.add_vehicle(vehicle_id)
+        servers.append(server)
+
+    started = time.perf_counter()
+
+    registries = []
+    for _ in range(cucs_count):
+        server = StanagServer(logging.ERROR)
+        await server.setup_service(loop, StanagServer.MODE_CUCS, metrics=False,
+            discovery_options=DISCOVERY_OPTIONS, transport_bus=bus)
+        registries.append(server.get_entity_controller().get_vehicle_registry())
+        servers.append(server)
+
+    while any(len(registry) < vehicle_count for registry in registries):
+        await asyncio.sleep(0)
+
+    elapsed = time.perf_counter() - started
+    stats = bus.get_stats()
+
+    for server in servers:
+        await server.cleanup_service()
+
+    return elapsed, stats
+
+
+async def main():
+
+    print("{:>8} {:>6} {:>10} {:>12} {:>14} {:>16}".format(
+        "vehicles", "cucs", "round ms", "datagrams", "datagrams/s", "deliveries/s"))
+
+    for vehicle_count in (10, 100, 1000):
+        for cucs_count in (1, 10):
+            elapsed, stats = await discovery_round(vehicle_count, cucs_count)
+            print("{:>8} {:>6} {:>10.1f} {:>12} {:>14.0f} {:>16.0f}".format(
+                vehicle_count, cucs_count, elapsed * 1e3, stats['datagrams'],
+                stats['datagrams'] / elapsed, stats['deliveries'] / elapsed))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
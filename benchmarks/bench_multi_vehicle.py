@@ -0,0 +1,56 @@
+"""
+Measures the memory used per hosted vehicle and the cost of dispatching a unicast message
+when a single StanagServer hosts 10, 100 and 1000 vehicles, run from the repository root with:
+    PYTHONPATH=. python benchmarks/bench_multi_vehicle.py
+"""
+
+import logging
+import timeit
+import tracemalloc
+
+from stanag4586vsm.stanag_server import *
+from stanag4586edav1.message200 import *
+
+ITERATIONS = 20000
+VEHICLE_COUNTS = [10, 100, 1000]
+
+
+def make_server(vehicle_count):
+    server = StanagServer(logging.INFO)
+
+    for vehicle_id in range(vehicle_count):
+        server.add_vehicle(vehicle_id)
+
+    return server
+
+
+def make_message(vehicle_id, station_id):
+    msg200 = Message200(Message200.MSGNULL)
+    msg200.vehicle_id = vehicle_id
+    msg200.station_number = station_id
+
+    wrapper = MessageWrapper(MessageWrapper.MSGNULL)
+    wrapper.wrap_message(1, 200, msg200, False)
+
+    return wrapper, msg200
+
+
+if __name__ == "__main__":
+
+    print("{:>9} {:>16} {:>12}".format("vehicles", "bytes/vehicle", "ns/msg"))
+
+    for vehicle_count in VEHICLE_COUNTS:
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        server = make_server(vehicle_count)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+
+        wrapper, msg = make_message(vehicle_count - 1, 0x1)
+        seconds = timeit.timeit(lambda: server.on_msg_rx(wrapper, msg), number=ITERATIONS)
+
+        print("{:>9} {:>16.0f} {:>12.1f}".format(
+            vehicle_count, allocated / vehicle_count, seconds / ITERATIONS * 1e9))
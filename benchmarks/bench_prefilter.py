@@ -0,0 +1,79 @@
+"""
+Measures the per packet cost of receiving and dispatching traffic on a vehicle side StanagServer when
+most of the multicast group is addressed to other vehicles. Every datagram is decoded and routed without
+the prefilter, with it foreign datagrams are dropped from the header alone and lazy decoding defers the
+body until a field is used, run from the repository root with:
+    PYTHONPATH=. python benchmarks/bench_prefilter.py
+"""
+
+import logging
+import timeit
+
+from stanag4586vsm.stanag_server import *
+from stanag4586edav1.message200 import *
+
+ITERATIONS = 20
+HOSTED_VEHICLES = 4
+"""One datagram in FOREIGN_RATIO is for a hosted vehicle"""
+FOREIGN_RATIO = 10
+DATAGRAM_COUNT = 10000
+
+
+class ImmediateLoop:
+    """Stands in for the asyncio loop, scheduled callbacks run right away"""
+
+    def call_soon(self, callback, *args):
+        callback(*args)
+
+
+def make_datagrams():
+
+    datagrams = []
+    for index in range(DATAGRAM_COUNT):
+        msg200 = Message200(Message200.MSGNULL)
+        msg200.vehicle_id = index % HOSTED_VEHICLES if index % FOREIGN_RATIO == 0 else 1000 + index % 50
+        msg200.station_number = 0x1
+
+        wrapper = MessageWrapper(MessageWrapper.MSGNULL)
+        datagrams.append(bytes(wrapper.wrap_message(1, 200, msg200, False)))
+
+    return datagrams
+
+
+def make_protocol(loop, filter_foreign_traffic, lazy_decode):
+
+    server = StanagServer(logging.ERROR)
+    for vehicle_id in range(HOSTED_VEHICLES):
+        server.add_vehicle(vehicle_id)
+
+    # the private fields set by setup_service, without opening sockets
+    server._StanagServer__mode = StanagServer.MODE_VEHICLE
+    server._StanagServer__filter_foreign_traffic = filter_foreign_traffic
+    server._StanagServer__lazy_decode = lazy_decode
+
+    return server.create_rx_protocol(loop)
+
+
+def measure(filter_foreign_traffic, lazy_decode, datagrams):
+
+    protocol = make_protocol(ImmediateLoop(), filter_foreign_traffic, lazy_decode)
+
+    def receive():
+        for data in datagrams:
+            protocol.datagram_received(data, None)
+
+    seconds = timeit.timeit(receive, number=ITERATIONS)
+    return seconds / ITERATIONS / len(datagrams) * 1e9, protocol.get_stats()['filter_rate']
+
+
+if __name__ == "__main__":
+
+    datagrams = make_datagrams()
+
+    print("{:>26} {:>10} {:>12}".format("mode", "ns/packet", "filter rate"))
+
+    for name, filter_foreign_traffic, lazy_decode in (
+        ("decode all", False, False), ("prefilter", True, False), ("prefilter + lazy decode", True, True)):
+
+        cost, filter_rate = measure(filter_foreign_traffic, lazy_decode, datagrams)
+        print("{:>26} {:>10.1f} {:>12.2f}".format(name, cost, filter_rate))
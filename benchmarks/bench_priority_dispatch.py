@@ -0,0 +1,88 @@
+"""
+Measures how long Message 01 LOI requests wait behind bursts of Message 20040 mast status telemetry, with the
+default one loop callback per message and with the PriorityDispatcher. Every loop iteration a burst of
+telemetry arrives followed by one control message, each message costs HANDLER_COST seconds to handle,
+run from the repository root with:
+    PYTHONPATH=. python benchmarks/bench_priority_dispatch.py
+"""
+
+import asyncio
+import logging
+import statistics
+import time
+
+from stanag4586vsm.stanag_protocol import *
+from stanag4586vsm.dispatch_queue import *
+
+ROUNDS = 200
+BURST_SIZES = (10, 100, 1000)
+HANDLER_COST = 0.00001
+
+
+def make_datagrams():
+
+    msg01 = Message01(Message01.MSGNULL)
+    msg01.vehicle_id = 1
+    msg01.cucs_id = 0xA0
+    msg01.controlled_station = 0x1
+    msg01.controlled_station_mode = 1
+    msg01.requested_handover_loi = Message01.LOI_02
+    control = bytes(MessageWrapper(MessageWrapper.MSGNULL).wrap_message(1, 1, msg01, False))
+
+    msg20040 = Message20040(Message20040.MSGNULL)
+    msg20040.vehicle_id = 1
+    telemetry = bytes(MessageWrapper(MessageWrapper.MSGNULL).wrap_message(1, 20040, msg20040, False))
+
+    return control, telemetry
+
+
+async def run(burst_size, prioritised):
+
+    loop = asyncio.get_running_loop()
+    control, telemetry = make_datagrams()
+
+    sent_at = []
+    waits = []
+
+    def handler(wrapper, msg):
+        if wrapper.message_type == 1:
+            waits.append(time.perf_counter() - sent_at.pop(0))
+
+        until = time.perf_counter() + HANDLER_COST
+        while time.perf_counter() < until:
+            pass
+
+    protocol = StanagProtocol(loop, logging.ERROR, handler, None)
+    if prioritised:
+        protocol.dispatcher = PriorityDispatcher(loop, logging.ERROR, handler,
+            queue_sizes={PRIORITY_TELEMETRY: 4 * burst_size})
+
+    for _ in range(ROUNDS):
+        for _ in range(burst_size):
+            protocol.datagram_received(telemetry, None)
+        sent_at.append(time.perf_counter())
+        protocol.datagram_received(control, None)
+        await asyncio.sleep(0)
+
+    while sent_at:
+        await asyncio.sleep(0)
+
+    waits.sort()
+    dropped = protocol.dispatcher.get_stats()['telemetry_dropped'] if prioritised else 0
+
+    return statistics.median(waits), waits[int(0.99 * len(waits))], dropped
+
+
+async def main():
+
+    print("{:>8} {:>10} {:>14} {:>14} {:>10}".format("burst", "dispatch", "p50 wait us", "p99 wait us", "dropped"))
+
+    for burst_size in BURST_SIZES:
+        for prioritised in (False, True):
+            p50, p99, dropped = await run(burst_size, prioritised)
+            print("{:>8} {:>10} {:>14.1f} {:>14.1f} {:>10}".format(
+                burst_size, "priority" if prioritised else "fifo", p50 * 1e6, p99 * 1e6, dropped))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
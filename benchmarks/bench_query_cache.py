@@ -0,0 +1,77 @@
+"""
+Measures Message 20010 query round trips answered by a registered query handler over the LoopbackBus, with the
+response encoded for every query (ttl 0) against served from the QueryResponseCache, and for a handler awaiting
+a 10 ms lookup where concurrent queries collapse into a single computation,
+run from the repository root with:
+    PYTHONPATH=. python benchmarks/bench_query_cache.py
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+from stanag4586vsm.stanag_server import *
+from stanag4586edav1.message20010 import *
+
+CONFIG = {"daylight": "rtsp://10.0.0.1/eo/day", "thermal": "rtsp://10.0.0.1/eo/ir", "zoom": [1, 2, 4, 8, 16]}
+
+
+def station_config(entity, msg):
+    return json.dumps(CONFIG)
+
+
+async def station_config_lookup(entity, msg):
+    await asyncio.sleep(0.01)
+    return json.dumps(CONFIG)
+
+
+async def run(handler, ttl, query_count, concurrency):
+
+    loop = asyncio.get_running_loop()
+    bus = LoopbackBus(logging.ERROR)
+
+    vehicle = StanagServer(logging.ERROR)
+    await vehicle.setup_service(loop, StanagServer.MODE_VEHICLE, metrics=False, transport_bus=bus)
+    vehicle.get_entity('eo').register_query_handler(Message20010.QUERY_TYPE_SEND_CONFIG, handler, ttl=ttl)
+
+    cucs = StanagServer(logging.ERROR)
+    await cucs.setup_service(loop, StanagServer.MODE_CUCS, metrics=False, transport_bus=bus,
+        discovery_options={'burst_count': 1, 'min_interval': 3600.0, 'max_interval': 3600.0})
+    controller = cucs.get_entity_controller()
+
+    started = time.perf_counter()
+    for _ in range(query_count // concurrency):
+        await asyncio.gather(*[controller.query_request_async(0, 0x1) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    stats = vehicle.get_query_stats()
+
+    await vehicle.cleanup_service()
+    await cucs.cleanup_service()
+
+    return elapsed, stats
+
+
+async def main():
+
+    print("{:>22} {:>12} {:>10} {:>12} {:>10} {:>10}".format(
+        "handler", "concurrency", "queries/s", "us/query", "computed", "collapsed"))
+
+    query_count = 10000
+    for name, handler, ttl in (("json, uncached", station_config, 0), ("json, cached", station_config, None)):
+        for concurrency in (1, 100):
+            elapsed, stats = await run(handler, ttl, query_count, concurrency)
+            print("{:>22} {:>12} {:>10.0f} {:>12.1f} {:>10} {:>10}".format(name, concurrency, query_count / elapsed,
+                elapsed * 1e6 / query_count, stats['computed'], stats['collapsed']))
+
+    query_count = 1000
+    for name, ttl in (("10 ms lookup, uncached", 0), ("10 ms lookup, cached", None)):
+        for concurrency in (1, 100):
+            elapsed, stats = await run(station_config_lookup, ttl, query_count, concurrency)
+            print("{:>22} {:>12} {:>10.0f} {:>12.1f} {:>10} {:>10}".format(name, concurrency, query_count / elapsed,
+                elapsed * 1e6 / query_count, stats['computed'], stats['collapsed']))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
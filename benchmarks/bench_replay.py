@@ -0,0 +1,84 @@
+"""
+Replays a synthetic capture of mixed CUCS traffic, discoveries, LOI requests and payload commands for
+16 vehicles, as fast as possible into a vehicle side StanagServer without opening any socket and reports
+the messages handled per second and the handler latency, run from the repository root with:
+    PYTHONPATH=. python benchmarks/bench_replay.py [capture file]
+
+When a capture file recorded with StanagServer.start_capture is given it is replayed instead.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+
+from stanag4586vsm.stanag_server import *
+from stanag4586vsm.capture import *
+from stanag4586edav1.message200 import *
+
+VEHICLE_COUNT = 16
+DATAGRAM_COUNT = 50000
+
+
+def make_capture(path):
+
+    writer = CaptureWriter(path)
+
+    for index in range(DATAGRAM_COUNT):
+        vehicle_id = index % VEHICLE_COUNT
+        wrapper = MessageWrapper(MessageWrapper.MSGNULL)
+
+        if index % 100 == 0:
+            msg01 = Message01(Message01.MSGNULL)
+            msg01.make_discovery_message(0xA0)
+            data = wrapper.wrap_message(index, 1, msg01, False)
+        elif index % 10 == 0:
+            msg01 = Message01(Message01.MSGNULL)
+            msg01.vehicle_id = vehicle_id
+            msg01.cucs_id = 0xA0
+            msg01.controlled_station = 0x1
+            msg01.controlled_station_mode = (index // 10) % 2
+            msg01.requested_handover_loi = Message01.LOI_03
+            data = wrapper.wrap_message(index, 1, msg01, False)
+        else:
+            msg200 = Message200(Message200.MSGNULL)
+            msg200.vehicle_id = vehicle_id
+            msg200.station_number = 0x1
+            data = wrapper.wrap_message(index, 200, msg200, False)
+
+        writer.write(data, index * 0.001)
+
+    writer.close()
+
+
+async def replay(path):
+
+    loop = asyncio.get_running_loop()
+
+    server = StanagServer(logging.ERROR)
+    for vehicle_id in range(VEHICLE_COUNT):
+        server.add_vehicle(vehicle_id)
+
+    # the private fields set by setup_service, without opening sockets
+    server._StanagServer__loop = loop
+    server._StanagServer__mode = StanagServer.MODE_VEHICLE
+
+    protocol = server.create_rx_protocol(loop)
+    return await ReplayEngine(loop, logging.INFO, protocol).replay(path)
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "bench.cap")
+        make_capture(path)
+
+    results = asyncio.run(replay(path))
+
+    print("datagrams     : {}".format(results['datagrams']))
+    print("messages/s    : {:.0f}".format(results['messages_per_second']))
+    print("p50 handler us: {:.1f}".format(results['p50_handler_latency'] * 1e6))
+    print("p99 handler us: {:.1f}".format(results['p99_handler_latency'] * 1e6))
@@ -0,0 +1,54 @@
+"""
+Measures awaitable monitor requests over the LoopbackBus with many requests in flight at once, every response
+is matched to its request through the (vehicle, station, instance id) index without scanning the pending
+requests, run from the repository root with:
+    PYTHONPATH=. python benchmarks/bench_requests.py
+"""
+
+import asyncio
+import logging
+import time
+
+from stanag4586vsm.stanag_server import *
+
+VEHICLE_COUNT = 100
+REQUEST_COUNT = 10000
+
+
+async def main():
+
+    loop = asyncio.get_running_loop()
+    bus = LoopbackBus(logging.ERROR)
+
+    # one server hosts the fleet so every request is received once
+    vehicles = StanagServer(logging.ERROR)
+    await vehicles.setup_service(loop, StanagServer.MODE_VEHICLE, create_default_vehicle=False,
+        metrics=False, transport_bus=bus)
+    for vehicle_id in range(VEHICLE_COUNT):
+        vehicles.add_vehicle(vehicle_id)
+
+    cucs = StanagServer(logging.ERROR)
+    await cucs.setup_service(loop, StanagServer.MODE_CUCS, metrics=False, transport_bus=bus)
+    controller = cucs.get_entity_controller()
+
+    print("{:>10} {:>12} {:>14}".format("in flight", "requests", "requests/s"))
+
+    for in_flight in (1, 10, 100, 1000):
+        started = time.perf_counter()
+
+        for first in range(0, REQUEST_COUNT, in_flight):
+            await asyncio.gather(*[
+                controller.monitor_request_async(1, index % VEHICLE_COUNT, timeout=5.0)
+                for index in range(first, min(first + in_flight, REQUEST_COUNT))])
+
+        elapsed = time.perf_counter() - started
+        print("{:>10} {:>12} {:>14.0f}".format(in_flight, REQUEST_COUNT, REQUEST_COUNT / elapsed))
+
+    print(controller.get_request_stats())
+
+    await cucs.cleanup_service()
+    await vehicles.cleanup_service()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
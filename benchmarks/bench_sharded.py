@@ -0,0 +1,106 @@
+"""
+Compares the throughput of a ShardedStanagServer with 1 and N workers using a local multicast
+traffic generator. The generator sends LOI requests round robin to every hosted station, each to the port
+of the shard hosting its vehicle, and the benchmark counts the Message 21 replies on the tx group. Worker counts may be given on the command line,
+1, 2 and 4 are measured otherwise, more workers than cores cannot show any scaling. Run from the repository
+root with:
+    PYTHONPATH=. python benchmarks/bench_sharded.py [worker count ...]
+"""
+
+import logging
+import os
+import socket
+import struct
+import sys
+import time
+
+from stanag4586vsm.sharded_server import ShardedStanagServer
+from stanag4586vsm.shard_transport import get_shard_index
+from stanag4586edav1.message01 import *
+from stanag4586edav1.message_wrapper import *
+
+VEHICLE_COUNT = 64
+MESSAGE_COUNT = 20000
+PORT_RX = 45860
+PORT_TX = 45870
+GROUP = "224.10.10.10"
+STARTUP_SECONDS = 3
+TIMEOUT_SECONDS = 30
+
+
+def make_requests():
+    """LOI requests alternating monitor grant and release for every base station"""
+
+    requests = []
+    for index in range(MESSAGE_COUNT):
+        msg01 = Message01(Message01.MSGNULL)
+        msg01.vehicle_id = index % VEHICLE_COUNT
+        msg01.cucs_id = 0xA0
+        msg01.controlled_station = 0x0
+        msg01.requested_handover_loi = Message01.LOI_02
+        msg01.controlled_station_mode = (index // VEHICLE_COUNT) % 2
+
+        wrapper = MessageWrapper(MessageWrapper.MSGNULL)
+        requests.append(wrapper.wrap_message(index, 1, msg01, False))
+
+    return requests
+
+
+def open_reply_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+    sock.bind(('', PORT_TX))
+    mreq = struct.pack('4sL', socket.inet_aton(GROUP), socket.INADDR_ANY)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    sock.settimeout(1)
+    return sock
+
+
+def measure(worker_count, requests):
+
+    server = ShardedStanagServer(logging.WARNING, worker_count)
+    for vehicle_id in range(VEHICLE_COUNT):
+        server.add_vehicle(vehicle_id)
+
+    server.start(port_rx = PORT_RX, port_tx = PORT_TX, addr_rx = GROUP, addr_tx = GROUP,
+        rx_batch_size = 64, rx_buffer_size = 8 * 1024 * 1024)
+    time.sleep(STARTUP_SECONDS)
+
+    replies = open_reply_socket()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    started = time.perf_counter()
+    for index, request in enumerate(requests):
+        sender.sendto(request, (GROUP, PORT_RX + get_shard_index(index % VEHICLE_COUNT, worker_count)))
+
+    received = 0
+    deadline = started + TIMEOUT_SECONDS
+    while received < len(requests) and time.perf_counter() < deadline:
+        try:
+            replies.recv(1024)
+            received += 1
+        except socket.timeout:
+            break
+
+    elapsed = time.perf_counter() - started
+
+    server.stop()
+    replies.close()
+    sender.close()
+
+    return received, elapsed
+
+
+if __name__ == "__main__":
+
+    requests = make_requests()
+    worker_counts = sorted(set(int(arg) for arg in sys.argv[1:])) or [1, 2, 4]
+
+    print("cores: {}".format(os.cpu_count()))
+    print("{:>8} {:>10} {:>10} {:>12}".format("workers", "sent", "replies", "replies/s"))
+
+    for worker_count in worker_counts:
+        received, elapsed = measure(worker_count, requests)
+        print("{:>8} {:>10} {:>10} {:>12.0f}".format(worker_count, len(requests), received, received / elapsed))
@@ -0,0 +1,100 @@
+"""
+Compares the callback volume and CPU cost for a CUCS consumer tracking 500 vehicles which answer
+every discovery round, with a few of them changing LOI between rounds.
+
+The legacy consumer is handed the full vehicle map for every Message 21 and scans it for changes,
+the delta consumer listens for vehicle events, run from the repository root with:
+    PYTHONPATH=. python benchmarks/bench_vehicle_events.py
+"""
+
+import asyncio
+import logging
+import time
+
+from stanag4586vsm.entity_controller import *
+from stanag4586edav1.message01 import *
+from stanag4586edav1.message21 import *
+
+VEHICLE_COUNT = 500
+ROUNDS = 20
+"""Vehicles changing LOI between two discovery rounds"""
+CHANGES_PER_ROUND = 5
+
+
+def make_responses(round_index):
+    """Discovery responses of every vehicle for a round, a few vehicles flip their granted LOI"""
+
+    responses = []
+    for vehicle_id in range(VEHICLE_COUNT):
+        msg21 = Message21(Message21.MSGNULL)
+        msg21.vehicle_id = vehicle_id
+        msg21.controlled_station = 0x0
+        msg21.vehicle_type = 1
+        msg21.loi_authorized = Message01.LOI_05
+
+        flipped = vehicle_id < CHANGES_PER_ROUND * ROUNDS and vehicle_id // CHANGES_PER_ROUND < round_index
+        msg21.loi_granted = Message01.LOI_02 if flipped else 0
+
+        wrapper = MessageWrapper(MessageWrapper.MSGNULL)
+        wrapper.wrap_message(1, 21, msg21, False)
+        responses.append((wrapper, msg21))
+
+    return responses
+
+
+class Consumer:
+
+    def __init__(self):
+        self.callbacks = 0
+        self.monitored = set()
+        self.seconds = 0.0
+
+    def on_full_map(self, vehicles):
+        started = time.perf_counter()
+        self.callbacks += 1
+        self.monitored = set(vehicle_id for vehicle_id, vehicle in vehicles.items() if vehicle.monitored)
+        self.seconds += time.perf_counter() - started
+
+    def on_events(self, controller, events):
+        started = time.perf_counter()
+        self.callbacks += 1
+        for event in events:
+            if event.vehicle.monitored:
+                self.monitored.add(event.vehicle_id)
+            else:
+                self.monitored.discard(event.vehicle_id)
+        self.seconds += time.perf_counter() - started
+
+
+async def run(delta):
+
+    loop = asyncio.get_running_loop()
+    controller = EntityController(loop, logging.WARNING, 0xA0, 0, lambda data: None)
+    consumer = Consumer()
+
+    if delta:
+        controller.add_listener_for_vehicle_events(consumer.on_events)
+
+    rounds = [make_responses(round_index) for round_index in range(ROUNDS)]
+
+    started = time.perf_counter()
+    for responses in rounds:
+        for wrapper, msg in responses:
+            controller.handle_message(wrapper, msg)
+            if not delta:
+                # the legacy controller raised the discovery callback with the full map for every Message 21
+                consumer.on_full_map(controller.get_discovered_vehicles())
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+
+    return consumer, elapsed
+
+
+if __name__ == "__main__":
+
+    print("{:>8} {:>10} {:>14} {:>12} {:>10}".format("mode", "callbacks", "consumer ms", "total ms", "monitored"))
+
+    for delta in (False, True):
+        consumer, elapsed = asyncio.run(run(delta))
+        print("{:>8} {:>10} {:>14.1f} {:>12.1f} {:>10}".format(
+            "delta" if delta else "legacy", consumer.callbacks, consumer.seconds * 1e3, elapsed * 1e3, len(consumer.monitored)))
@@ -0,0 +1,318 @@
+"""
+Benchmark suite for the rx path, run from the repository root with:
+    PYTHONPATH=. python benchmarks/suite.py [--quick] [--filter NAME] [--output results.json] [--compare baseline.json]
+
+Every case drives synthetic message streams through the real code with in-process fake transports and
+reports the cost per message for each point along its axes (vehicles, stations, cucs count, message mix):
+
+    decode           StanagProtocol.datagram_received per message type
+    vehicle_dispatch StanagServer.on_msg_rx in vehicle mode, unicast payload commands
+    cucs_dispatch    StanagServer.on_msg_rx in cucs mode, discovery responses from the fleet
+    loi_handshake    ControllableEntity.handle_loi_request, monitor grant and release from many cucs
+    discovery_fanout one discovery broadcast answered by every hosted station
+    message_mix      on_msg_rx in vehicle mode on a mix of discoveries, LOI requests and payload commands
+
+Results are written as JSON with the commit they were measured on, --compare prints the change of every
+case against a previous results file.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import time
+
+from stanag4586vsm.stanag_server import *
+from stanag4586vsm.stanag_protocol import *
+from stanag4586vsm.entity_controller import EntityController
+
+CUCS_ID = 0xA0
+
+
+class ImmediateLoop:
+    """Stands in for the asyncio loop, scheduled callbacks run right away and timers never fire"""
+
+    def call_soon(self, callback, *args):
+        callback(*args)
+
+    def call_later(self, delay, callback, *args):
+        return None
+
+    def time(self):
+        return time.monotonic()
+
+
+def wrap(message_type, msg, instance_id = 1):
+    return bytes(MessageWrapper(MessageWrapper.MSGNULL).wrap_message(instance_id, message_type, msg, False))
+
+
+def decoded(data):
+    """Returns (wrapper, msg) as handed to on_msg_rx"""
+    wrapper = MessageWrapper.from_buffer_copy(data)
+    return wrapper, KNOWN_MESSAGES[wrapper.message_type].from_buffer_copy(data, MessageWrapper.MSGLEN)
+
+
+def make_discovery(cucs_id = CUCS_ID):
+    msg01 = Message01(Message01.MSGNULL)
+    msg01.make_discovery_message(cucs_id)
+    return wrap(1, msg01)
+
+
+def make_loi_request(vehicle_id, station_id, cucs_id, grant):
+    msg01 = Message01(Message01.MSGNULL)
+    msg01.vehicle_id = vehicle_id
+    msg01.cucs_id = cucs_id
+    msg01.controlled_station = station_id
+    msg01.controlled_station_mode = 1 if grant else 0
+    msg01.requested_handover_loi = Message01.LOI_02
+    return wrap(1, msg01)
+
+
+def make_payload_command(vehicle_id, station_id):
+    msg200 = Message200(Message200.MSGNULL)
+    msg200.vehicle_id = vehicle_id
+    msg200.station_number = station_id
+    return wrap(200, msg200)
+
+
+def make_stations(station_count):
+    """Base platform plus station_count payload stations"""
+    return [('base', 0x0, None)] + [
+        ('payload{}'.format(station_id), station_id, Message300.PAYLOAD_TYPE_EOIR) for station_id in range(1, station_count + 1)]
+
+
+def make_vehicle_server(loop, vehicle_count, station_count):
+    """Without a tx socket the replies are encoded and then discarded by tx_data"""
+
+    server = StanagServer(logging.ERROR)
+
+    # the private fields set by setup_service, without opening sockets
+    server._StanagServer__loop = loop
+    server._StanagServer__mode = StanagServer.MODE_VEHICLE
+
+    stations = make_stations(station_count)
+    for vehicle_id in range(vehicle_count):
+        server.add_vehicle(vehicle_id, stations = stations)
+
+    return server
+
+
+def make_cucs_server(loop):
+
+    server = StanagServer(logging.ERROR)
+
+    server._StanagServer__loop = loop
+    server._StanagServer__mode = StanagServer.MODE_CUCS
+    server._StanagServer__entities_controller = EntityController(loop, logging.ERROR, CUCS_ID, 0, server.tx_data)
+
+    return server
+
+
+def measure(operation, count, repeat):
+    """Returns the median ns per message over repeat runs of operation, which handles count messages"""
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        operation()
+        samples.append((time.perf_counter() - started) / count * 1e9)
+
+    return statistics.median(samples)
+
+
+def case_decode(scale, repeat):
+
+    protocol = StanagProtocol(ImmediateLoop(), logging.ERROR, lambda wrapper, msg: None, None)
+    streams = {
+        'discovery': make_discovery(),
+        'loi_request': make_loi_request(0, 1, CUCS_ID, True),
+        'payload_command': make_payload_command(0, 1),
+    }
+
+    for message, data in streams.items():
+        datagrams = [data] * (20000 // scale)
+
+        def run():
+            for datagram in datagrams:
+                protocol.datagram_received(datagram, None)
+
+        yield {'message': message}, measure(run, len(datagrams), repeat)
+
+
+def case_vehicle_dispatch(scale, repeat):
+
+    loop = ImmediateLoop()
+
+    for vehicle_count in (1, 10, 100):
+        for station_count in (4, 16):
+            server = make_vehicle_server(loop, vehicle_count, station_count)
+            messages = [decoded(make_payload_command(index % vehicle_count, 1 + index % station_count))
+                for index in range(5000 // scale)]
+
+            def run():
+                for wrapper, msg in messages:
+                    server.on_msg_rx(wrapper, msg)
+
+            yield {'vehicles': vehicle_count, 'stations': station_count}, measure(run, len(messages), repeat)
+
+
+def case_cucs_dispatch(scale, repeat):
+
+    loop = ImmediateLoop()
+
+    for vehicle_count in (10, 100, 1000):
+        server = make_cucs_server(loop)
+
+        # the discovery responses of the whole fleet, as a cucs receives them every discovery round
+        vehicles = make_vehicle_server(loop, vehicle_count, 4)
+        replies = []
+        for entity in [vehicles.get_entity(name, vehicle_id)
+            for vehicle_id in range(vehicle_count) for name in ('base', 'payload1', 'payload2', 'payload3', 'payload4')]:
+            wrapper, msg = decoded(make_discovery())
+            replies.append(decoded(bytes(entity.build_reply_21(wrapper, msg))))
+            replies.append(decoded(bytes(entity.build_reply_20(wrapper, msg) if entity.getStationId() == 0 else
+                entity.build_reply_300(wrapper, msg))))
+
+        rounds = max(1, 20 // scale)
+
+        def run():
+            for _ in range(rounds):
+                for wrapper, msg in replies:
+                    server.on_msg_rx(wrapper, msg)
+
+        yield {'vehicles': vehicle_count, 'stations': 4}, measure(run, len(replies) * rounds, repeat)
+
+
+def case_loi_handshake(scale, repeat):
+
+    loop = ImmediateLoop()
+
+    for cucs_count in (1, 10, 50):
+        server = make_vehicle_server(loop, 1, 4)
+        entity = server.get_entity('payload1', 0)
+
+        messages = []
+        for index in range(5000 // scale):
+            cucs_id = CUCS_ID + index % cucs_count
+            messages.append(decoded(make_loi_request(0, 1, cucs_id, (index // cucs_count) % 2 == 0)))
+
+        def run():
+            for wrapper, msg in messages:
+                entity.handle_loi_request(wrapper, msg)
+
+        yield {'cucs': cucs_count}, measure(run, len(messages), repeat)
+
+
+def case_discovery_fanout(scale, repeat):
+
+    loop = ImmediateLoop()
+
+    for vehicle_count in (1, 10, 100):
+        for cucs_count in (1, 10):
+            server = make_vehicle_server(loop, vehicle_count, 4)
+            discoveries = [decoded(make_discovery(CUCS_ID + index % cucs_count)) for index in range(max(1, 200 // scale))]
+
+            def run():
+                for wrapper, msg in discoveries:
+                    server.on_msg_rx(wrapper, msg)
+
+            # reported per discovery, every one is answered by all the stations of all the vehicles
+            yield {'vehicles': vehicle_count, 'stations': 4, 'cucs': cucs_count}, measure(run, len(discoveries), repeat)
+
+
+def case_message_mix(scale, repeat):
+
+    loop = ImmediateLoop()
+    vehicle_count = 16
+
+    for name, discovery_every, loi_every in (('telemetry', 1000, 100), ('balanced', 100, 10), ('handover', 50, 2)):
+        server = make_vehicle_server(loop, vehicle_count, 4)
+
+        messages = []
+        for index in range(10000 // scale):
+            vehicle_id = index % vehicle_count
+            if index % discovery_every == 0:
+                messages.append(decoded(make_discovery()))
+            elif index % loi_every == 0:
+                messages.append(decoded(make_loi_request(vehicle_id, 1, CUCS_ID, (index // loi_every) % 2 == 0)))
+            else:
+                messages.append(decoded(make_payload_command(vehicle_id, 1)))
+
+        def run():
+            for wrapper, msg in messages:
+                server.on_msg_rx(wrapper, msg)
+
+        yield {'mix': name}, measure(run, len(messages), repeat)
+
+
+CASES = {
+    'decode': case_decode,
+    'vehicle_dispatch': case_vehicle_dispatch,
+    'cucs_dispatch': case_cucs_dispatch,
+    'loi_handshake': case_loi_handshake,
+    'discovery_fanout': case_discovery_fanout,
+    'message_mix': case_message_mix,
+}
+
+
+def result_key(result):
+    return "{} {}".format(result['case'], json.dumps(result['params'], sort_keys=True))
+
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(names, scale, repeat):
+
+    results = []
+    for name in names:
+        for params, ns_per_message in CASES[name](scale, repeat):
+            result = {'case': name, 'params': params, 'ns_per_message': round(ns_per_message, 1)}
+            results.append(result)
+            print("{:<60} {:>12.1f} ns/msg".format(result_key(result), ns_per_message))
+
+    return {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'results': results,
+    }
+
+
+def compare(report, baseline):
+
+    before = {result_key(result): result['ns_per_message'] for result in baseline['results']}
+
+    print("\ncompared with {}".format(baseline.get('commit')))
+    for result in report['results']:
+        key = result_key(result)
+        if key in before:
+            change = (result['ns_per_message'] - before[key]) / before[key] * 100
+            print("{:<60} {:>12.1f} {:>12.1f} {:>+8.1f}%".format(key, before[key], result['ns_per_message'], change))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Runs the stanag4586vsm benchmark suite")
+    parser.add_argument('--quick', action='store_true', help="fewer messages and repeats, for a smoke run")
+    parser.add_argument('--filter', action='append', choices=sorted(CASES.keys()), help="cases to run, all by default")
+    parser.add_argument('--output', help="file to write the JSON results to")
+    parser.add_argument('--compare', help="JSON results of a previous run to compare with")
+    args = parser.parse_args()
+
+    report = run_suite(args.filter or list(CASES.keys()), 10 if args.quick else 1, 3 if args.quick else 5)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(report, json.load(baseline))
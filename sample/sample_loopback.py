@@ -0,0 +1,44 @@
+import asyncio
+import logging
+from stanag4586vsm.stanag_server import *
+
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+logging.basicConfig(format=FORMAT)
+
+logger = logging.getLogger("loopback")
+logger.setLevel(logging.DEBUG)
+
+VEHICLE_COUNT = 4
+
+def handle_vehicle_events(controller, events):
+
+    for event in events:
+        logger.info("Vehicle event [{}] vehicle [{}] station [{}]".format(event.kind, event.vehicle_id, event.station_id))
+
+async def main():
+
+    loop = asyncio.get_running_loop()
+
+    #vehicles and cucs set up on the same bus exchange datagrams in memory, no sockets are opened
+    bus = LoopbackBus()
+
+    vehicles = []
+    for vehicle_id in range(VEHICLE_COUNT):
+        server = StanagServer(logging.INFO)
+        await server.setup_service(loop, StanagServer.MODE_VEHICLE, create_default_vehicle=False, transport_bus=bus)
+        server.add_vehicle(vehicle_id)
+        vehicles.append(server)
+
+    cucs = StanagServer(logging.INFO)
+    await cucs.setup_service(loop, StanagServer.MODE_CUCS, transport_bus=bus)
+    cucs.get_entity_controller().add_listener_for_vehicle_events(handle_vehicle_events)
+
+    await asyncio.sleep(2)
+
+    logger.info("Discovered vehicles {}".format(sorted(cucs.get_entity_controller().get_discovered_vehicles().keys())))
+    logger.info("Bus stats {}".format(bus.get_stats()))
+
+    for server in vehicles + [cucs]:
+        await server.cleanup_service()
+
+asyncio.run(main())
@@ -0,0 +1,28 @@
+import asyncio
+import logging
+import os
+from stanag4586vsm.stanag_server import *
+
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+logging.basicConfig(format=FORMAT)
+
+logger = logging.getLogger("vehicle")
+logger.setLevel(logging.DEBUG)
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fleet_config.json")
+
+async def main():
+
+    loop = asyncio.get_running_loop()
+    server = StanagServer(logging.INFO)
+
+    #vehicles, stations, identification and network settings all come from the configuration file
+    await server.setup_from_config(loop, CONFIG)
+    logger.info("Hosting vehicles {}".format(sorted(server.get_vehicle_ids())))
+
+    logger.info("Listening, press Ctrl+C to terminate")
+    await asyncio.sleep(3600*100)
+
+    logger.info("Server exiting")
+
+asyncio.run(main())
@@ -17,18 +17,15 @@ def ask_exit(signame, loop):
 def handle_message(wrapper, msg):
     logger.info("Got message [{:x}]".format(wrapper.message_type))
 
-discovered_vehicles = {}
+def handle_vehicle_events(controller, events):
 
-def handle_vehicle_discovery(controller, vehicles):
-    logger.info("Vehicles discovered [{}]".format(vehicles))
+    for event in events:
+        logger.info("Vehicle event [{}] vehicle [{}] station [{}]".format(event.kind, event.vehicle_id, event.station_id))
 
-    discovered_vehicles = vehicles
-
-    #for poc purposes we have just one vehicle
-    #we check if it's not already controlled by us, then we request for it to be controlled
-    for veh_id in discovered_vehicles.keys():
-        if discovered_vehicles[veh_id][EntityController.KEY_CONTROLLED] is False:
-            controller.control_request(0x0, veh_id)
+        #we check if a newly discovered vehicle or one that lost its LOI is not controlled by us, then we request for it to be controlled
+        if event.kind in (EntityController.EVENT_VEHICLE_ADDED, EntityController.EVENT_LOI_CHANGED) and \
+            event.station_id is None and event.vehicle.controlled is False:
+            controller.control_request(0x0, event.vehicle_id)
 
 async def main():
 
@@ -42,7 +39,7 @@ async def main():
 
     logger.debug("Creating server")
     await server.setup_service(loop, StanagServer.MODE_CUCS)
-    server.get_entity_controller().set_callback_for_vehicle_discovery(handle_vehicle_discovery)
+    server.get_entity_controller().add_listener_for_vehicle_events(handle_vehicle_events)
 
     logger.info("Listening, press Ctrl+C to terminate")
     await asyncio.sleep(3600*100)
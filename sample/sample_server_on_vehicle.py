@@ -5,7 +5,7 @@ from stanag4586edav1.message20 import Message20
 
 from stanag4586vsm.stanag_server import *
 from stanag4586edav1.message_wrapper import *
-from stanag4586edav1.message20020 import *
+from stanag4586edav1.message20010 import *
 from stanag4586edav1.message21 import *
 
 
@@ -25,21 +25,10 @@ def ask_exit(signame, loop):
 def process_eo_messages(wrapper, msg):
     
     logger.info("Got message [{}]".format(wrapper.message_type))
-    if wrapper.message_type == 20010:
-        #respond with dummy config data
-        msg20020 = Message20020(Message20020.MSGNULL)
-    
-        msg20020.time_stamp = 0x00
-        msg20020.vehicle_id = msg.vehicle_id
-        msg20020.cucs_id = msg.cucs_id
-        msg20020.station_number = msg.station_number
-        msg20020.requested_query_type = msg.query_type
-        msg20020.set_response(json.dumps({"daylight":"rtsp://wowzaec2demo.streamlock.net/vod/mp4:BigBuckBunny_115k.mov"}))
-
-        wrapped_reply = MessageWrapper(MessageWrapper.MSGNULL)
-        wrapped_reply = wrapped_reply.wrap_message(wrapper.msg_instance_id, 20020, msg20020, False)
 
-        loop.call_soon(server.tx_data, wrapped_reply)
+def eo_config(entity, msg):
+    #dummy config data, encoded once and served from the query cache to every cucs asking for it
+    return json.dumps({"daylight":"rtsp://wowzaec2demo.streamlock.net/vod/mp4:BigBuckBunny_115k.mov"})
 
 async def main():
 
@@ -59,6 +48,8 @@ async def main():
 
     #set our callback to start getting requests unprocessed by default implementation
     server.get_entity("eo").set_callback_for_unhandled_messages(process_eo_messages)
+    #answer config queries, the response is cached for 60 seconds or until invalidate_query is called
+    server.get_entity("eo").register_query_handler(Message20010.QUERY_TYPE_SEND_CONFIG, eo_config, ttl=60.0)
 
     logger.info("Listening, press Ctrl+C to terminate")
     await asyncio.sleep(3600*100)
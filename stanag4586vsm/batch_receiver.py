@@ -0,0 +1,126 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import logging
+import socket
+import struct
+import sys
+
+"""Linux exposes the number of datagrams dropped by the kernel for a socket through this option, python does not define it"""
+SO_RXQ_OVFL = getattr(socket, 'SO_RXQ_OVFL', 40 if sys.platform.startswith('linux') else None)
+
+class BatchReceiver:
+    """Drains many datagrams from a non-blocking socket per loop wakeup into a preallocated ring of buffers.
+
+    The datagrams are handed to the protocol's datagram_received as memoryviews over the ring buffers once
+    the whole batch has been read, so the kernel queue is emptied as fast as possible during bursts. A view
+    is only valid until the next wakeup, the protocol copies whatever it keeps while decoding.
+    """
+
+    def __init__(self, loop, debug_level, sock, protocol, batch_size = 64, max_datagram_size = 65535):
+        self.__loop = loop
+        self.__sock = sock
+        self.__protocol = protocol
+        self.__batch_size = batch_size
+
+        self.__buffers = [bytearray(max_datagram_size) for _ in range(batch_size)]
+        self.__views = [memoryview(buffer) for buffer in self.__buffers]
+        self.__sizes = [0] * batch_size
+        self.__addrs = [None] * batch_size
+
+        self.__reading = False
+        self.__overflow_enabled = False
+        self.__ancillary_size = 0
+
+        self.__wakeups = 0
+        self.__packets = 0
+        self.__bytes = 0
+        self.__max_batch = 0
+        self.__kernel_drops = 0
+
+        self.logger = logging.getLogger('BatchReceiver')
+        self.logger.setLevel(debug_level)
+
+    def start(self):
+        """Switches the socket to non-blocking mode and starts draining it on the loop. Returns nothing."""
+
+        self.__sock.setblocking(False)
+
+        if SO_RXQ_OVFL is not None:
+            try:
+                self.__sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                self.__overflow_enabled = True
+                self.__ancillary_size = socket.CMSG_SPACE(4)
+            except OSError:
+                self.logger.info("SO_RXQ_OVFL not supported, kernel drops will not be counted.")
+
+        self.__loop.add_reader(self.__sock.fileno(), self.__on_readable)
+        self.__reading = True
+        self.__protocol.connection_made(None)
+
+    def stop(self):
+        """Stops draining the socket, the socket itself is left open. Returns nothing."""
+
+        if self.__reading:
+            self.__loop.remove_reader(self.__sock.fileno())
+            self.__reading = False
+
+    def get_stats(self):
+        """Returns a dict of counters describing the receive path"""
+        return {
+            'wakeups': self.__wakeups,
+            'packets': self.__packets,
+            'bytes': self.__bytes,
+            'max_batch': self.__max_batch,
+            'kernel_drops': self.__kernel_drops,
+        }
+
+    def __on_readable(self):
+
+        count = self.__drain()
+        if count == 0:
+            return
+
+        self.__wakeups += 1
+        self.__packets += count
+        if count > self.__max_batch:
+            self.__max_batch = count
+
+        protocol = self.__protocol
+        views = self.__views
+        sizes = self.__sizes
+        addrs = self.__addrs
+
+        for index in range(count):
+            self.__bytes += sizes[index]
+            protocol.datagram_received(views[index][:sizes[index]], addrs[index])
+
+    def __drain(self):
+        """Reads up to batch_size datagrams into the ring, returns the number read"""
+
+        sock = self.__sock
+        count = 0
+
+        while count < self.__batch_size:
+            try:
+                if self.__overflow_enabled:
+                    nbytes, ancdata, _, addr = sock.recvmsg_into([self.__buffers[count]], self.__ancillary_size)
+                    for level, kind, data in ancdata:
+                        if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL and len(data) >= 4:
+                            # the kernel reports the total dropped on this socket so far
+                            self.__kernel_drops = struct.unpack_from('=I', data)[0]
+                else:
+                    nbytes, addr = sock.recvfrom_into(self.__buffers[count])
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as exc:
+                self.__protocol.error_received(exc)
+                break
+
+            self.__sizes[count] = nbytes
+            self.__addrs[count] = addr
+            count += 1
+
+        return count
@@ -0,0 +1,214 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import time
+
+"""File header, magic and format version"""
+CAPTURE_MAGIC = b'S4586CAP'
+CAPTURE_VERSION = 1
+_HEADER = struct.Struct('<8sHxxxxxx')
+"""Every record is the receive time in seconds since the epoch, the datagram length and the datagram"""
+_RECORD = struct.Struct('<dI')
+
+class CaptureWriter:
+    """Appends raw datagrams with their receive time to a capture file, an existing file must be a capture file
+    of the same version"""
+
+    def __init__(self, path):
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as existing:
+                header = existing.read(_HEADER.size)
+            if len(header) < _HEADER.size or _HEADER.unpack(header) != (CAPTURE_MAGIC, CAPTURE_VERSION):
+                raise ValueError("[{}] is not a version [{}] capture file".format(path, CAPTURE_VERSION))
+
+        self.__file = open(path, 'ab')
+
+        if self.__file.tell() == 0:
+            self.__file.write(_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION))
+
+        self.__records = 0
+
+    def write(self, data, timestamp = None):
+        """Appends a datagram, data may be any buffer. Returns nothing."""
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        self.__file.write(_RECORD.pack(timestamp, len(data)))
+        self.__file.write(data)
+        self.__records += 1
+
+    def get_record_count(self):
+        """Returns the number of datagrams written by this writer"""
+        return self.__records
+
+    def flush(self):
+        self.__file.flush()
+
+    def close(self):
+        self.__file.close()
+
+
+class CaptureReader:
+    """Reads a capture file through a memory map, iterating yields (timestamp, memoryview of the datagram).
+
+    The memoryviews point into the map, they must be released or dropped before the reader is closed.
+    """
+
+    def __init__(self, path):
+        self.__file = open(path, 'rb')
+
+        size = os.fstat(self.__file.fileno()).st_size
+        if size < _HEADER.size:
+            self.__file.close()
+            raise ValueError("[{}] is not a capture file".format(path))
+
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__view = memoryview(self.__map)
+
+        magic, version = _HEADER.unpack_from(self.__map, 0)
+        if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+            self.close()
+            raise ValueError("[{}] is not a version [{}] capture file".format(path, CAPTURE_VERSION))
+
+    def __iter__(self):
+
+        view = self.__view
+        size = len(view)
+        offset = _HEADER.size
+
+        # a record cut short by a writer that did not finish is ignored
+        while offset + _RECORD.size <= size:
+            timestamp, length = _RECORD.unpack_from(view, offset)
+            offset += _RECORD.size
+            if offset + length > size:
+                break
+
+            yield timestamp, view[offset:offset + length]
+            offset += length
+
+    def close(self):
+        self.__view.release()
+        self.__map.close()
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ReplayEngine:
+    """Feeds a capture file into StanagProtocol.datagram_received, at the captured pace or as fast as possible.
+
+    The protocol callback is timed for every message while replaying, replay returns the number of datagrams,
+    the messages handled per second and the handler latency percentiles. Once the capture is fed the engine
+    waits for the messages still queued, e.g. by a PriorityDispatcher, to reach the callback before it is
+    restored.
+    """
+
+    def __init__(self, loop, debug_level, protocol):
+        self.__loop = loop
+        self.__protocol = protocol
+
+        self.logger = logging.getLogger('ReplayEngine')
+        self.logger.setLevel(debug_level)
+
+    async def replay(self, path, paced = False, speed = 1.0, batch_size = 256, drain_timeout = 5.0):
+        """Replays the capture, when paced datagrams are delivered with their captured spacing divided by speed,
+        otherwise batch_size datagrams are delivered per loop iteration. The messages decoded are waited for
+        at most drain_timeout seconds after the last datagram. Returns a dict of results."""
+
+        protocol = self.__protocol
+        callback = protocol.on_msg_rx_callback
+        durations = []
+        decoded_before = self.__get_decoded()
+
+        def timed_callback(wrapper, msg):
+            started = time.perf_counter()
+            try:
+                callback(wrapper, msg)
+            finally:
+                durations.append(time.perf_counter() - started)
+
+        protocol.on_msg_rx_callback = timed_callback
+        datagrams = 0
+
+        try:
+            with CaptureReader(path) as reader:
+
+                started = time.perf_counter()
+                first_timestamp = None
+
+                for timestamp, data in reader:
+
+                    if paced:
+                        if first_timestamp is None:
+                            first_timestamp = timestamp
+                        delay = (timestamp - first_timestamp) / speed - (time.perf_counter() - started)
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    elif datagrams % batch_size == 0:
+                        await asyncio.sleep(0)
+
+                    # the protocol copies what it keeps out of the buffer, as it does for the batch receiver
+                    protocol.datagram_received(data, None)
+                    data.release()
+                    datagrams += 1
+
+                # let the messages still queued or scheduled reach the callback
+                expected = self.__get_decoded() - decoded_before
+                deadline = time.perf_counter() + drain_timeout
+                while len(durations) < expected and time.perf_counter() < deadline:
+                    await asyncio.sleep(0)
+                    expected = self.__get_decoded() - decoded_before
+
+                elapsed = time.perf_counter() - started
+
+                if len(durations) < expected:
+                    self.logger.warning("[{}] of [{}] decoded messages were not handled within [{}] s".format(
+                        expected - len(durations), expected, drain_timeout))
+
+        finally:
+            protocol.on_msg_rx_callback = callback
+
+        durations.sort()
+
+        def percentile(fraction):
+            if len(durations) == 0:
+                return 0.0
+            return durations[min(len(durations) - 1, int(fraction * len(durations)))]
+
+        results = {
+            'datagrams': datagrams,
+            'messages': len(durations),
+            'seconds': elapsed,
+            'messages_per_second': len(durations) / elapsed if elapsed > 0 else 0.0,
+            'p50_handler_latency': percentile(0.5),
+            'p99_handler_latency': percentile(0.99),
+            'max_handler_latency': durations[-1] if durations else 0.0,
+        }
+
+        self.logger.info("Replayed [{}] datagrams from [{}] at [{:.0f}] messages/s".format(
+            datagrams, path, results['messages_per_second']))
+
+        return results
+
+    def __get_decoded(self):
+        """Returns the messages the protocol decoded less those its dispatcher dropped, the callback should see them all"""
+
+        protocol = self.__protocol
+        decoded = protocol.get_stats()['decoded']
+        if protocol.dispatcher is not None:
+            decoded -= protocol.dispatcher.get_dropped()
+
+        return decoded
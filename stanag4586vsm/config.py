@@ -0,0 +1,234 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import json
+import os
+
+from .dispatch_queue import PRIORITY_NAMES
+from stanag4586edav1.message21 import *
+from stanag4586edav1.message300 import *
+
+"""Keys of the server section passed as they are to StanagServer.setup_service"""
+SERVER_KEYS = (
+    'port_rx', 'port_tx', 'addr_rx', 'addr_tx', 'rx_batch_size', 'rx_buffer_size', 'filter_foreign_traffic',
+    'lazy_decode', 'metrics', 'metrics_port', 'metrics_host', 'journal_path', 'vehicle_shards',
+)
+"""Sections of the server section and the setup_service keyword argument they are passed as"""
+SERVER_SECTIONS = {
+    'discovery': 'discovery_options',
+    'discovery_response': 'discovery_response_options',
+    'dispatch': 'dispatch_options',
+    'query_cache': 'query_cache_options',
+    'fragmentation': 'fragmentation_options',
+}
+VEHICLE_KEYS = (
+    'vehicle_id', 'first_vehicle_id', 'count', 'vsm_id', 'vehicle_type', 'vehicle_sub_type', 'stations',
+    'tail_number', 'mission_id', 'call_sign',
+)
+STATION_KEYS = ('name', 'station', 'payload_type')
+"""Longest identification accepted by the Message 20 fields"""
+IDENTIFICATION_LENGTHS = {'tail_number': 16, 'mission_id': 20, 'call_sign': 32}
+
+def load_config(path):
+    """Reads a fleet configuration from a .json, .yaml, .yml or .toml file and returns it as a dict.
+    YAML needs PyYAML and TOML needs python 3.11 or the tomli package."""
+
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == '.json':
+        with open(path) as file:
+            return json.load(file)
+
+    if extension in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("PyYAML is required to read [{}]".format(path))
+        with open(path) as file:
+            return yaml.safe_load(file) or {}
+
+    if extension == '.toml':
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ImportError("python 3.11 or the tomli package is required to read [{}]".format(path))
+        with open(path, 'rb') as file:
+            return tomllib.load(file)
+
+    raise ValueError("Unknown configuration format [{}], expected .json, .yaml, .yml or .toml".format(path))
+
+def compile_config(config):
+    """Validates a configuration dict and returns (mode, setup_kwargs, liveness, vehicles): the server mode,
+    the setup_service keyword arguments, the enable_liveness keyword arguments or None and the list of
+    add_vehicle keyword arguments of every vehicle, ranges expanded. Raises ValueError naming the bad field."""
+
+    _check_keys(config, ('server', 'station_sets', 'vehicles'), 'config')
+
+    server = config.get('server', {})
+    _check_keys(server, ('mode', 'liveness') + SERVER_KEYS + tuple(SERVER_SECTIONS.keys()), 'server')
+
+    mode = server.get('mode', 'vehicle')
+    if mode not in ('vehicle', 'cucs'):
+        raise ValueError("server.mode must be vehicle or cucs, got [{}]".format(mode))
+
+    setup_kwargs = {key: server[key] for key in SERVER_KEYS if key in server}
+    for section, argument in SERVER_SECTIONS.items():
+        if section in server:
+            setup_kwargs[argument] = dict(server[section])
+
+    if 'dispatch_options' in setup_kwargs:
+        setup_kwargs['dispatch_options'] = _compile_dispatch(setup_kwargs['dispatch_options'])
+
+    liveness = server.get('liveness')
+    if liveness is not None:
+        _check_keys(liveness, ('timeout', 'tick'), 'server.liveness')
+        liveness = dict(liveness)
+
+    station_sets = {}
+    for name, stations in config.get('station_sets', {}).items():
+        station_sets[name] = _compile_stations(stations, "station_sets.{}".format(name))
+
+    vehicles = []
+    seen = set()
+    for index, vehicle in enumerate(config.get('vehicles', [])):
+        for kwargs in _compile_vehicle(vehicle, station_sets, "vehicles[{}]".format(index)):
+            if kwargs['vehicle_id'] in seen:
+                raise ValueError("vehicles[{}]: vehicle id [{}] is configured twice".format(index, kwargs['vehicle_id']))
+            seen.add(kwargs['vehicle_id'])
+            vehicles.append(kwargs)
+
+    if mode == 'cucs' and vehicles:
+        raise ValueError("vehicles can only be configured in vehicle mode")
+
+    return mode, setup_kwargs, liveness, vehicles
+
+def _check_keys(section, allowed, where):
+
+    if not isinstance(section, dict):
+        raise ValueError("{} must be a table".format(where))
+
+    for key in section.keys():
+        if key not in allowed:
+            raise ValueError("{}: unknown key [{}]".format(where, key))
+
+def _constant(value, owner, prefix, where):
+    """Returns value if it is an int, else the constant of owner named prefix + value"""
+
+    if isinstance(value, int):
+        return value
+
+    constant = getattr(owner, prefix + str(value).upper(), None)
+    if not isinstance(constant, int):
+        raise ValueError("{}: unknown value [{}]".format(where, value))
+
+    return constant
+
+def _compile_dispatch(options):
+    """Priority classes may be given by name, e.g. queue_sizes = {telemetry = 512}"""
+
+    priorities = {name: priority for priority, name in PRIORITY_NAMES.items()}
+
+    def priority_of(value, where):
+        if isinstance(value, int):
+            return value
+        if str(value).isdigit():
+            return int(value)
+        if value not in priorities:
+            raise ValueError("{}: unknown priority class [{}]".format(where, value))
+        return priorities[value]
+
+    if 'queue_sizes' in options:
+        options['queue_sizes'] = {priority_of(key, 'server.dispatch.queue_sizes'): size
+            for key, size in options['queue_sizes'].items()}
+
+    if 'priorities' in options:
+        options['priorities'] = {int(message_type): priority_of(value, 'server.dispatch.priorities')
+            for message_type, value in options['priorities'].items()}
+
+    return options
+
+def _compile_stations(stations, where):
+    """Returns the list of (name, station number, payload type) taken by StanagServer.add_vehicle"""
+
+    if not isinstance(stations, list) or len(stations) == 0:
+        raise ValueError("{} must be a non empty list of stations".format(where))
+
+    compiled = []
+    names = set()
+    numbers = set()
+
+    for index, station in enumerate(stations):
+        station_where = "{}[{}]".format(where, index)
+        _check_keys(station, STATION_KEYS, station_where)
+
+        if 'name' not in station or 'station' not in station:
+            raise ValueError("{}: name and station are required".format(station_where))
+
+        name = station['name']
+        number = station['station']
+        if not isinstance(number, int) or number < 0:
+            raise ValueError("{}: station must be a station number, got [{}]".format(station_where, number))
+        if number != 0 and number & (number - 1) != 0:
+            raise ValueError("{}: payload station numbers are single bit flags, got [{}]".format(station_where, number))
+        if name in names or number in numbers:
+            raise ValueError("{}: station [{}] number [{}] is used twice".format(station_where, name, number))
+        names.add(name)
+        numbers.add(number)
+
+        payload_type = None
+        if number != 0:
+            payload_type = _constant(station.get('payload_type', Message300.PAYLOAD_TYPE_UNSPECIFIED),
+                Message300, 'PAYLOAD_TYPE_', station_where + '.payload_type')
+
+        compiled.append((name, number, payload_type))
+
+    return compiled
+
+def _compile_vehicle(vehicle, station_sets, where):
+    """Yields the add_vehicle keyword arguments of a vehicle entry, one per vehicle of a range"""
+
+    _check_keys(vehicle, VEHICLE_KEYS, where)
+
+    if 'vehicle_id' in vehicle:
+        if 'first_vehicle_id' in vehicle or 'count' in vehicle:
+            raise ValueError("{}: give either vehicle_id or first_vehicle_id and count".format(where))
+        vehicle_ids = [vehicle['vehicle_id']]
+    elif 'first_vehicle_id' in vehicle:
+        vehicle_ids = range(vehicle['first_vehicle_id'], vehicle['first_vehicle_id'] + vehicle.get('count', 1))
+    else:
+        raise ValueError("{}: vehicle_id or first_vehicle_id is required".format(where))
+
+    stations = vehicle.get('stations')
+    if isinstance(stations, str):
+        if stations not in station_sets:
+            raise ValueError("{}: unknown station set [{}]".format(where, stations))
+        stations = station_sets[stations]
+    elif stations is not None:
+        stations = _compile_stations(stations, where + '.stations')
+
+    vehicle_type = _constant(vehicle.get('vehicle_type', 0), Message21, 'VEHICLE_TYPE_', where + '.vehicle_type')
+    vehicle_sub_type = _constant(vehicle.get('vehicle_sub_type', 0), Message21, '', where + '.vehicle_sub_type')
+
+    for index, vehicle_id in enumerate(vehicle_ids):
+        kwargs = {
+            'vehicle_id': vehicle_id,
+            'vsm_id': vehicle.get('vsm_id', 0),
+            'vehicle_type': vehicle_type,
+            'vehicle_sub_type': vehicle_sub_type,
+            'stations': stations,
+        }
+
+        # identification may be a format string of the vehicle id and its index in the range
+        for key, max_length in IDENTIFICATION_LENGTHS.items():
+            if key in vehicle:
+                value = str(vehicle[key]).format(vehicle_id=vehicle_id, index=index)
+                if len(value) == 0 or len(value) > max_length or not value.isascii():
+                    raise ValueError("{}.{} must be 1 to {} ascii characters, got [{}]".format(where, key, max_length, value))
+                kwargs[key] = value
+
+        yield kwargs
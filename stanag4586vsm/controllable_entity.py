@@ -1,30 +1,54 @@
 from enum import auto
+import asyncio
+import inspect
 import logging
+import struct
 import sys
 from stanag4586edav1.message_wrapper import *
 from stanag4586edav1.message01 import *
 from stanag4586edav1.message20 import *
 from stanag4586edav1.message21 import *
 from stanag4586edav1.message300 import *
+from stanag4586edav1.message20010 import *
+from stanag4586edav1.message20020 import *
+
+"""Offsets of the fields patched into the pre-encoded reply templates, relative to the start of the datagram"""
+_OFFSET_INSTANCE_ID = MessageWrapper.msg_instance_id.offset
+_OFFSET_20_CUCS_ID = MessageWrapper.MSGLEN + Message20.cucs_id.offset
+_OFFSET_21_CUCS_ID = MessageWrapper.MSGLEN + Message21.cucs_id.offset
+_OFFSET_21_LOI_AUTHORIZED = MessageWrapper.MSGLEN + Message21.loi_authorized.offset
+_OFFSET_21_LOI_GRANTED = MessageWrapper.MSGLEN + Message21.loi_granted.offset
+_OFFSET_21_CONTROLLED_STATION_MODE = MessageWrapper.MSGLEN + Message21.controlled_station_mode.offset
+_OFFSET_300_CUCS_ID = MessageWrapper.MSGLEN + Message300.cucs_id.offset
+_OFFSET_20020_CUCS_ID = MessageWrapper.MSGLEN + Message20020.cucs_id.offset
+
+_UINT32 = struct.Struct('>I')
+
+class _Extended:
+    """Message followed by trailing bytes, as taken by MessageWrapper.wrap_message"""
+
+    __slots__ = ('__msg', '__trailer')
+
+    def __init__(self, msg, trailer):
+        self.__msg = msg
+        self.__trailer = trailer
+
+    def encode(self):
+        return self.__msg.encode() + self.__trailer
 
 class ControllableEntity:
 
-    """The id by which a cucs may refer to this station"""
-    __station_id = 0x0 #by default we are the base platform
-    __vsm_id = 0x0
-    __vehicle_id = 0x0
-    __vehicle_type = 0x0
-    __vehicle_sub_type = 0x0
-    __monitoring_cucs_list = []
-    __controlling_cucs_id = 0x0
-    __loop = None
-    __available_stations = 0x00
-    """Payload type identifies this station as being eo, mast, bay door etc"""
-    __payload_type = 0x00
-    __callback_unhandled_messages = None
+    __slots__ = (
+        '__station_id', '__vsm_id', '__vehicle_id', '__vehicle_type', '__vehicle_sub_type',
+        '__monitoring_cucs', '__controlling_cucs_id', '__loop', '__available_stations', '__payload_type',
+        '__callback_unhandled_messages', '__callback_loi_change', '__callback_tx_data', '__reply_templates',
+        '__discovery_limiter', '__loi_listeners', '__tail_number', '__mission_id', '__call_sign',
+        '__query_handlers', '__query_cache', '__queries_in_flight', '__query_generation', '__query_counters', 'logger',
+    )
 
     def __init__(self, loop, debug_level, station_id, vsm_id, vehicle_id, vehicle_type, vehicle_sub_type, callback_tx_data):
         self.__loop = loop
+        """The id by which a cucs may refer to this station, 0 is the base platform"""
         self.__station_id = station_id
         self.__vsm_id = vsm_id
         self.__vehicle_id = vehicle_id
@@ -32,6 +56,35 @@ class ControllableEntity:
         self.__vehicle_sub_type = vehicle_sub_type
         self.__callback_tx_data = callback_tx_data
 
+        """Set of cucs ids monitoring this station"""
+        self.__monitoring_cucs = set()
+        self.__controlling_cucs_id = 0x0
+        self.__available_stations = 0x00
+        """Payload type identifies this station as being eo, mast, bay door etc"""
+        self.__payload_type = 0x00
+        """Vehicle identification reported in Message 20 by the base platform"""
+        self.__tail_number = "1234"
+        self.__mission_id = "1234"
+        self.__call_sign = "1234"
+        self.__callback_unhandled_messages = None
+        self.__callback_loi_change = None
+        """Callables invoked with this entity after its LOI state changes, e.g. the LoiTable of the server"""
+        self.__loi_listeners = []
+        """Pre-encoded replies keyed by message type, only the per request fields are patched before sending"""
+        self.__reply_templates = None
+        """DiscoveryResponseLimiter shared by the entities of a server, None answers every discovery right away"""
+        self.__discovery_limiter = None
+        """query_type: (handler, ttl) answering Message 20010 queries of that type"""
+        self.__query_handlers = {}
+        """QueryResponseCache shared by the entities of a server, None computes every response"""
+        self.__query_cache = None
+        """query_type: list of (instance id, cucs id) waiting for the response being computed"""
+        self.__queries_in_flight = {}
+        """Incremented on invalidation so responses computed before it are not cached"""
+        self.__query_generation = 0
+        """Responses computed and queries answered by a computation already in flight"""
+        self.__query_counters = [0, 0]
+
         self.logger = logging.getLogger('ControllableEntity[{}]'.format(self.__station_id))
         self.logger.setLevel(debug_level)
 
@@ -52,11 +105,12 @@ class ControllableEntity:
 
     def getMonitoringCucs(self):
         """Returns list of cucs monitroing this station"""
-        return self.__monitoring_cucs_list
+        return list(self.__monitoring_cucs)
 
     def handle_message(self, wrapper, msg):
         """returns true if the message is handled"""
-        self.logger.debug("Got message [{}]".format(wrapper.message_type))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Got message [{}]".format(wrapper.message_type))
 
         # filter out unnecessary invocations of outer message handler below by ensuring this entity is the intended recepient
         # of the message
@@ -68,6 +122,9 @@ class ControllableEntity:
             self.logger.debug("Message is auth request.")
             return self.handle_auth_message(wrapper, msg)
 
+        if wrapper.message_type == 20010 and msg.query_type in self.__query_handlers:
+            self.handle_query(wrapper, msg)
+            return True
         
         # for messages that do not have station_number we have no choice but to invoke handler
         self.process_incoming_message(wrapper, msg)
@@ -78,6 +135,191 @@ class ControllableEntity:
         """for any messages we cannot process in this class"""
         self.__callback_unhandled_messages = callback
 
+    def set_callback_for_loi_change(self, callback):
+        """invoked with this entity after the controlling or monitoring cucs change"""
+        self.__callback_loi_change = callback
+
+    def add_listener_for_loi_change(self, callback):
+        """callback(entity) is invoked after the controlling or monitoring cucs change, along with the callback
+        set by set_callback_for_loi_change"""
+        self.__loi_listeners.append(callback)
+
+    def remove_listener_for_loi_change(self, callback):
+        if callback in self.__loi_listeners:
+            self.__loi_listeners.remove(callback)
+
+    def __invoke_handler_loi_change(self):
+        """invokes the __callback_loi_change if it's not None and the listeners"""
+        if self.__callback_loi_change is not None:
+            try:
+                self.__callback_loi_change(self)
+            except:
+                self.logger.error("Unhandled error: [{}]".format(sys.exc_info()[0]))
+
+        for listener in self.__loi_listeners:
+            try:
+                listener(self)
+            except:
+                self.logger.error("Unhandled error: [{}]".format(sys.exc_info()[0]))
+
+    def set_discovery_response_limiter(self, limiter):
+        self.__discovery_limiter = limiter
+
+    def set_query_cache(self, cache):
+        self.__query_cache = cache
+
+    def register_query_handler(self, query_type, handler, ttl = None):
+        """Answers the Message 20010 queries of query_type with Message 20020. handler(entity, msg) returns the
+        response string, or an awaitable of it, which is encoded once and cached for ttl seconds, None uses the
+        ttl of the cache and 0 does not cache. Queries arriving while an awaitable response is computed are
+        answered with it. Returns nothing."""
+        self.__query_handlers[query_type] = (handler, ttl)
+        self.invalidate_query(query_type)
+
+    def unregister_query_handler(self, query_type):
+        self.__query_handlers.pop(query_type, None)
+        self.invalidate_query(query_type)
+
+    def invalidate_query(self, query_type = None):
+        """Drops the cached responses of query_type, or of every query type, e.g. after the station configuration
+        changed. Responses in flight are still sent but not cached. Returns nothing."""
+
+        self.__query_generation += 1
+        if self.__query_cache is not None:
+            self.__query_cache.invalidate(self.__vehicle_id, self.__station_id, query_type)
+
+    def get_query_stats(self):
+        """Returns a dict with the responses computed, the queries answered by a computation already in flight
+        and the computations in flight"""
+        return {
+            'computed': self.__query_counters[0],
+            'collapsed': self.__query_counters[1],
+            'in_flight': len(self.__queries_in_flight),
+        }
+
+    def handle_query(self, wrapper, msg):
+        """Answers a Message 20010 from the cache, the computation in flight or the registered handler"""
+
+        query_type = msg.query_type
+        requester = (wrapper.msg_instance_id, msg.cucs_id)
+
+        cache = self.__query_cache
+        if cache is not None:
+            datagram = cache.get((self.__vehicle_id, self.__station_id, query_type))
+            if datagram is not None:
+                self.__send_query_response(datagram, requester)
+                return
+
+        waiting = self.__queries_in_flight.get(query_type)
+        if waiting is not None:
+            waiting.append(requester)
+            self.__query_counters[1] += 1
+            return
+
+        handler = self.__query_handlers[query_type][0]
+        self.__query_counters[0] += 1
+
+        try:
+            response = handler(self, msg)
+        except:
+            self.logger.error("Unhandled error: [{}]".format(sys.exc_info()[0]))
+            return
+
+        if inspect.isawaitable(response):
+            self.__queries_in_flight[query_type] = [requester]
+            future = asyncio.ensure_future(response, loop=self.__loop)
+            generation = self.__query_generation
+            future.add_done_callback(lambda future: self.__on_query_computed(query_type, generation, future))
+            return
+
+        self.__complete_query(query_type, self.__query_generation, response, [requester])
+
+    def __on_query_computed(self, query_type, generation, future):
+
+        requesters = self.__queries_in_flight.pop(query_type, ())
+
+        if future.cancelled() or future.exception() is not None:
+            self.logger.error("Query [{}] handler failed: [{}]".format(
+                query_type, None if future.cancelled() else type(future.exception())))
+            return
+
+        self.__complete_query(query_type, generation, future.result(), requesters)
+
+    def __complete_query(self, query_type, generation, response, requesters):
+        """Encodes the response, caches it unless invalidated meanwhile and sends it to every requester"""
+
+        datagram = self.build_query_response(query_type, response)
+        if datagram is None:
+            return
+
+        cache = self.__query_cache
+        entry = self.__query_handlers.get(query_type)
+        if cache is not None and entry is not None and entry[1] != 0 and generation == self.__query_generation:
+            cache.put((self.__vehicle_id, self.__station_id, query_type), datagram, entry[1])
+
+        for requester in requesters:
+            self.__send_query_response(datagram, requester)
+
+    def build_query_response(self, query_type, response):
+        """Returns the Message 20020 datagram carrying response with a zero instance and cucs id, or None if the
+        response is not an ascii str. Responses longer than the response field continue after the message, see
+        query_cache.get_query_response, and need fragmentation once the datagram exceeds the link MTU."""
+
+        if not isinstance(response, str):
+            self.logger.error("Query [{}] handler failed: [returned {} instead of str]".format(query_type, type(response)))
+            return None
+
+        msg20020 = Message20020(Message20020.MSGNULL)
+        msg20020.time_stamp = 0x00
+        msg20020.vehicle_id = self.__vehicle_id
+        msg20020.station_number = self.__station_id
+        msg20020.requested_query_type = query_type
+
+        # the response field holds the first characters of a long response, the rest follows the message
+        size = Message20020.response.size
+        try:
+            trailer = response[size:].encode('ascii')
+            encoded = msg20020.set_response(response[:size])
+        except UnicodeEncodeError:
+            encoded = False
+
+        if not encoded:
+            self.logger.error("Response to query [{}] is not ascii".format(query_type))
+            return None
+
+        return bytes(MessageWrapper(MessageWrapper.MSGNULL).wrap_message(0, 20020, _Extended(msg20020, trailer), False))
+
+    def __send_query_response(self, datagram, requester):
+
+        reply = bytearray(datagram)
+        _UINT32.pack_into(reply, _OFFSET_INSTANCE_ID, requester[0])
+        _UINT32.pack_into(reply, _OFFSET_20020_CUCS_ID, requester[1] & 0xFFFFFFFF)
+
+        self.__callback_tx_data(reply)
+
+    def restore_loi_state(self, controlling_cucs_id, monitoring_cucs):
+        """Restores control and monitoring granted earlier, e.g. by a previous process. Returns nothing."""
+        self.__controlling_cucs_id = controlling_cucs_id
+        self.__monitoring_cucs = set(monitoring_cucs)
+        self.invalidate_reply_templates()
+
+    def set_loi_state(self, controlling_cucs_id, monitoring_cucs):
+        """Replaces the controlling and monitoring cucs, e.g. for a batch handover, and notifies the LOI change
+        callbacks when they differ. Returns true if the state changed."""
+
+        monitoring_cucs = set(monitoring_cucs)
+        if controlling_cucs_id == self.__controlling_cucs_id and monitoring_cucs == self.__monitoring_cucs:
+            return False
+
+        if controlling_cucs_id != self.__controlling_cucs_id:
+            self.__controlling_cucs_id = controlling_cucs_id
+            self.invalidate_reply_templates()
+        self.__monitoring_cucs = monitoring_cucs
+
+        self.__invoke_handler_loi_change()
+
+        return True
+
     def process_incoming_message(self, wrapper, msg):
         """invokes the __callback_unhandled_messages if it's not None"""
         if self.__callback_unhandled_messages is not None:
@@ -107,87 +349,133 @@ class ControllableEntity:
         
         self.logger.debug("Handling discovery request")
 
-        self.respond_21(wrapper, msg)
+        limiter = self.__discovery_limiter
+        if limiter is None:
+            self.respond_21(wrapper, msg)
+
+            if self.__station_id == 0x0: #base platform
+                self.respond_20(wrapper, msg)
+
+            self.respond_300(wrapper, msg)
+            return
+
+        if not limiter.allow(msg.cucs_id, self.__vehicle_id, self.__station_id):
+            self.logger.debug("Discovery response suppressed")
+            return
 
+        replies = [self.build_reply_21(wrapper, msg)]
         if self.__station_id == 0x0: #base platform
-            self.respond_20(wrapper, msg)
+            replies.append(self.build_reply_20(wrapper, msg))
+        else:
+            replies.append(self.build_reply_300(wrapper, msg))
 
-        self.respond_300(wrapper, msg)
+        limiter.submit(msg.cucs_id, self.__vehicle_id, self.__station_id, replies)
 
-    def respond_20(self, wrapper, msg):
-        self.logger.debug("Responding with Message 20")
+    def get_reply_template(self, msg_type):
+        """Returns the pre-encoded datagram for message 20, 21 or 300, the templates are built on first use"""
+        if self.__reply_templates is None:
+            self.__reply_templates = self.build_reply_templates()
 
-        msg20 = Message20(Message20.MSGNULL)
+        return self.__reply_templates[msg_type]
+
+    def invalidate_reply_templates(self):
+        """Discards the pre-encoded replies, they are rebuilt when next needed. Returns nothing."""
+        self.__reply_templates = None
+
+    def build_reply_templates(self):
+        """Encodes the static part of the replies sent by this entity, returns a dict of message type to bytes"""
 
+        msg20 = Message20(Message20.MSGNULL)
         msg20.time_stamp = 0x00
         msg20.vehicle_id = self.__vehicle_id
-        msg20.cucs_id = msg.cucs_id
         msg20.vsm_id = self.__vsm_id
         msg20.vehicle_id_update = 0x0
         msg20.vehicle_type = self.__vehicle_type
         msg20.vehicle_sub_type = self.__vehicle_sub_type
         msg20.owning_id = 0x00 #todo be filled from some config in future
-        msg20.set_tail_number("1234") #todo be filled from some config in future
-        msg20.set_mission_id("1234") #todo be filled from some config mission
-        msg20.set_atc_call_sign("1234") #todo be filled from some config in future
+        msg20.set_tail_number(self.__tail_number)
+        msg20.set_mission_id(self.__mission_id)
+        msg20.set_atc_call_sign(self.__call_sign)
         msg20.configuration_checksum = 0xABCD
 
-        wrapped_reply = MessageWrapper(MessageWrapper.MSGNULL)
-        wrapped_reply = wrapped_reply.wrap_message(wrapper.msg_instance_id, 20, msg20, False)
-
-        self.__loop.call_soon(self.__callback_tx_data, wrapped_reply)
-
-
-    def respond_21(self, wrapper, msg):
-        self.logger.debug("Responding with Message 21")
-        
         msg21 = Message21(Message21.MSGNULL)
-
         msg21.time_stamp = 0x00
         msg21.vehicle_id = self.__vehicle_id
-        msg21.cucs_id = msg.cucs_id
         msg21.vsm_id = self.__vsm_id
         msg21.data_link_id = 0x0
-        msg21.loi_authorized = self.get_loi_authorized(msg.cucs_id)
-        msg21.loi_granted = self.get_loi_granted(msg.cucs_id)
         msg21.controlled_station = self.__station_id
-        msg21.controlled_station_mode = 1 if ( (msg21.loi_granted & Message01.LOI_05) == Message01.LOI_05) else 0
         msg21.vehicle_type = self.__vehicle_type
         msg21.vehicle_sub_type = self.__vehicle_sub_type
 
-        wrapped_reply = MessageWrapper(MessageWrapper.MSGNULL)
-        wrapped_reply = wrapped_reply.wrap_message(wrapper.msg_instance_id, 21, msg21, False)
-
-        self.__loop.call_soon(self.__callback_tx_data, wrapped_reply)
-
-    def respond_300(self, wrapper, msg):
-
-        """No 300 for BP"""
-        if self.__station_id == 0: return
-
-        self.logger.debug("Responding with Message 300")
-        
         msg300 = Message300(Message300.MSGNULL)
         msg300.time_stamp = 0x00
         msg300.vehicle_id = self.__vehicle_id
-        msg300.cucs_id = msg.cucs_id
         msg300.vsm_id = self.__vsm_id
         msg300.station_number = self.__station_id
 
         if self.__station_id == 0x0:
             msg300.payload_stations_available = self.__available_stations
-            msg300.payload_type = Message300.STATION_TYPE_UNSPECIFIED
+            msg300.payload_type = Message300.PAYLOAD_TYPE_UNSPECIFIED
         else:
             msg300.payload_stations_available = 0x00
             msg300.payload_type = self.__payload_type
-        
+
         msg300.station_door = 0x00
         msg300.number_of_payload_recording_devices = 0x00
 
-        wrapped_reply = MessageWrapper(MessageWrapper.MSGNULL)
-        wrapped_reply = wrapped_reply.wrap_message(wrapper.msg_instance_id, 300, msg300, False)
+        return {
+            20: bytes(MessageWrapper(MessageWrapper.MSGNULL).wrap_message(0, 20, msg20, False)),
+            21: bytes(MessageWrapper(MessageWrapper.MSGNULL).wrap_message(0, 21, msg21, False)),
+            300: bytes(MessageWrapper(MessageWrapper.MSGNULL).wrap_message(0, 300, msg300, False)),
+        }
+
+    def respond_20(self, wrapper, msg):
+        self.logger.debug("Responding with Message 20")
+        self.__callback_tx_data(self.build_reply_20(wrapper, msg))
+
+    def respond_21(self, wrapper, msg):
+        self.logger.debug("Responding with Message 21")
+        self.__callback_tx_data(self.build_reply_21(wrapper, msg))
+
+    def respond_300(self, wrapper, msg):
+
+        """No 300 for BP"""
+        if self.__station_id == 0: return
+
+        self.logger.debug("Responding with Message 300")
+        self.__callback_tx_data(self.build_reply_300(wrapper, msg))
+
+    def build_reply_20(self, wrapper, msg):
+        """Returns the Message 20 datagram answering the request"""
+
+        reply = bytearray(self.get_reply_template(20))
+        _UINT32.pack_into(reply, _OFFSET_INSTANCE_ID, wrapper.msg_instance_id)
+        _UINT32.pack_into(reply, _OFFSET_20_CUCS_ID, msg.cucs_id & 0xFFFFFFFF)
+
+        return reply
+
+    def build_reply_21(self, wrapper, msg):
+        """Returns the Message 21 datagram answering the request"""
+
+        loi_granted = self.get_loi_granted(msg.cucs_id)
+
+        reply = bytearray(self.get_reply_template(21))
+        _UINT32.pack_into(reply, _OFFSET_INSTANCE_ID, wrapper.msg_instance_id)
+        _UINT32.pack_into(reply, _OFFSET_21_CUCS_ID, msg.cucs_id & 0xFFFFFFFF)
+        reply[_OFFSET_21_LOI_AUTHORIZED] = self.get_loi_authorized(msg.cucs_id)
+        reply[_OFFSET_21_LOI_GRANTED] = loi_granted
+        reply[_OFFSET_21_CONTROLLED_STATION_MODE] = 1 if ( (loi_granted & Message01.LOI_05) == Message01.LOI_05) else 0
 
-        self.__loop.call_soon(self.__callback_tx_data, wrapped_reply)
+        return reply
+
+    def build_reply_300(self, wrapper, msg):
+        """Returns the Message 300 datagram answering the request"""
+
+        reply = bytearray(self.get_reply_template(300))
+        _UINT32.pack_into(reply, _OFFSET_INSTANCE_ID, wrapper.msg_instance_id)
+        _UINT32.pack_into(reply, _OFFSET_300_CUCS_ID, msg.cucs_id & 0xFFFFFFFF)
+
+        return reply
 
     def get_loi_granted(self, requesting_cucs_id):
         """Calculates and returns the loi_granted field value given a cucs_id"""
@@ -197,9 +485,9 @@ class ControllableEntity:
         if self.__controlling_cucs_id == requesting_cucs_id:
             granted_loi = Message01.LOI_05
         
-        if requesting_cucs_id in self.__monitoring_cucs_list:
+        if requesting_cucs_id in self.__monitoring_cucs:
             """This is a repeat in case the previous statment is true since there is no control without monitoring"""
-            granted_loi = (granted_loi or Message01.LOI_02)
+            granted_loi = (granted_loi | Message01.LOI_02)
 
         return granted_loi
 
@@ -209,16 +497,34 @@ class ControllableEntity:
         """By default everyone can monitor"""
         authorized_loi = Message01.LOI_02
 
-        if self.__controlling_cucs_id in [0, requesting_cucs_id]:
-            authorized_loi = (authorized_loi or Message01.LOI_05)
+        if self.__controlling_cucs_id == 0 or self.__controlling_cucs_id == requesting_cucs_id:
+            authorized_loi = (authorized_loi | Message01.LOI_05)
         
         return authorized_loi
 
     def set_available_stations(self, available_stations):
         self.__available_stations = available_stations
+        self.invalidate_reply_templates()
     
+    def set_vehicle_meta(self, tail_number = None, mission_id = None, call_sign = None):
+        """Sets the identification reported in Message 20, arguments left as None are unchanged. Returns nothing."""
+
+        for name, value, max_length in (('tail_number', tail_number, 16), ('mission_id', mission_id, 20), ('call_sign', call_sign, 32)):
+            if value is not None and (len(value) == 0 or len(value) > max_length or not value.isascii()):
+                raise ValueError("{} must be 1 to {} ascii characters, got [{}]".format(name, max_length, value))
+
+        if tail_number is not None:
+            self.__tail_number = tail_number
+        if mission_id is not None:
+            self.__mission_id = mission_id
+        if call_sign is not None:
+            self.__call_sign = call_sign
+
+        self.invalidate_reply_templates()
+
     def set_payload_type(self, __payload_type):
         self.__payload_type = __payload_type
+        self.invalidate_reply_templates()
 
     def is_control_bit_set(self, msg):
 
@@ -231,38 +537,52 @@ class ControllableEntity:
         return (msg.requested_handover_loi & Message01.LOI_02) == Message01.LOI_02
 
     def add_cucs_to_monitoring_list(self, msg):
+        """returns true if the cucs was not already monitoring"""
         
-        if msg.cucs_id not in self.__monitoring_cucs_list:
-            self.__monitoring_cucs_list.append(msg.cucs_id)
+        added = msg.cucs_id not in self.__monitoring_cucs
+        if added:
+            self.__monitoring_cucs.add(msg.cucs_id)
             self.logger.debug("Cucs [{}] added to monitoring list.".format(msg.cucs_id))
         else:
             self.logger.debug("cucs_id already in monitoring list")
 
-        self.logger.debug("Monitoring list is: [{}]".format(self.__monitoring_cucs_list))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Monitoring list is: [{}]".format(self.__monitoring_cucs))
+
+        return added
 
     def remove_cucs_from_monitoring_list(self, msg):
+        """returns true if the cucs was monitoring"""
         
-        if msg.cucs_id in self.__monitoring_cucs_list:
-            self.__monitoring_cucs_list.remove(msg.cucs_id)
+        removed = msg.cucs_id in self.__monitoring_cucs
+        if removed:
+            self.__monitoring_cucs.remove(msg.cucs_id)
             self.logger.debug("Cucs [{}] removed from monitoring list.".format(msg.cucs_id))
         else:
             self.logger.debug("cucs_id not present in monitoring list")
 
-        self.logger.debug("Monitoring list is: [{}]".format(self.__monitoring_cucs_list))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Monitoring list is: [{}]".format(self.__monitoring_cucs))
+
+        return removed
 
     def handle_loi_request(self, wrapper, msg):
         self.logger.debug("Processing LOI request")
+
+        changed = False
         
         if msg.controlled_station_mode == 0x01:
             """asking for something"""
 
             if self.is_monitor_bit_set(msg):
                 """this is a request for monitor"""
-                self.add_cucs_to_monitoring_list(msg)
+                changed = self.add_cucs_to_monitoring_list(msg)
 
             if self.is_control_bit_set(msg):
                 if self.__controlling_cucs_id == 0:
                     self.__controlling_cucs_id = msg.cucs_id
+                    self.invalidate_reply_templates()
+                    changed = True
                     self.logger.debug("Control granted to [{}]".format(msg.cucs_id))
                 else:
                     self.logger.debug("Cannot grant control to [{}] as already controlled by [{}]".format(msg.cucs_id, self.__controlling_cucs_id))
@@ -272,14 +592,19 @@ class ControllableEntity:
 
             if self.is_monitor_bit_set(msg):
                 """this is a request about monitor"""
-                self.remove_cucs_from_monitoring_list(msg)
+                changed = self.remove_cucs_from_monitoring_list(msg)
 
             if self.is_control_bit_set(msg):
                 if self.__controlling_cucs_id == msg.cucs_id:
                     self.__controlling_cucs_id = 0
+                    self.invalidate_reply_templates()
+                    changed = True
                     self.logger.debug("Control revoked from [{}]".format(msg.cucs_id))
                 elif self.__controlling_cucs_id != 0:
                     self.logger.debug("Cannot remove control from [{}] as being controlled by [{}]".format(msg.cucs_id, self.__controlling_cucs_id))
 
+        if changed:
+            self.__invoke_handler_loi_change()
+
         self.respond_21(wrapper, msg)
 
@@ -0,0 +1,170 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+from .vehicle_registry import *
+from stanag4586edav1.message_wrapper import *
+from stanag4586edav1.message01 import *
+
+class DiscoveryScheduler:
+    """Broadcasts the Message 01 discovery from a CUCS at an adaptive rate.
+
+    A burst of burst_count discoveries burst_interval seconds apart is sent on start. The interval then starts
+    at min_interval and is multiplied by backoff after every round in which no vehicle was added or removed,
+    up to max_interval. A vehicle joining or leaving brings the interval back to min_interval and a vehicle or
+    station lost by the liveness tracking starts a new burst. Every interval is randomised by +/- jitter so
+    CUCSs started together do not poll in step. The discovery datagram is encoded once.
+
+    Liveness is refreshed by the replies to the discoveries, so while the liveness tracking of the controller
+    set with set_liveness_source is enabled the interval is kept to at most half its timeout, jitter included,
+    letting a vehicle miss one discovery before it is lost.
+    """
+
+    def __init__(self, loop, debug_level, cucs_id, callback_tx_data,
+        burst_count = 3, burst_interval = 0.5, min_interval = 5.0, max_interval = 60.0, backoff = 2.0, jitter = 0.1):
+
+        self.__loop = loop
+        self.__callback_tx_data = callback_tx_data
+
+        self.__burst_count = burst_count
+        self.__burst_interval = burst_interval
+        self.__min_interval = min_interval
+        self.__max_interval = max_interval
+        self.__backoff = backoff
+        self.__jitter = jitter
+
+        msg01 = Message01(Message01.MSGNULL)
+        msg01.make_discovery_message(cucs_id)
+        wrapper = MessageWrapper(MessageWrapper.MSGNULL)
+        self.__datagram = bytes(wrapper.wrap_message(1, 0x01, msg01, False))
+
+        """Discoveries left in the current burst"""
+        self.__burst_left = burst_count
+        self.__interval = min_interval
+        """Set when a vehicle joined or left since the last discovery"""
+        self.__fleet_changed = False
+        """Wakes the task when a burst has to start before the current interval ends"""
+        self.__wakeup = asyncio.Event()
+        """EntityController whose liveness timeout bounds the interval, None leaves max_interval as is"""
+        self.__liveness_source = None
+        self.__capped_timeout = None
+
+        self.__sent = 0
+        self.__bursts = 1
+        self.__started_at = None
+        self.__last_sent_at = None
+
+        self.logger = logging.getLogger('DiscoveryScheduler')
+        self.logger.setLevel(debug_level)
+
+    def get_datagram(self):
+        """Returns the pre-encoded discovery datagram"""
+        return self.__datagram
+
+    def get_stats(self):
+        """Returns a dict with the discoveries sent, the current interval and the average rate in discoveries per second"""
+
+        elapsed = time.monotonic() - self.__started_at if self.__started_at is not None else 0.0
+
+        return {
+            'sent': self.__sent,
+            'bursts': self.__bursts,
+            'interval': self.__burst_interval if self.__burst_left > 0 else self.__interval,
+            'min_interval': self.__min_interval,
+            'max_interval': self.__get_max_interval(),
+            'rate': self.__sent / elapsed if elapsed > 0 else 0.0,
+            'last_sent_at': self.__last_sent_at,
+        }
+
+    def set_liveness_source(self, controller):
+        """Keeps the interval below the liveness timeout of the EntityController while liveness is enabled, returns nothing."""
+        self.__liveness_source = controller
+
+    def __get_max_interval(self):
+        """Returns max_interval, lowered to half the liveness timeout less the jitter while liveness is enabled"""
+
+        timeout = None if self.__liveness_source is None else self.__liveness_source.get_liveness_timeout()
+        if timeout is None:
+            return self.__max_interval
+
+        limit = timeout / (2 * (1 + self.__jitter))
+        if limit < self.__max_interval and timeout != self.__capped_timeout:
+            self.__capped_timeout = timeout
+            self.logger.warning("max_interval [{}] would let vehicles expire with a liveness timeout of [{}], "
+                "capping the discovery interval to [{:.2f}]".format(self.__max_interval, timeout, limit))
+
+        return min(self.__max_interval, limit)
+
+    def burst(self):
+        """Starts a burst of discoveries right away, returns nothing."""
+
+        if self.__burst_left == 0:
+            self.__bursts += 1
+
+        self.__burst_left = self.__burst_count
+        self.__interval = self.__min_interval
+        self.__wakeup.set()
+
+    def on_vehicle_events(self, controller, events):
+        """Listener for the EntityController vehicle events"""
+
+        for event in events:
+            if event.kind == EVENT_VEHICLE_LOST or event.kind == EVENT_STATION_LOST:
+                self.logger.debug("Vehicle [{}] lost, starting a discovery burst".format(event.vehicle_id))
+                self.burst()
+                return
+
+            if event.kind == EVENT_VEHICLE_ADDED or event.kind == EVENT_VEHICLE_REMOVED:
+                self.__fleet_changed = True
+
+    async def run(self):
+        """Sends discoveries until cancelled"""
+
+        self.logger.debug("Started discover task")
+        self.__started_at = time.monotonic()
+
+        while True:
+            self.__wakeup.clear()
+            self.__send()
+
+            try:
+                await asyncio.wait_for(self.__wakeup.wait(), self.__next_delay())
+            except asyncio.TimeoutError:
+                pass
+
+    def __send(self):
+
+        self.__callback_tx_data(self.__datagram)
+        self.__sent += 1
+        self.__last_sent_at = time.monotonic()
+
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Discover message sent")
+
+    def __next_delay(self):
+
+        max_interval = self.__get_max_interval()
+
+        if self.__burst_left > 0:
+            self.__burst_left -= 1
+            if self.__burst_left > 0:
+                return self.__burst_interval
+            # the first interval after a burst starts from the minimum
+            self.__fleet_changed = False
+            interval = self.__interval
+        elif self.__fleet_changed:
+            self.__fleet_changed = False
+            self.__interval = interval = self.__min_interval
+        else:
+            interval = self.__interval
+            self.__interval = min(self.__interval * self.__backoff, max_interval)
+
+        interval = min(interval, max_interval)
+
+        return interval * random.uniform(1 - self.__jitter, 1 + self.__jitter)
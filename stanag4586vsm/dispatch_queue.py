@@ -0,0 +1,175 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import collections
+import logging
+import sys
+import time
+
+from .metrics import Histogram
+
+"""Priority classes, lower values are dispatched first"""
+PRIORITY_CONTROL = 0
+PRIORITY_COMMAND = 1
+PRIORITY_TELEMETRY = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_CONTROL: 'control',
+    PRIORITY_COMMAND: 'command',
+    PRIORITY_TELEMETRY: 'telemetry',
+}
+
+"""Message type to priority class, the types not listed are commands"""
+DEFAULT_PRIORITIES = {
+    1: PRIORITY_CONTROL,
+    21: PRIORITY_CONTROL,
+    301: PRIORITY_TELEMETRY,
+    302: PRIORITY_TELEMETRY,
+    20020: PRIORITY_TELEMETRY,
+    20030: PRIORITY_TELEMETRY,
+    20040: PRIORITY_TELEMETRY,
+}
+
+"""Messages each class holds at most"""
+DEFAULT_QUEUE_SIZES = {
+    PRIORITY_CONTROL: 1024,
+    PRIORITY_COMMAND: 1024,
+    PRIORITY_TELEMETRY: 256,
+}
+
+"""Upper bounds in seconds of the queue wait histogram buckets"""
+WAIT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+class PriorityDispatcher:
+    """Dispatch stage between StanagProtocol and the message handler, replacing one loop callback per message.
+
+    Messages are queued per priority class and drained once per loop iteration, highest class first and at
+    most batch_size messages per iteration, so a control message received during a burst of telemetry is
+    handled on the next iteration instead of after the whole burst. A full telemetry queue drops its oldest
+    message, the other classes drop the message being submitted. The time every message waited is recorded
+    per class.
+    """
+
+    def __init__(self, loop, debug_level, callback, priorities = None, queue_sizes = None, batch_size = 64):
+        self.__loop = loop
+        self.__callback = callback
+        self.__priorities = dict(DEFAULT_PRIORITIES if priorities is None else priorities)
+        self.__batch_size = batch_size
+
+        sizes = dict(DEFAULT_QUEUE_SIZES)
+        if queue_sizes is not None:
+            sizes.update(queue_sizes)
+
+        """One deque of (submitted_at, wrapper, msg) per class, in priority order"""
+        self.__classes = sorted(sizes.keys())
+        self.__queues = [collections.deque() for _ in self.__classes]
+        self.__queue_sizes = [sizes[priority] for priority in self.__classes]
+        self.__index = {priority: index for index, priority in enumerate(self.__classes)}
+        self.__drain_scheduled = False
+
+        for priority in self.__priorities.values():
+            if priority not in self.__index:
+                raise ValueError("Unknown priority class [{}]".format(priority))
+
+        self.__dispatched = [0] * len(self.__classes)
+        self.__dropped = [0] * len(self.__classes)
+        self.__max_depth = [0] * len(self.__classes)
+        self.__max_wait = [0.0] * len(self.__classes)
+        self.__waits = [Histogram(WAIT_BUCKETS) for _ in self.__classes]
+
+        """ServerMetrics whose dispatch latency is fed with the queue waits, None when metrics are disabled"""
+        self.metrics = None
+
+        self.logger = logging.getLogger('PriorityDispatcher')
+        self.logger.setLevel(debug_level)
+
+    def set_priority(self, message_type, priority):
+        """Assigns a message type to a priority class, returns nothing."""
+        if priority not in self.__index:
+            raise ValueError("Unknown priority class [{}]".format(priority))
+        self.__priorities[message_type] = priority
+
+    def submit(self, message_type, wrapper, msg):
+        """Queues a decoded message for the callback, returns false if it was dropped."""
+
+        index = self.__index[self.__priorities.get(message_type, PRIORITY_COMMAND)]
+        queue = self.__queues[index]
+
+        if len(queue) >= self.__queue_sizes[index]:
+            self.__dropped[index] += 1
+            if self.__classes[index] == PRIORITY_TELEMETRY:
+                queue.popleft()
+            else:
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug("Queue full, dropped message [{}]".format(message_type))
+                return False
+
+        queue.append((time.perf_counter(), wrapper, msg))
+
+        if len(queue) > self.__max_depth[index]:
+            self.__max_depth[index] = len(queue)
+
+        if not self.__drain_scheduled:
+            self.__drain_scheduled = True
+            self.__loop.call_soon(self.__drain)
+
+        return True
+
+    def __drain(self):
+
+        self.__drain_scheduled = False
+
+        callback = self.__callback
+        metrics = self.metrics
+        budget = self.__batch_size
+
+        for index, queue in enumerate(self.__queues):
+            waits = self.__waits[index]
+
+            while queue and budget > 0:
+                submitted_at, wrapper, msg = queue.popleft()
+                budget -= 1
+
+                wait = time.perf_counter() - submitted_at
+                waits.observe(wait)
+                if wait > self.__max_wait[index]:
+                    self.__max_wait[index] = wait
+                if metrics is not None:
+                    metrics.on_dispatch(wait)
+
+                self.__dispatched[index] += 1
+
+                try:
+                    callback(wrapper, msg)
+                except:
+                    self.logger.error("Unhandled error: [{}]".format(sys.exc_info()[0]))
+
+        # leftovers wait for the next iteration, letting newly received control messages go first
+        if any(self.__queues):
+            self.__drain_scheduled = True
+            self.__loop.call_soon(self.__drain)
+
+    def get_dropped(self):
+        """Returns the messages dropped by all the classes"""
+        return sum(self.__dropped)
+
+    def get_stats(self):
+        """Returns a dict with, for every class, the queue depth, messages dispatched and dropped and the queue
+        wait percentiles in seconds, keys are prefixed with the class name, e.g. control_p99_wait"""
+
+        stats = {}
+        for index, priority in enumerate(self.__classes):
+            name = PRIORITY_NAMES.get(priority, str(priority))
+            waits = self.__waits[index]
+
+            stats[name + '_queued'] = len(self.__queues[index])
+            stats[name + '_max_depth'] = self.__max_depth[index]
+            stats[name + '_dispatched'] = self.__dispatched[index]
+            stats[name + '_dropped'] = self.__dropped[index]
+            stats[name + '_p50_wait'] = waits.percentile(0.5)
+            stats[name + '_p99_wait'] = waits.percentile(0.99)
+            stats[name + '_max_wait'] = self.__max_wait[index]
+
+        return stats
@@ -1,8 +1,10 @@
 from enum import auto
+import asyncio
 import logging
 import sys
-import copy
 
+from .timer_wheel import TimerWheel
+from .vehicle_registry import *
 from stanag4586edav1.message_wrapper import *
 from stanag4586edav1.message01 import *
 from stanag4586edav1.message20 import *
@@ -10,67 +12,100 @@ from stanag4586edav1.message21 import *
 from stanag4586edav1.message300 import *
 from stanag4586edav1.message20010 import *
 
+"""Instance ids below this are left to the fire and forget requests and the discovery"""
+FIRST_REQUEST_INSTANCE_ID = 0x100
+_LAST_INSTANCE_ID = 0xFFFFFFFF
+
+class _PendingRequest:
+    """A request awaiting its response, retransmitted with the same instance id until attempts run out"""
+
+    __slots__ = ('future', 'datagram', 'timeout', 'attempts_left', 'handle')
+
+    def __init__(self, future, datagram, timeout, attempts_left):
+        self.future = future
+        self.datagram = datagram
+        self.timeout = timeout
+        self.attempts_left = attempts_left
+        self.handle = None
+
 
 class EntityController:
     """CUCS end utility to manage incoming responses for vehicles"""
 
-    KEY_META = 0
-    KEY_STATIONS = 1
-    KEY_CONTROLLED = 2
-    KEY_MONITORED = 3
-    KEY_TYPE = 4
-    KEY_SUB_TYPE = 5
-    KEY_TAIL_NUMBER = 6
-    KEY_MISSION_ID = 7
-    KEY_CALL_SIGN = 8
+    KEY_META = KEY_META
+    KEY_STATIONS = KEY_STATIONS
+    KEY_CONTROLLED = KEY_CONTROLLED
+    KEY_MONITORED = KEY_MONITORED
+    KEY_TYPE = KEY_TYPE
+    KEY_SUB_TYPE = KEY_SUB_TYPE
+    KEY_TAIL_NUMBER = KEY_TAIL_NUMBER
+    KEY_MISSION_ID = KEY_MISSION_ID
+    KEY_CALL_SIGN = KEY_CALL_SIGN
     #whether if the station can be controlled by this cucs
-    KEY_CONTROLLABLE = 9
-
-    __cucs_id = 0x0
-    __vsm_id = 0x0
-    __loop = None
-    __callback_unhandled_messages = None
-    __callback_vehicle_discovery = None
-
-    # __vehicles contains the list of discovered platfomrs on the network, the format
-    # of this structure is as follows
-    # {
-    #   vehicle_id : {
-    #       KEY_CONTROLLED: Boolean
-    #       KEY_MONITORED : Boolean
-    #       KEY_CONTROLLABLE: Boolean
-    #       KEY_TYPE: int
-    #       KEY_SUB_TYPE: int
-    #       KEY_META : {
-    #           KEY_CALL_SIGN: string
-    #           KEY_MISSION_ID: string
-    #           KEY_TAIL_NUMBER: string 
-    #       } 
-    #       KEY_STATIONS : {
-    #           station_id: {
-    #               KEY_CONTROLLED: Boolean
-    #               KEY_MONITORED : Boolean  
-    #               KEY_TYPE: int
-    #           }
-    #       }
-    #   }
-    # }
-    __vehicles = {}
-    
+    KEY_CONTROLLABLE = KEY_CONTROLLABLE
+
+    EVENT_VEHICLE_ADDED = EVENT_VEHICLE_ADDED
+    EVENT_VEHICLE_REMOVED = EVENT_VEHICLE_REMOVED
+    EVENT_LOI_CHANGED = EVENT_LOI_CHANGED
+    EVENT_STATION_CHANGED = EVENT_STATION_CHANGED
+    EVENT_VEHICLE_UPDATED = EVENT_VEHICLE_UPDATED
+    EVENT_VEHICLE_LOST = EVENT_VEHICLE_LOST
+    EVENT_STATION_LOST = EVENT_STATION_LOST
+
+    __slots__ = (
+        '__cucs_id', '__vsm_id', '__loop', '__callback_tx_data',
+        '__callback_unhandled_messages', '__callback_vehicle_discovery', '__vehicles', '__unpopulated_station_loi',
+        '__event_listeners', '__coalesce_window', '__pending_events', '__flush_handle',
+        '__last_seen', '__liveness_timeout', '__liveness_wheel', '__liveness_handle',
+        '__next_instance_id', '__pending_requests', '__request_stats', 'logger',
+    )
 
     def __init__(self, loop, debug_level, cucs_id, vsm_id, callback_tx_data):
         self.__loop = loop
         self.__cucs_id = cucs_id
         self.__vsm_id = vsm_id
         self.__callback_tx_data = callback_tx_data
+        self.__callback_unhandled_messages = None
+        self.__callback_vehicle_discovery = None
+
+        """Discovered platforms on the network, handed out to consumers as immutable snapshots"""
+        self.__vehicles = VehicleRegistry()
+        """(vehicle_id, station_id): (controllable, controlled, monitored) of the last Message 21 for a station no
+        Message 300 populated yet, applied when the station is added"""
+        self.__unpopulated_station_loi = {}
+
+        """Callbacks receiving lists of VehicleEvent"""
+        self.__event_listeners = []
+        """Seconds during which events are collected and merged before being delivered, 0 delivers on the next loop iteration"""
+        self.__coalesce_window = 0
+        """(kind, vehicle_id, station_id): last view of the vehicle for removals, None otherwise"""
+        self.__pending_events = {}
+        self.__flush_handle = None
+
+        """(vehicle_id, station_id or None): loop time of the last message, kept only while liveness is enabled"""
+        self.__last_seen = {}
+        self.__liveness_timeout = None
+        """Holds one deadline per vehicle and station, rescheduled on every message, whatever expires is evicted"""
+        self.__liveness_wheel = None
+        self.__liveness_handle = None
+
+        """Instance id of the next awaitable request, echoed back by the vehicle in the response"""
+        self.__next_instance_id = FIRST_REQUEST_INSTANCE_ID
+        """(vehicle_id, station_id, instance_id): _PendingRequest"""
+        self.__pending_requests = {}
+        self.__request_stats = {'sent': 0, 'completed': 0, 'retransmits': 0, 'timeouts': 0}
 
         self.logger = logging.getLogger('EntityController')
         self.logger.setLevel(debug_level)
 
 
     def get_discovered_vehicles(self):
-        """Getter that returns a copy of __vehicles field"""
-        return copy.copy(self.__vehicles)
+        """Returns an immutable snapshot, a mapping of vehicle_id to VehicleView"""
+        return self.__vehicles.snapshot()
+
+    def get_vehicle_registry(self):
+        """Returns the VehicleRegistry for indexed queries, e.g. by vehicle type or controlled state"""
+        return self.__vehicles
 
     def set_callback_for_unhandled_messages(self, callback):
         """for any messages we cannot process in this class"""
@@ -87,32 +122,184 @@ class EntityController:
                 self.logger.error("Unhandled error: [{}]".format(sys.exc_info()[0]))
 
     def set_callback_for_vehicle_discovery(self, callback):
-        """invoked after a vehicle discovery or change in LOI"""
+        """invoked with the snapshot of all vehicles after a vehicle discovery or change in LOI, prefer the vehicle events"""
         self.__callback_vehicle_discovery = callback
 
+    def add_listener_for_vehicle_events(self, callback):
+        """callback(controller, events) is invoked with a list of VehicleEvent describing only what changed"""
+        self.__event_listeners.append(callback)
+
+    def remove_listener_for_vehicle_events(self, callback):
+        if callback in self.__event_listeners:
+            self.__event_listeners.remove(callback)
+
+    def set_vehicle_events_coalesce_window(self, seconds):
+        """Collects events for the given number of seconds and delivers them in one list, repeated changes to the
+        same vehicle or station are merged into one event and a vehicle added then removed in the window is dropped"""
+        self.__coalesce_window = seconds
+
+    def remove_vehicle(self, vehicle_id):
+        """Forgets a discovered vehicle, raising EVENT_VEHICLE_REMOVED. Returns true if the vehicle was known."""
+
+        view = self.__vehicles.view(vehicle_id)
+        if view is None:
+            return False
+
+        self.__evict_vehicle(vehicle_id, EVENT_VEHICLE_REMOVED, view)
+
+        return True
+
+    def enable_liveness(self, timeout = 15.0, tick = 0.5):
+        """Evicts the vehicles and stations not heard from in timeout seconds, raising EVENT_VEHICLE_LOST and
+        EVENT_STATION_LOST. Expiry is checked every tick seconds. Returns nothing."""
+
+        self.disable_liveness()
+
+        now = self.__loop.time()
+        self.__liveness_timeout = timeout
+        self.__liveness_wheel = TimerWheel(tick, now)
+
+        for vehicle_id in self.__vehicles.get_vehicle_ids():
+            self.__touch((vehicle_id, None), now)
+            for station_id in self.__vehicles.get(vehicle_id).stations.keys():
+                self.__touch((vehicle_id, station_id), now)
+
+        self.__liveness_handle = self.__loop.call_later(tick, self.__check_liveness)
+
+    def get_liveness_timeout(self):
+        """Returns the liveness timeout in seconds, None while liveness is disabled"""
+        return self.__liveness_timeout
+
+    def disable_liveness(self):
+        if self.__liveness_handle is not None:
+            self.__liveness_handle.cancel()
+
+        self.__liveness_handle = None
+        self.__liveness_wheel = None
+        self.__liveness_timeout = None
+        self.__last_seen.clear()
+
+    def get_last_seen(self, vehicle_id, station_id = None):
+        """Returns the loop time at which the vehicle or one of its stations was last heard from, or None.
+        Only tracked while liveness is enabled."""
+        return self.__last_seen.get((vehicle_id, station_id))
+
+    def __touch(self, key, now):
+        """Records traffic for a vehicle or station and pushes its deadline back"""
+
+        self.__last_seen[key] = now
+        self.__liveness_wheel.schedule(key, now + self.__liveness_timeout)
+
+    def __check_liveness(self):
+
+        wheel = self.__liveness_wheel
+
+        # only the keys not heard from within the timeout come out of the wheel, live ones cost nothing here
+        for key in wheel.advance(self.__loop.time()):
+            vehicle_id, station_id = key
+            if station_id is None:
+                view = self.__vehicles.view(vehicle_id)
+                if view is not None:
+                    self.logger.info("Vehicle [{}] lost".format(vehicle_id))
+                    self.__evict_vehicle(vehicle_id, EVENT_VEHICLE_LOST, view)
+            else:
+                self.__last_seen.pop(key, None)
+                vehicle = self.__vehicles.get(vehicle_id)
+                if vehicle is not None and self.__vehicles.remove_station(vehicle, station_id) is not None:
+                    self.logger.info("Station [{}] of vehicle [{}] lost".format(station_id, vehicle_id))
+                    self.__raise_event(EVENT_STATION_LOST, vehicle_id, station_id)
+
+        self.__liveness_handle = self.__loop.call_later(wheel.get_tick(), self.__check_liveness)
+
+    def __evict_vehicle(self, vehicle_id, kind, view):
+
+        vehicle = self.__vehicles.remove_vehicle(vehicle_id)
+
+        for key in [key for key in self.__unpopulated_station_loi.keys() if key[0] == vehicle_id]:
+            del self.__unpopulated_station_loi[key]
+
+        if self.__liveness_wheel is not None:
+            for key in [(vehicle_id, None)] + [(vehicle_id, station_id) for station_id in vehicle.stations.keys()]:
+                self.__last_seen.pop(key, None)
+                self.__liveness_wheel.cancel(key)
+
+        self.__raise_event(kind, vehicle_id, None, view)
+
+    def __raise_event(self, kind, vehicle_id, station_id = None, removed_view = None):
+
+        if len(self.__event_listeners) == 0:
+            return
+
+        pending = self.__pending_events
+
+        if kind == EVENT_VEHICLE_REMOVED or kind == EVENT_VEHICLE_LOST:
+            added_in_window = (EVENT_VEHICLE_ADDED, vehicle_id, None) in pending
+            for key in [key for key in pending.keys() if key[1] == vehicle_id]:
+                del pending[key]
+            if not added_in_window:
+                pending[(kind, vehicle_id, None)] = removed_view
+        else:
+            pending[(kind, vehicle_id, station_id)] = None
+
+        if self.__flush_handle is None:
+            if self.__coalesce_window > 0:
+                self.__flush_handle = self.__loop.call_later(self.__coalesce_window, self.__flush_events)
+            else:
+                self.__flush_handle = self.__loop.call_soon(self.__flush_events)
+
+    def __flush_events(self):
+        """Delivers the pending events to the listeners, vehicles are viewed as they are now"""
+
+        self.__flush_handle = None
+
+        pending = self.__pending_events
+        self.__pending_events = {}
+
+        views = {}
+        events = []
+
+        for (kind, vehicle_id, station_id), removed_view in pending.items():
+            if removed_view is not None:
+                view = removed_view
+            else:
+                view = views.get(vehicle_id)
+                if view is None:
+                    view = views[vehicle_id] = self.__vehicles.view(vehicle_id)
+                if view is None:
+                    continue
+
+            events.append(VehicleEvent(kind, vehicle_id, station_id, view))
+
+        if len(events) == 0:
+            return
+
+        for listener in list(self.__event_listeners):
+            try:
+                listener(self, events)
+            except:
+                self.logger.error("Unhandled error: [{}]".format(sys.exc_info()[0]))
+
     def __invoke_handler_vehicle_discovery(self):
         """invokes the handler if it's not None"""
 
         if self.__callback_vehicle_discovery is not None:
             try:
                 self.logger.debug("Inovking handler for vehicle discovery")
-                self.__loop.call_soon(self.__callback_vehicle_discovery, self, copy.copy(self.__vehicles))
+                self.__loop.call_soon(self.__callback_vehicle_discovery, self, self.__vehicles.snapshot())
             except:
                 self.logger.error("Unhandled error: [{}]".format(sys.exc_info()[0]))
 
 
     def handle_message(self, wrapper, msg):
         """examines incoming message and acts accordingly"""
-        self.logger.debug("Got message [{}]".format(wrapper.message_type))
-
-        raise_discovery = False
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Got message [{}]".format(wrapper.message_type))
 
         if wrapper.message_type == 21:
-            self.handle_message_21(wrapper, msg)
-            
-            # do not raise for paylaod stations
-            # if msg.controlled_station == 0:
-            raise_discovery = True
+            # only raise when something changed, repeated discovery responses are silent
+            if self.handle_message_21(wrapper, msg):
+                #raise event for ugv discovery
+                self.__invoke_handler_vehicle_discovery()
 
         elif wrapper.message_type == 20:
             self.handle_message_20(wrapper, msg)
@@ -121,97 +308,207 @@ class EntityController:
         elif wrapper.message_type == 300:
             self.handle_message_300(wrapper, msg)
             #handled = True
-        
-        if raise_discovery:
-            self.logger.debug(self.__vehicles)
-            #raise event for ugv discovery
-            self.__invoke_handler_vehicle_discovery()
-        else:
+
+        if self.__liveness_wheel is not None:
+            self.__seen(wrapper, msg)
+
+        if self.__pending_requests and (wrapper.message_type == 21 or wrapper.message_type == 20020):
+            self.__resolve_request(wrapper, msg)
+
+        if wrapper.message_type != 21:
             self.__invoke_handler_unhandled_msgs(wrapper, msg)
 
-    def handle_message_20(self, wrapper, msg):
+    def __seen(self, wrapper, msg):
+        """Liveness bookkeeping for Message 20, 21 and 300 from known vehicles and stations"""
+
+        if wrapper.message_type == 21:
+            station_id = msg.controlled_station
+        elif wrapper.message_type == 300:
+            station_id = msg.station_number
+        elif wrapper.message_type == 20:
+            station_id = None
+        else:
+            return
 
-        if msg.vehicle_id not in self.__vehicles.keys():
+        vehicle = self.__vehicles.get(msg.vehicle_id)
+        if vehicle is None:
             return
 
-        vehicle_ref = self.__vehicles[msg.vehicle_id]
-        vehicle_ref[self.KEY_META] = {}
-        vehicle_ref[self.KEY_META][self.KEY_CALL_SIGN] = msg.get_atc_call_sign()
-        vehicle_ref[self.KEY_META][self.KEY_MISSION_ID] = msg.get_mission_id()
-        vehicle_ref[self.KEY_META][self.KEY_TAIL_NUMBER] = msg.get_tail_number()
+        now = self.__loop.time()
+        self.__touch((msg.vehicle_id, None), now)
+
+        if station_id in vehicle.stations:
+            self.__touch((msg.vehicle_id, station_id), now)
+
+    def handle_message_20(self, wrapper, msg):
+        """returns true if the vehicle meta data changed"""
+
+        vehicle = self.__vehicles.get(msg.vehicle_id)
+        if vehicle is None:
+            return False
+
+        changed = self.__vehicles.update_vehicle_meta(
+            vehicle, msg.get_atc_call_sign(), msg.get_mission_id(), msg.get_tail_number())
+
+        if changed:
+            self.__raise_event(EVENT_VEHICLE_UPDATED, msg.vehicle_id)
+
+        return changed
 
     def handle_message_300(self, wrapper, msg):
+        """returns true if the station was added or its type changed"""
 
-        if msg.vehicle_id not in self.__vehicles.keys():
-            return
+        vehicle = self.__vehicles.get(msg.vehicle_id)
+        if vehicle is None:
+            return False
 
-        vehicle_ref = self.__vehicles[msg.vehicle_id]
+        added = msg.station_number not in vehicle.stations
+        station, changed = self.__vehicles.update_station(vehicle, msg.station_number, msg.payload_type)
 
-        if msg.station_number not in vehicle_ref[self.KEY_STATIONS].keys():
-            vehicle_ref[self.KEY_STATIONS][msg.station_number] = {
-                self.KEY_CONTROLLED: False,
-                self.KEY_MONITORED: False,
-                self.KEY_TYPE: msg.payload_type
-            }
-        else:
-            station_ref = vehicle_ref[self.KEY_STATIONS][msg.station_number]
-            station_ref[self.KEY_TYPE] =  msg.payload_type
+        # the station is reported with the LOI already granted instead of changing it on the next Message 21
+        if added:
+            loi = self.__unpopulated_station_loi.pop((msg.vehicle_id, msg.station_number), None)
+            if loi is not None:
+                self.__vehicles.update_station_loi(vehicle, station, *loi)
+
+        if changed:
+            self.__raise_event(EVENT_STATION_CHANGED, msg.vehicle_id, msg.station_number)
 
+        return changed
 
     def handle_message_21(self, wrapper, msg):
-        
-        vehicle_ref = None
-        if msg.vehicle_id not in self.__vehicles.keys():
-            self.__vehicles[msg.vehicle_id] = {
-                self.KEY_CONTROLLED: False,
-                self.KEY_MONITORED: False,
-                self.KEY_CONTROLLABLE: False,
-                self.KEY_META: None,
-                self.KEY_STATIONS: {}
-            }
-        
-        vehicle_ref = self.__vehicles[msg.vehicle_id]
-
-        if msg.controlled_station == 0:          
-            
-            if msg.controlled_station_mode == Message21.CONTROLLED_STATION_MODE_IN_CONTROL:
-                vehicle_ref[self.KEY_CONTROLLABLE] = True
-                vehicle_ref[self.KEY_CONTROLLED] = True
-                vehicle_ref[self.KEY_MONITORED] = True
+        """returns true if the vehicle was discovered or its state changed"""
+
+        vehicle, added = self.__vehicles.add_vehicle(msg.vehicle_id)
+        changed = added
+
+        if msg.controlled_station_mode == Message21.CONTROLLED_STATION_MODE_IN_CONTROL:
+            controllable = controlled = monitored = True
+        else:
+            controllable = (msg.loi_authorized & Message01.LOI_05) == Message01.LOI_05
+            controlled = False
+            monitored = (msg.loi_granted & Message01.LOI_02) == Message01.LOI_02
+
+        if msg.controlled_station == 0:
+            loi_changed = self.__vehicles.update_vehicle_loi(vehicle, controllable, controlled, monitored)
+            type_changed = self.__vehicles.update_vehicle_type(vehicle, msg.vehicle_type, msg.vehicle_sub_type)
+
+            # a new vehicle is reported once, its view already carries the LOI and type
+            if added:
+                self.__raise_event(EVENT_VEHICLE_ADDED, msg.vehicle_id)
             else:
-                vehicle_ref[self.KEY_CONTROLLABLE] = True if ( (msg.loi_authorized & Message01.LOI_05) == Message01.LOI_05) else False
-                vehicle_ref[self.KEY_CONTROLLED] = False
-                vehicle_ref[self.KEY_MONITORED] = True if ( (msg.loi_granted & Message01.LOI_02) == Message01.LOI_02) else False
+                if loi_changed:
+                    self.__raise_event(EVENT_LOI_CHANGED, msg.vehicle_id)
+                if type_changed:
+                    self.__raise_event(EVENT_VEHICLE_UPDATED, msg.vehicle_id)
+
+            changed |= loi_changed or type_changed
 
-            vehicle_ref[self.KEY_TYPE] = msg.vehicle_type
-            vehicle_ref[self.KEY_SUB_TYPE] = msg.vehicle_sub_type
-        
         else:
 
-            """Stations are populated on message 300 only, we skip if at least once 300 has not been processed"""
-            if msg.controlled_station in vehicle_ref[self.KEY_STATIONS].keys():
-                station_ref = vehicle_ref[self.KEY_STATIONS][msg.controlled_station]
+            if added:
+                self.__raise_event(EVENT_VEHICLE_ADDED, msg.vehicle_id)
 
-                if msg.controlled_station_mode == Message21.CONTROLLED_STATION_MODE_IN_CONTROL:
-                    station_ref[self.KEY_CONTROLLABLE] = True
-                    station_ref[self.KEY_CONTROLLED] = True
-                    station_ref[self.KEY_MONITORED] = True
-                else:
-                    station_ref[self.KEY_CONTROLLABLE] = True if ( (msg.loi_authorized & Message01.LOI_05) == Message01.LOI_05) else False
-                    station_ref[self.KEY_CONTROLLED] = False
-                    station_ref[self.KEY_MONITORED] = True if ( (msg.loi_granted & Message01.LOI_02) == Message01.LOI_02) else False
+            """Stations are populated on message 300 only, until then the LOI is kept for when it arrives"""
+            station = vehicle.stations.get(msg.controlled_station)
+            if station is None:
+                self.__unpopulated_station_loi[(msg.vehicle_id, msg.controlled_station)] = (controllable, controlled, monitored)
+            elif self.__vehicles.update_station_loi(vehicle, station, controllable, controlled, monitored):
+                self.__raise_event(EVENT_LOI_CHANGED, msg.vehicle_id, msg.controlled_station)
+                changed = True
 
+        return changed
 
-    def __tx_msg(self, msg_type, msg):
+
+    def __tx_msg(self, msg_type, msg, instance_id = 1):
 
         if self.__callback_tx_data is None:
             self.logger.warn("self.__callback_tx_data is none, unable to tx data")
             return
 
         wrapper = MessageWrapper(MessageWrapper.MSGNULL)
-        wrapped_msg = wrapper.wrap_message(1, msg_type, msg, False)
+        wrapped_msg = wrapper.wrap_message(instance_id, msg_type, msg, False)
+
+        self.__callback_tx_data(wrapped_msg)
+
+        return wrapped_msg
+
+    def get_request_stats(self):
+        """Returns a dict with the awaitable requests in flight, sent, completed, retransmitted and timed out"""
+        stats = dict(self.__request_stats)
+        stats['in_flight'] = len(self.__pending_requests)
+        return stats
+
+    def __allocate_instance_id(self, vehicle_id, station_id):
+
+        instance_id = self.__next_instance_id
+
+        # skips the ids still in flight for the same station after the counter wraps
+        while (vehicle_id, station_id, instance_id) in self.__pending_requests:
+            instance_id = FIRST_REQUEST_INSTANCE_ID if instance_id == _LAST_INSTANCE_ID else instance_id + 1
+
+        self.__next_instance_id = FIRST_REQUEST_INSTANCE_ID if instance_id == _LAST_INSTANCE_ID else instance_id + 1
+
+        return instance_id
+
+    def __request(self, msg_type, msg, station_id, vehicle_id, timeout, retries):
+        """Sends msg under a fresh instance id and returns a future resolved with the response"""
+
+        future = self.__loop.create_future()
+
+        instance_id = self.__allocate_instance_id(vehicle_id, station_id)
+        datagram = self.__tx_msg(msg_type, msg, instance_id)
+        if datagram is None:
+            future.set_exception(ConnectionError("No tx callback to send the request"))
+            return future
+
+        key = (vehicle_id, station_id, instance_id)
+        request = _PendingRequest(future, datagram, timeout, retries)
+        request.handle = self.__loop.call_later(timeout, self.__request_timed_out, key)
+        self.__pending_requests[key] = request
+        self.__request_stats['sent'] += 1
+
+        # a caller cancelling the future gives up the request
+        future.add_done_callback(lambda _: self.__forget_request(key, request))
+
+        return future
+
+    def __forget_request(self, key, request):
+        if self.__pending_requests.get(key) is request:
+            del self.__pending_requests[key]
+            request.handle.cancel()
+
+    def __request_timed_out(self, key):
+
+        request = self.__pending_requests.get(key)
+        if request is None:
+            return
+
+        if request.attempts_left > 0:
+            request.attempts_left -= 1
+            self.__request_stats['retransmits'] += 1
+            self.logger.debug("Retransmitting request [{}]".format(key))
+            self.__callback_tx_data(request.datagram)
+            request.handle = self.__loop.call_later(request.timeout, self.__request_timed_out, key)
+            return
+
+        self.__request_stats['timeouts'] += 1
+        request.future.set_exception(asyncio.TimeoutError("No response to request [{}]".format(key)))
 
-        self.__loop.call_soon(self.__callback_tx_data, wrapped_msg)
+    def __resolve_request(self, wrapper, msg):
+        """Completes the request the response answers, if it is one of ours"""
+
+        if msg.cucs_id & _LAST_INSTANCE_ID != self.__cucs_id & _LAST_INSTANCE_ID:
+            return
+
+        station_id = msg.controlled_station if wrapper.message_type == 21 else msg.station_number
+
+        request = self.__pending_requests.get((msg.vehicle_id, station_id, wrapper.msg_instance_id))
+        if request is None:
+            return
+
+        self.__request_stats['completed'] += 1
+        request.future.set_result(msg)
 
     def __create_msg_01(self, station_id, vehicle_id):
         
@@ -228,42 +525,17 @@ class EntityController:
 
         return msg01
 
-    def control_request(self, station_id, vehicle_id):
-        
-        msg01 = self.__create_msg_01(station_id, vehicle_id)
-        
-        msg01.requested_handover_loi = Message01.LOI_05 if station_id == 0 else Message01.LOI_03
-        msg01.controlled_station_mode = 0x01
-        
-        self.__tx_msg(1, msg01)
-
-    def control_release(self, station_id, vehicle_id):
+    def __create_loi_request(self, station_id, vehicle_id, requested_handover_loi, controlled_station_mode):
 
         msg01 = self.__create_msg_01(station_id, vehicle_id)
-        
-        msg01.requested_handover_loi = Message01.LOI_05 if station_id == 0 else Message01.LOI_03
-        msg01.controlled_station_mode = 0x00
-
-        self.__tx_msg(1, msg01)
-
-    def monitor_request(self, station_id, vehicle_id):
-        msg01 = self.__create_msg_01(station_id, vehicle_id)
-        
-        msg01.requested_handover_loi = Message01.LOI_02
-        msg01.controlled_station_mode = 0x01
 
-        self.__tx_msg(1, msg01)
+        msg01.requested_handover_loi = requested_handover_loi
+        msg01.controlled_station_mode = controlled_station_mode
 
-    def monitor_release(self, station_id, vehicle_id):
-        msg01 = self.__create_msg_01(station_id, vehicle_id)
-        
-        msg01.requested_handover_loi = Message01.LOI_02
-        msg01.controlled_station_mode = 0x00
+        return msg01
 
-        self.__tx_msg(1, msg01)
+    def __create_query(self, vehicle_id, station_id, query_type):
 
-    def query_request(self, vehicle_id, station_id, query_type = Message20010.QUERY_TYPE_SEND_CONFIG):
-        
         msg20010 = Message20010(Message20010.MSGNULL)
         msg20010.time_stamp = 0x00
         msg20010.vehicle_id = vehicle_id
@@ -271,4 +543,49 @@ class EntityController:
         msg20010.station_number = station_id
         msg20010.query_type = query_type
 
-        self.__tx_msg(20010, msg20010)
+        return msg20010
+
+    def __control_loi(self, station_id):
+        return Message01.LOI_05 if station_id == 0 else Message01.LOI_03
+
+    def control_request(self, station_id, vehicle_id):
+        self.__tx_msg(1, self.__create_loi_request(station_id, vehicle_id, self.__control_loi(station_id), 0x01))
+
+    def control_release(self, station_id, vehicle_id):
+        self.__tx_msg(1, self.__create_loi_request(station_id, vehicle_id, self.__control_loi(station_id), 0x00))
+
+    def monitor_request(self, station_id, vehicle_id):
+        self.__tx_msg(1, self.__create_loi_request(station_id, vehicle_id, Message01.LOI_02, 0x01))
+
+    def monitor_release(self, station_id, vehicle_id):
+        self.__tx_msg(1, self.__create_loi_request(station_id, vehicle_id, Message01.LOI_02, 0x00))
+
+    def query_request(self, vehicle_id, station_id, query_type = Message20010.QUERY_TYPE_SEND_CONFIG):
+        self.__tx_msg(20010, self.__create_query(vehicle_id, station_id, query_type))
+
+    """
+    Awaitable variants, each returns a future resolved with the response, the Message 21 for LOI requests and
+    the Message 20020 for queries. A request unanswered after timeout seconds is sent again, up to retries times,
+    then the future fails with asyncio.TimeoutError. Any number of requests can be in flight.
+    """
+
+    def control_request_async(self, station_id, vehicle_id, timeout = 1.0, retries = 2):
+        return self.__request(1, self.__create_loi_request(station_id, vehicle_id, self.__control_loi(station_id), 0x01),
+            station_id, vehicle_id, timeout, retries)
+
+    def control_release_async(self, station_id, vehicle_id, timeout = 1.0, retries = 2):
+        return self.__request(1, self.__create_loi_request(station_id, vehicle_id, self.__control_loi(station_id), 0x00),
+            station_id, vehicle_id, timeout, retries)
+
+    def monitor_request_async(self, station_id, vehicle_id, timeout = 1.0, retries = 2):
+        return self.__request(1, self.__create_loi_request(station_id, vehicle_id, Message01.LOI_02, 0x01),
+            station_id, vehicle_id, timeout, retries)
+
+    def monitor_release_async(self, station_id, vehicle_id, timeout = 1.0, retries = 2):
+        return self.__request(1, self.__create_loi_request(station_id, vehicle_id, Message01.LOI_02, 0x00),
+            station_id, vehicle_id, timeout, retries)
+
+    def query_request_async(self, vehicle_id, station_id, query_type = Message20010.QUERY_TYPE_SEND_CONFIG,
+        timeout = 1.0, retries = 2):
+        return self.__request(20010, self.__create_query(vehicle_id, station_id, query_type),
+            station_id, vehicle_id, timeout, retries)
@@ -0,0 +1,429 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import collections
+import logging
+import random
+import struct
+import sys
+
+from stanag4586edav1.message_wrapper import *
+from .timer_wheel import TimerWheel
+
+"""Custom message types carrying a fragment of a datagram and the request to retransmit missing fragments"""
+FRAGMENT_MESSAGE_TYPE = 20900
+FRAGMENT_NACK_MESSAGE_TYPE = 20910
+
+"""Fragment body: vehicle id, station number and message type of the fragmented datagram, transfer id, length of
+the datagram, fragment index and fragment count, followed by the fragment bytes. The wrapper carries the
+instance id of the fragmented datagram."""
+_FRAGMENT = struct.Struct('>iIIIIHH')
+"""Retransmit request body: vehicle id, station number, message type, transfer id and the count of the missing
+fragment indices which follow as unsigned shorts"""
+_NACK = struct.Struct('>iIIIH')
+_INDEX = struct.Struct('>H')
+
+"""Fragments a datagram is split into at most, the index is an unsigned short"""
+MAX_FRAGMENTS = 0xFFFF
+
+_OFFSET_INSTANCE_ID = MessageWrapper.msg_instance_id.offset
+_OFFSET_MESSAGE_TYPE = MessageWrapper.message_type.offset
+_UINT32 = struct.Struct('>I')
+
+def _wrap(instance_id, message_type, body):
+    wrapper = MessageWrapper(MessageWrapper.MSGNULL)
+    return wrapper.wrap_message(instance_id, message_type, _Body(body), False)
+
+class _Body:
+    """Raw body handed to MessageWrapper.wrap_message"""
+
+    __slots__ = ('__data',)
+
+    def __init__(self, data):
+        self.__data = data
+
+    def encode(self):
+        return self.__data
+
+
+class Fragmenter:
+    """Splits datagrams longer than max_datagram_size into Message 20900 fragments and answers retransmit requests.
+
+    The fragments of a datagram are kept for retain_seconds, keyed by the vehicle id, station number, instance
+    id and transfer id of the datagram, so a receiver missing some of them can ask for those alone with a
+    Message 20910. Every datagram split gets a new transfer id, datagrams sharing an instance id, such as the
+    responses of an entity, do not replace each other. At most max_retained_bytes of fragments are kept, the
+    oldest datagrams are forgotten first.
+    """
+
+    def __init__(self, loop, debug_level, callback_tx_data, address_offsets, max_datagram_size = 1400,
+        retain_seconds = 5.0, max_retained_bytes = 16 * 1024 * 1024):
+
+        if max_datagram_size <= MessageWrapper.MSGLEN + _FRAGMENT.size:
+            raise ValueError("max_datagram_size must be more than [{}], got [{}]".format(
+                MessageWrapper.MSGLEN + _FRAGMENT.size, max_datagram_size))
+
+        self.__loop = loop
+        self.__callback_tx_data = callback_tx_data
+        """Message type to the offsets of its vehicle id and station number, see StanagProtocol"""
+        self.__address_offsets = address_offsets
+        self.__max_datagram_size = max_datagram_size
+        self.__chunk_size = max_datagram_size - MessageWrapper.MSGLEN - _FRAGMENT.size
+        self.__retain_seconds = retain_seconds
+        self.__max_retained_bytes = max_retained_bytes
+
+        """(vehicle_id, station_id, instance_id, transfer_id): (list of fragments, loop time they expire at)"""
+        self.__retained = collections.OrderedDict()
+        self.__retained_bytes = 0
+        """Starts at random so the transfers of senders restarting or sharing an address rarely collide"""
+        self.__transfer_id = random.getrandbits(32)
+
+        self.__split = 0
+        self.__fragments = 0
+        self.__nacks = 0
+        self.__retransmitted = 0
+
+        self.logger = logging.getLogger('Fragmenter')
+        self.logger.setLevel(debug_level)
+
+    def get_max_datagram_size(self):
+        return self.__max_datagram_size
+
+    def split(self, data):
+        """Returns the list of fragment datagrams carrying data, or [data] if it fits in a single datagram"""
+
+        if len(data) <= self.__max_datagram_size:
+            return [data]
+
+        chunk_size = self.__chunk_size
+        count = (len(data) + chunk_size - 1) // chunk_size
+        if count > MAX_FRAGMENTS:
+            raise ValueError("Datagram of [{}] bytes needs more than [{}] fragments".format(len(data), MAX_FRAGMENTS))
+
+        instance_id = _UINT32.unpack_from(data, _OFFSET_INSTANCE_ID)[0]
+        message_type = _UINT32.unpack_from(data, _OFFSET_MESSAGE_TYPE)[0]
+        vehicle_id, station_id = self.__address_of(data, message_type)
+
+        self.__transfer_id = (self.__transfer_id + 1) & 0xFFFFFFFF
+        transfer_id = self.__transfer_id
+
+        view = memoryview(data)
+        fragments = []
+        for index in range(count):
+            chunk = view[index * chunk_size:(index + 1) * chunk_size]
+            header = _FRAGMENT.pack(vehicle_id, station_id, message_type, transfer_id, len(data), index, count)
+            fragments.append(_wrap(instance_id, FRAGMENT_MESSAGE_TYPE, header + chunk))
+
+        self.__retain((vehicle_id, station_id, instance_id, transfer_id), fragments)
+
+        self.__split += 1
+        self.__fragments += count
+
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Split message [{}] of [{}] bytes into [{}] fragments".format(message_type, len(data), count))
+
+        return fragments
+
+    def __address_of(self, data, message_type):
+
+        offsets = self.__address_offsets.get(message_type)
+        if offsets is None:
+            return 0, 0
+
+        vehicle_offset, station_offset = offsets
+        vehicle_id = struct.unpack_from('>i', data, vehicle_offset)[0]
+        station_id = 0 if station_offset is None else _UINT32.unpack_from(data, station_offset)[0]
+
+        return vehicle_id, station_id
+
+    def __retain(self, key, fragments):
+
+        now = self.__loop.time()
+        self.__expire(now)
+
+        size = sum(len(fragment) for fragment in fragments)
+        if size > self.__max_retained_bytes:
+            return
+
+        while self.__retained_bytes + size > self.__max_retained_bytes:
+            self.__forget_oldest()
+
+        self.__retained[key] = (fragments, now + self.__retain_seconds)
+        self.__retained_bytes += size
+
+    def __expire(self, now):
+        while self.__retained and next(iter(self.__retained.values()))[1] <= now:
+            self.__forget_oldest()
+
+    def __forget_oldest(self):
+        _, (fragments, _) = self.__retained.popitem(last=False)
+        self.__retained_bytes -= sum(len(fragment) for fragment in fragments)
+
+    def on_nack(self, data):
+        """Resends the fragments listed in a Message 20910 datagram if they are still retained, returns the number sent"""
+
+        if len(data) < MessageWrapper.MSGLEN + _NACK.size:
+            return 0
+
+        instance_id = _UINT32.unpack_from(data, _OFFSET_INSTANCE_ID)[0]
+        vehicle_id, station_id, message_type, transfer_id, count = _NACK.unpack_from(data, MessageWrapper.MSGLEN)
+
+        self.__nacks += 1
+        self.__expire(self.__loop.time())
+
+        entry = self.__retained.get((vehicle_id, station_id, instance_id, transfer_id))
+        if entry is None:
+            return 0
+
+        fragments = entry[0]
+        offset = MessageWrapper.MSGLEN + _NACK.size
+        count = min(count, (len(data) - offset) // _INDEX.size)
+
+        sent = 0
+        for (index,) in _INDEX.iter_unpack(data[offset:offset + count * _INDEX.size]):
+            if index < len(fragments):
+                self.__callback_tx_data(fragments[index])
+                sent += 1
+
+        self.__retransmitted += sent
+
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Retransmitted [{}] fragments of message [{}]".format(sent, message_type))
+
+        return sent
+
+    def get_stats(self):
+        """Returns a dict with the datagrams split, fragments sent, retransmit requests received, fragments
+        retransmitted and the datagrams and bytes retained for retransmission"""
+        return {
+            'split': self.__split,
+            'fragments': self.__fragments,
+            'nacks_received': self.__nacks,
+            'retransmitted': self.__retransmitted,
+            'retained': len(self.__retained),
+            'retained_bytes': self.__retained_bytes,
+        }
+
+
+class _Partial:
+    """Fragments received so far of one datagram"""
+
+    __slots__ = ('message_type', 'total_length', 'chunks', 'missing', 'updated_at', 'nacks')
+
+    def __init__(self, message_type, total_length, count, now):
+        self.message_type = message_type
+        self.total_length = total_length
+        self.chunks = [None] * count
+        self.missing = count
+        self.updated_at = now
+        self.nacks = 0
+
+
+class Reassembler:
+    """Rebuilds the datagrams split by a Fragmenter from the Message 20900 fragments received.
+
+    Partial datagrams are keyed by the sender address, vehicle_id, station_id, instance_id and transfer_id, so
+    datagrams sent concurrently under the same instance id, or by different senders, are rebuilt side by side.
+    A datagram may be at most max_message_size bytes and the partial datagrams together at
+    most max_pending_bytes, the oldest partials are evicted to make room. When no fragment of a partial arrives
+    for nack_interval seconds the missing fragments are requested with a Message 20910, up to max_nacks times in
+    a row, and a partial that made no progress for timeout seconds is evicted.
+    """
+
+    def __init__(self, loop, debug_level, callback_tx_data, max_message_size = 4 * 1024 * 1024,
+        max_pending_bytes = 16 * 1024 * 1024, timeout = 2.0, nack_interval = 0.05, max_nacks = 3, max_datagram_size = 1400):
+
+        self.__loop = loop
+        self.__callback_tx_data = callback_tx_data
+        self.__max_message_size = max_message_size
+        self.__max_pending_bytes = max_pending_bytes
+        self.__timeout = timeout
+        self.__nack_interval = nack_interval
+        self.__max_nacks = max_nacks
+        """Missing indices listed in a single retransmit request"""
+        self.__nack_capacity = max(1, (max_datagram_size - MessageWrapper.MSGLEN - _NACK.size) // _INDEX.size)
+
+        """key: _Partial, oldest first"""
+        self.__pending = collections.OrderedDict()
+        self.__pending_bytes = 0
+        """Keys of the datagrams completed recently, late and repeated fragments of those are ignored"""
+        self.__completed = collections.OrderedDict()
+        self.__wheel = None
+        self.__handle = None
+
+        self.__fragments = 0
+        self.__messages = 0
+        self.__duplicates = 0
+        self.__rejected = 0
+        self.__evicted_stale = 0
+        self.__evicted_memory = 0
+        self.__nacks = 0
+
+        self.logger = logging.getLogger('Reassembler')
+        self.logger.setLevel(debug_level)
+
+    def add(self, data, addr = None):
+        """Stores a Message 20900 fragment received from addr, returns the rebuilt datagram once all its fragments
+        arrived or None"""
+
+        self.__fragments += 1
+
+        if len(data) < MessageWrapper.MSGLEN + _FRAGMENT.size:
+            self.__rejected += 1
+            return None
+
+        instance_id = _UINT32.unpack_from(data, _OFFSET_INSTANCE_ID)[0]
+        vehicle_id, station_id, message_type, transfer_id, total_length, index, count = \
+            _FRAGMENT.unpack_from(data, MessageWrapper.MSGLEN)
+
+        if count == 0 or index >= count or total_length > self.__max_message_size or total_length < count:
+            self.__rejected += 1
+            return None
+
+        key = (addr, vehicle_id, station_id, instance_id, transfer_id)
+
+        if key in self.__completed:
+            self.__duplicates += 1
+            return None
+
+        now = self.__loop.time()
+
+        partial = self.__pending.get(key)
+        if partial is not None and (len(partial.chunks) != count or partial.total_length != total_length):
+            # fragments of one transfer disagreeing on its size, the sender restarted and reused a transfer id
+            self.__discard(key)
+            partial = None
+
+        if partial is None:
+            partial = self.__start(key, message_type, total_length, count, now)
+            if partial is None:
+                self.__rejected += 1
+                return None
+
+        if partial.chunks[index] is not None:
+            self.__duplicates += 1
+            return None
+
+        partial.chunks[index] = bytes(data[MessageWrapper.MSGLEN + _FRAGMENT.size:])
+        partial.missing -= 1
+        partial.updated_at = now
+        partial.nacks = 0
+
+        if partial.missing > 0:
+            self.__wheel.schedule(key, now + self.__nack_interval)
+            return None
+
+        self.__discard(key)
+        self.__remember(key)
+
+        datagram = b''.join(partial.chunks)
+        if len(datagram) != partial.total_length:
+            self.__rejected += 1
+            self.logger.warning("Fragments of message [{}] add up to [{}] bytes instead of [{}]".format(
+                message_type, len(datagram), partial.total_length))
+            return None
+
+        self.__messages += 1
+
+        return datagram
+
+    def __start(self, key, message_type, total_length, count, now):
+
+        if total_length > self.__max_pending_bytes:
+            return None
+
+        while self.__pending_bytes + total_length > self.__max_pending_bytes:
+            oldest = next(iter(self.__pending.keys()))
+            self.__discard(oldest)
+            self.__evicted_memory += 1
+
+        partial = self.__pending[key] = _Partial(message_type, total_length, count, now)
+        self.__pending_bytes += total_length
+
+        if self.__wheel is None:
+            self.__wheel = TimerWheel(self.__nack_interval, now)
+        if self.__handle is None:
+            self.__handle = self.__loop.call_later(self.__nack_interval, self.__check_pending)
+
+        return partial
+
+    def __discard(self, key):
+
+        partial = self.__pending.pop(key, None)
+        if partial is not None:
+            self.__pending_bytes -= partial.total_length
+            self.__wheel.cancel(key)
+
+    def __remember(self, key):
+
+        self.__completed[key] = True
+        self.__completed.move_to_end(key)
+        if len(self.__completed) > 4096:
+            self.__completed.popitem(last=False)
+
+    def __check_pending(self):
+
+        self.__handle = None
+        now = self.__loop.time()
+
+        # only partials not added to for nack_interval come out of the wheel
+        for key in self.__wheel.advance(now):
+            partial = self.__pending.get(key)
+            if partial is None:
+                continue
+
+            if partial.nacks >= self.__max_nacks or now - partial.updated_at >= self.__timeout:
+                self.__discard(key)
+                self.__evicted_stale += 1
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug("Evicted message [{}] missing [{}] fragments".format(partial.message_type, partial.missing))
+                continue
+
+            self.__request_missing(key, partial)
+            partial.nacks += 1
+            self.__wheel.schedule(key, now + self.__nack_interval)
+
+        if self.__pending:
+            self.__handle = self.__loop.call_later(self.__wheel.get_tick(), self.__check_pending)
+
+    def __request_missing(self, key, partial):
+
+        _, vehicle_id, station_id, instance_id, transfer_id = key
+        missing = [index for index, chunk in enumerate(partial.chunks) if chunk is None][:self.__nack_capacity]
+
+        body = _NACK.pack(vehicle_id, station_id, partial.message_type, transfer_id, len(missing)) + \
+            b''.join(_INDEX.pack(index) for index in missing)
+
+        self.__nacks += 1
+
+        try:
+            self.__callback_tx_data(_wrap(instance_id, FRAGMENT_NACK_MESSAGE_TYPE, body))
+        except:
+            self.logger.error("Unhandled error: [{}]".format(sys.exc_info()[0]))
+
+    def close(self):
+        """Drops the partial datagrams and stops the timer, returns nothing."""
+
+        if self.__handle is not None:
+            self.__handle.cancel()
+            self.__handle = None
+
+        for key in list(self.__pending.keys()):
+            self.__discard(key)
+
+    def get_stats(self):
+        """Returns a dict with the fragments received, datagrams rebuilt, duplicate and rejected fragments, partial
+        datagrams evicted as stale or for memory, retransmit requests sent and the partial datagrams pending"""
+        return {
+            'fragments': self.__fragments,
+            'messages': self.__messages,
+            'duplicates': self.__duplicates,
+            'rejected': self.__rejected,
+            'evicted_stale': self.__evicted_stale,
+            'evicted_memory': self.__evicted_memory,
+            'nacks_sent': self.__nacks,
+            'pending': len(self.__pending),
+            'pending_bytes': self.__pending_bytes,
+        }
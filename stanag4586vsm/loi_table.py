@@ -0,0 +1,335 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import array
+import logging
+
+from stanag4586edav1.message01 import *
+
+"""Byte b expanded to 8 bytes holding its bits, least significant first"""
+_EXPAND = [bytes((value >> bit) & 1 for bit in range(8)) for value in range(256)]
+
+def _spread(mask, row_count):
+    """Returns an int with one byte per row, 1 where the row bit of mask is set. Byte lanes hold small values
+    so they can be multiplied and or-ed together without carrying into the next row."""
+    if mask == 0:
+        return 0
+    return int.from_bytes(b''.join(map(_EXPAND.__getitem__, mask.to_bytes((row_count + 7) // 8, 'little'))), 'little')
+
+"""Byte b to the positions of its set bits"""
+_BITS = [tuple(bit for bit in range(8) if (value >> bit) & 1) for value in range(256)]
+
+def _rows_of(mask):
+    """Yields the indices of the bits set in mask, a byte at a time so long masks are not shifted per bit"""
+    for index, value in enumerate(mask.to_bytes((mask.bit_length() + 7) // 8, 'little')):
+        if value:
+            base = index * 8
+            for bit in _BITS[value]:
+                yield base + bit
+
+class LoiTable:
+    """Level of interaction state of the stations hosted by a server, for bulk queries and batch handovers.
+
+    Every station is a row. The state is held as row bitmasks per cucs, the stations it controls and the
+    stations it monitors, plus the mask of stations nobody controls, so the LOI granted to or authorized for a
+    cucs on every station comes out of a handful of integer operations over all the rows at once. Rows follow
+    the entities through their LOI change listeners; apply_handover changes many stations in one pass and
+    pushes the result to the entities that changed.
+    """
+
+    def __init__(self, debug_level = logging.INFO):
+        """(vehicle_id, station_id): row, rows of removed stations are reused"""
+        self.__rows = {}
+        """Per row, the key and the entity, None for a free row"""
+        self.__keys = []
+        self.__entities = []
+        self.__free_rows = []
+        """Per row, the controlling cucs id or 0 and the set of monitoring cucs"""
+        self.__controllers = array.array('q')
+        self.__monitors = []
+
+        """cucs_id: mask of the rows it controls, and of the rows it monitors"""
+        self.__controlled = {}
+        self.__monitored = {}
+        """Rows in use, and the rows in use without a controlling cucs"""
+        self.__used = 0
+        self.__uncontrolled = 0
+        """Rows of base platforms, whose control bit is LOI 5 instead of LOI 3 in requests"""
+        self.__base = 0
+
+        """Set while apply_handover pushes state to the entities, their LOI change callbacks are already applied"""
+        self.__applying = False
+
+        self.logger = logging.getLogger('LoiTable')
+        self.logger.setLevel(debug_level)
+
+    def __len__(self):
+        return len(self.__rows)
+
+    def get_row_count(self):
+        """Returns the number of rows including the free ones, the length of the bulk query results"""
+        return len(self.__keys)
+
+    def get_keys(self):
+        """Returns the (vehicle_id, station_id) of every row in row order, None for free rows"""
+        return list(self.__keys)
+
+    def get_row(self, vehicle_id, station_id):
+        """Returns the row of a station or None"""
+        return self.__rows.get((vehicle_id, station_id))
+
+    def add_entity(self, entity):
+        """Adds a row for the ControllableEntity, loaded from and then kept in sync with its state. Returns the row."""
+
+        key = (entity.getVehicleId(), entity.getStationId())
+        if key in self.__rows:
+            self.remove_entity(self.__entities[self.__rows[key]])
+
+        if self.__free_rows:
+            row = self.__free_rows.pop()
+            self.__keys[row] = key
+            self.__entities[row] = entity
+        else:
+            row = len(self.__keys)
+            self.__keys.append(key)
+            self.__entities.append(entity)
+            self.__controllers.append(0)
+            self.__monitors.append(frozenset())
+
+        self.__rows[key] = row
+        bit = 1 << row
+        self.__used |= bit
+        self.__uncontrolled |= bit
+        if key[1] == 0x0:
+            self.__base |= bit
+
+        self.__set_row(row, entity.getControllingCucs(), entity.getMonitoringCucs())
+        entity.add_listener_for_loi_change(self.sync_entity)
+
+        return row
+
+    def remove_entity(self, entity):
+        """Drops the row of the entity, returns nothing."""
+
+        row = self.__rows.get((entity.getVehicleId(), entity.getStationId()))
+        if row is None or self.__entities[row] is not entity:
+            return
+
+        entity.remove_listener_for_loi_change(self.sync_entity)
+        self.__set_row(row, 0, ())
+
+        bit = 1 << row
+        self.__used &= ~bit
+        self.__uncontrolled &= ~bit
+        self.__base &= ~bit
+
+        del self.__rows[self.__keys[row]]
+        self.__keys[row] = None
+        self.__entities[row] = None
+        self.__free_rows.append(row)
+
+    def sync_entity(self, entity):
+        """LOI change listener, copies the state of the entity into its row"""
+
+        if self.__applying:
+            return
+
+        row = self.__rows.get((entity.getVehicleId(), entity.getStationId()))
+        if row is not None:
+            self.__set_row(row, entity.getControllingCucs(), entity.getMonitoringCucs())
+
+    def __set_row(self, row, controlling_cucs_id, monitoring_cucs):
+
+        bit = 1 << row
+
+        previous = self.__controllers[row]
+        if previous != controlling_cucs_id:
+            if previous != 0:
+                self.__update_mask(self.__controlled, previous, 0, bit)
+            if controlling_cucs_id != 0:
+                self.__update_mask(self.__controlled, controlling_cucs_id, bit, 0)
+                self.__uncontrolled &= ~bit
+            else:
+                self.__uncontrolled |= bit
+            self.__controllers[row] = controlling_cucs_id
+
+        monitoring_cucs = frozenset(monitoring_cucs)
+        previous_monitors = self.__monitors[row]
+        if previous_monitors != monitoring_cucs:
+            for cucs_id in previous_monitors - monitoring_cucs:
+                self.__update_mask(self.__monitored, cucs_id, 0, bit)
+            for cucs_id in monitoring_cucs - previous_monitors:
+                self.__update_mask(self.__monitored, cucs_id, bit, 0)
+            self.__monitors[row] = monitoring_cucs
+
+    def __update_mask(self, masks, cucs_id, set_bits, clear_bits):
+
+        mask = (masks.get(cucs_id, 0) | set_bits) & ~clear_bits
+        if mask:
+            masks[cucs_id] = mask
+        else:
+            masks.pop(cucs_id, None)
+
+    def get_controlling_cucs(self, vehicle_id, station_id):
+        row = self.__rows.get((vehicle_id, station_id))
+        if row is not None:
+            return self.__controllers[row]
+
+    def get_monitoring_cucs(self, vehicle_id, station_id):
+        row = self.__rows.get((vehicle_id, station_id))
+        if row is not None:
+            return set(self.__monitors[row])
+
+    def get_controlled_rows(self, cucs_id):
+        """Returns the mask of the rows the cucs controls"""
+        return self.__controlled.get(cucs_id, 0)
+
+    def get_monitored_rows(self, cucs_id):
+        """Returns the mask of the rows the cucs monitors"""
+        return self.__monitored.get(cucs_id, 0)
+
+    def get_granted(self, cucs_id, keys = None):
+        """Returns the loi_granted field value for the cucs on every row, as bytes in row order, or on the
+        given (vehicle_id, station_id) keys in their order. Same values as ControllableEntity.get_loi_granted."""
+
+        row_count = len(self.__keys)
+        granted = _spread(self.__controlled.get(cucs_id, 0), row_count) * Message01.LOI_05 | \
+            _spread(self.__monitored.get(cucs_id, 0), row_count) * Message01.LOI_02
+
+        return self.__select(granted.to_bytes(row_count, 'little'), keys)
+
+    def get_authorized(self, cucs_id, keys = None):
+        """Returns the loi_authorized field value for the cucs on every row, as bytes in row order, or on the
+        given keys in their order. Same values as ControllableEntity.get_loi_authorized."""
+
+        row_count = len(self.__keys)
+        controllable = self.__uncontrolled | self.__controlled.get(cucs_id, 0)
+        authorized = _spread(self.__used, row_count) * Message01.LOI_02 | \
+            _spread(controllable, row_count) * Message01.LOI_05
+
+        return self.__select(authorized.to_bytes(row_count, 'little'), keys)
+
+    def __select(self, values, keys):
+
+        if keys is None:
+            return values
+
+        rows = self.__rows
+        return bytes(values[rows[key]] for key in keys)
+
+    def apply_handover(self, requests):
+        """Applies a batch of LOI requests, each (vehicle_id, station_id, cucs_id, requested_handover_loi,
+        controlled_station_mode) with the meaning they have in Message 01, and pushes the new state to the entities
+        that changed. Requests for unknown stations are ignored.
+
+        The batch is applied as a whole: every release, of control or monitoring, is applied before any request so
+        control moves from one cucs to another within the batch, and a free station goes to the first cucs in the
+        batch asking to control it. Returns the list of (vehicle_id, station_id) that changed.
+        """
+
+        rows = self.__rows
+        base = self.__base
+
+        """cucs_id: row masks"""
+        grants = {}
+        releases = {}
+        watch = {}
+        unwatch = {}
+        claimed = 0
+
+        for vehicle_id, station_id, cucs_id, requested_handover_loi, controlled_station_mode in requests:
+
+            row = rows.get((vehicle_id, station_id))
+            if row is None:
+                continue
+
+            bit = 1 << row
+            control_bit = Message01.LOI_05 if base & bit else Message01.LOI_03
+            wants_control = (requested_handover_loi & control_bit) == control_bit
+            wants_monitor = (requested_handover_loi & Message01.LOI_02) == Message01.LOI_02
+
+            if controlled_station_mode == 0x01:
+                if wants_monitor:
+                    watch[cucs_id] = watch.get(cucs_id, 0) | bit
+                if wants_control and not claimed & bit:
+                    claimed |= bit
+                    grants[cucs_id] = grants.get(cucs_id, 0) | bit
+            else:
+                if wants_monitor:
+                    unwatch[cucs_id] = unwatch.get(cucs_id, 0) | bit
+                if wants_control:
+                    releases[cucs_id] = releases.get(cucs_id, 0) | bit
+
+        controlled = self.__controlled
+        monitored = self.__monitored
+        uncontrolled = self.__uncontrolled
+
+        """row: new controlling cucs id, and row: set of monitoring cucs, for the rows that changed"""
+        controllers = {}
+        monitors = {}
+
+        # the masks of every cucs in the batch are updated with one operation each, only changed rows are visited
+        for cucs_id, mask in releases.items():
+            released = mask & controlled.get(cucs_id, 0)
+            if released:
+                self.__update_mask(controlled, cucs_id, 0, released)
+                uncontrolled |= released
+                for row in _rows_of(released):
+                    controllers[row] = 0
+
+        for cucs_id, mask in grants.items():
+            won = mask & uncontrolled
+            if won:
+                self.__update_mask(controlled, cucs_id, won, 0)
+                uncontrolled &= ~won
+                for row in _rows_of(won):
+                    controllers[row] = cucs_id
+
+        self.__uncontrolled = uncontrolled
+
+        for cucs_id in watch.keys() | unwatch.keys():
+            before = monitored.get(cucs_id, 0)
+            after = (before & ~unwatch.get(cucs_id, 0)) | watch.get(cucs_id, 0)
+            if after == before:
+                continue
+
+            self.__update_mask(monitored, cucs_id, after, before & ~after)
+            for row in _rows_of(after & ~before):
+                monitors.setdefault(row, set(self.__monitors[row])).add(cucs_id)
+            for row in _rows_of(before & ~after):
+                monitors.setdefault(row, set(self.__monitors[row])).discard(cucs_id)
+
+        return self.__push_rows(controllers, monitors)
+
+    def __push_rows(self, controllers, monitors):
+        """Stores the new state of the changed rows and pushes it to their entities"""
+
+        changed_keys = []
+
+        self.__applying = True
+        try:
+            for row in controllers.keys() | monitors.keys():
+                controller = controllers.get(row)
+                if controller is None:
+                    controller = self.__controllers[row]
+                else:
+                    self.__controllers[row] = controller
+
+                row_monitors = monitors.get(row)
+                if row_monitors is None:
+                    row_monitors = self.__monitors[row]
+                else:
+                    row_monitors = self.__monitors[row] = frozenset(row_monitors)
+
+                # a station released and granted back to the same cucs in the batch is unchanged
+                if self.__entities[row].set_loi_state(controller, row_monitors):
+                    changed_keys.append(self.__keys[row])
+        finally:
+            self.__applying = False
+
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Handover changed [{}] stations".format(len(changed_keys)))
+
+        return changed_keys
@@ -0,0 +1,110 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import logging
+
+"""Pseudo source addresses of the transports are on this host, ports counting up from the first ephemeral port"""
+SOURCE_HOST = '127.0.0.1'
+FIRST_SOURCE_PORT = 49152
+
+class LoopbackTransport:
+    """Datagram transport writing to the subscribers of one (address, port) group of a LoopbackBus.
+
+    Every transport has a source address of its own which the receivers get as the addr of datagram_received,
+    as they would get the address of the sending socket.
+    """
+
+    __slots__ = ('__bus', '__group', '__source', '__closed')
+
+    def __init__(self, bus, group, source):
+        self.__bus = bus
+        self.__group = group
+        self.__source = source
+        self.__closed = False
+
+    def sendto(self, data, addr = None):
+        if not self.__closed:
+            self.__bus.deliver(self.__group, data, self.__source)
+
+    def get_extra_info(self, name, default = None):
+        if name == 'sockname':
+            return self.__source
+        return default
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def is_closing(self):
+        return self.__closed
+
+    def close(self):
+        self.__closed = True
+
+
+class LoopbackBus:
+    """In-memory replacement for the multicast groups, pass it to StanagServer.setup_service as transport_bus.
+
+    Every vehicle and cucs server set up on the same bus, in the same event loop, exchanges datagrams without
+    sockets. A datagram sent to a group is handed as the same buffer to the datagram_received of every protocol
+    that joined it, with the source address of the sending transport as addr. The protocols copy what they keep,
+    so nothing is copied on the bus.
+    """
+
+    def __init__(self, debug_level = logging.INFO):
+        """(address, port): list of protocols"""
+        self.__groups = {}
+        self.__next_source_port = FIRST_SOURCE_PORT
+
+        self.__datagrams = 0
+        self.__deliveries = 0
+        self.__bytes = 0
+
+        self.logger = logging.getLogger('LoopbackBus')
+        self.logger.setLevel(debug_level)
+
+    def join(self, address, port, protocol):
+        """Delivers the datagrams sent to (address, port) to protocol.datagram_received, returns nothing."""
+        self.__groups.setdefault((address, port), []).append(protocol)
+        self.logger.debug("Protocol joined [{}:{}]".format(address, port))
+
+    def leave(self, address, port, protocol):
+        protocols = self.__groups.get((address, port))
+        if protocols is not None and protocol in protocols:
+            protocols.remove(protocol)
+            if len(protocols) == 0:
+                del self.__groups[(address, port)]
+            self.logger.debug("Protocol left [{}:{}]".format(address, port))
+
+    def create_transport(self, address, port):
+        """Returns a transport sending to (address, port) from a source address no other transport of the bus has"""
+
+        source = (SOURCE_HOST, self.__next_source_port)
+        self.__next_source_port += 1
+
+        return LoopbackTransport(self, (address, port), source)
+
+    def deliver(self, group, data, source = None):
+        """Hands data sent from source to every protocol joined to group, called by the transports"""
+
+        protocols = self.__groups.get(group)
+
+        self.__datagrams += 1
+        self.__bytes += len(data)
+
+        if protocols is None:
+            return
+
+        self.__deliveries += len(protocols)
+        for protocol in protocols:
+            protocol.datagram_received(data, source)
+
+    def get_stats(self):
+        """Returns a dict with the datagrams sent on the bus, the bytes and the number of deliveries to protocols"""
+        return {
+            'datagrams': self.__datagrams,
+            'bytes': self.__bytes,
+            'deliveries': self.__deliveries,
+            'groups': len(self.__groups),
+        }
@@ -0,0 +1,239 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import bisect
+import logging
+import struct
+import sys
+
+from .stanag_protocol import KNOWN_MESSAGES
+from stanag4586edav1.message_wrapper import *
+
+"""Upper bounds in seconds of the dispatch latency histogram buckets"""
+DISPATCH_LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+_OFFSET_MESSAGE_TYPE = MessageWrapper.message_type.offset
+_UINT32 = struct.Struct('>I')
+
+class Histogram:
+    """Counts observations in fixed buckets, counts[i] holds the values up to bounds[i] and the last one the rest"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def percentile(self, fraction):
+        """Returns the upper bound of the bucket holding the given fraction of the observations, None if above the last bound"""
+
+        if self.count == 0:
+            return 0.0
+
+        wanted = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted:
+                return self.bounds[index] if index < len(self.bounds) else None
+
+        return None
+
+
+class ServerMetrics:
+    """Counters updated on the rx and tx paths of a StanagServer.
+
+    Per message type counters are preallocated for the known messages so the hot path only increments integers.
+    Collectors are callables returning a dict of values, e.g. the tx queue stats, read when the metrics are exported.
+    """
+
+    def __init__(self):
+        self.rx_packets = {message_type: 0 for message_type in KNOWN_MESSAGES}
+        self.rx_bytes = {message_type: 0 for message_type in KNOWN_MESSAGES}
+        self.tx_packets = {message_type: 0 for message_type in KNOWN_MESSAGES}
+        self.tx_bytes = {message_type: 0 for message_type in KNOWN_MESSAGES}
+        """message type or None when the wrapper itself is truncated: count"""
+        self.decode_failures = {}
+        """(vehicle_id, station_id): messages handled by the entity"""
+        self.entity_handled = {}
+        self.dispatch_latency = Histogram(DISPATCH_LATENCY_BUCKETS)
+
+        """name: callable returning a dict of numeric values"""
+        self.__collectors = {}
+
+    def on_rx(self, message_type, length):
+        self.rx_packets[message_type] += 1
+        self.rx_bytes[message_type] += length
+
+    def on_tx(self, data):
+
+        message_type = _UINT32.unpack_from(data, _OFFSET_MESSAGE_TYPE)[0]
+
+        if message_type in self.tx_packets:
+            self.tx_packets[message_type] += 1
+            self.tx_bytes[message_type] += len(data)
+        else:
+            self.tx_packets[message_type] = 1
+            self.tx_bytes[message_type] = len(data)
+
+    def on_dispatch(self, latency):
+        self.dispatch_latency.observe(latency)
+
+    def on_decode_failure(self, message_type):
+        self.decode_failures[message_type] = self.decode_failures.get(message_type, 0) + 1
+
+    def register_entity(self, vehicle_id, station_id):
+        """Preallocates the handled counter of an entity"""
+        self.entity_handled.setdefault((vehicle_id, station_id), 0)
+
+    def unregister_entity(self, vehicle_id, station_id):
+        self.entity_handled.pop((vehicle_id, station_id), None)
+
+    def on_handled(self, vehicle_id, station_id):
+        key = (vehicle_id, station_id)
+        self.entity_handled[key] = self.entity_handled.get(key, 0) + 1
+
+    def add_collector(self, name, collector):
+        """collector() returns a dict of numeric values exported as gauges named <name>_<key>"""
+        self.__collectors[name] = collector
+
+    def collect(self):
+        """Returns a dict of collector name to the dict it returned, collectors returning None are skipped"""
+
+        collected = {}
+        for name, collector in self.__collectors.items():
+            try:
+                values = collector()
+            except:
+                logging.getLogger('ServerMetrics').error("Collector [{}] failed: [{}]".format(name, sys.exc_info()[0]))
+                continue
+
+            if values is not None:
+                collected[name] = values
+
+        return collected
+
+    def snapshot(self):
+        """Returns a copy of all the metrics as plain dicts"""
+
+        histogram = self.dispatch_latency
+
+        return {
+            'rx_packets': dict(self.rx_packets),
+            'rx_bytes': dict(self.rx_bytes),
+            'tx_packets': dict(self.tx_packets),
+            'tx_bytes': dict(self.tx_bytes),
+            'decode_failures': dict(self.decode_failures),
+            'entity_handled': dict(self.entity_handled),
+            'dispatch_latency': {
+                'bounds': histogram.bounds,
+                'counts': list(histogram.counts),
+                'sum': histogram.sum,
+                'count': histogram.count,
+                'p50': histogram.percentile(0.5),
+                'p99': histogram.percentile(0.99),
+            },
+            'collected': self.collect(),
+        }
+
+    def render_prometheus(self, prefix = 'stanag'):
+        """Returns the metrics in the Prometheus text exposition format"""
+
+        lines = []
+
+        def counter(name, help_text, values, label):
+            lines.append("# HELP {}_{} {}".format(prefix, name, help_text))
+            lines.append("# TYPE {}_{} counter".format(prefix, name))
+            for key, value in values.items():
+                lines.append('{}_{}{{{}="{}"}} {}'.format(prefix, name, label, key, value))
+
+        counter('rx_packets_total', 'Datagrams received per message type', self.rx_packets, 'message_type')
+        counter('rx_bytes_total', 'Bytes received per message type', self.rx_bytes, 'message_type')
+        counter('tx_packets_total', 'Datagrams sent per message type', self.tx_packets, 'message_type')
+        counter('tx_bytes_total', 'Bytes sent per message type', self.tx_bytes, 'message_type')
+        counter('decode_failures_total', 'Datagrams too short to decode per message type',
+            {'unknown' if key is None else key: value for key, value in self.decode_failures.items()}, 'message_type')
+
+        lines.append("# HELP {}_entity_handled_total Messages handled per entity".format(prefix))
+        lines.append("# TYPE {}_entity_handled_total counter".format(prefix))
+        for (vehicle_id, station_id), value in self.entity_handled.items():
+            lines.append('{}_entity_handled_total{{vehicle_id="{}",station_id="{}"}} {}'.format(prefix, vehicle_id, station_id, value))
+
+        histogram = self.dispatch_latency
+        name = "{}_dispatch_latency_seconds".format(prefix)
+        lines.append("# HELP {} Time between receiving a datagram and invoking its handler".format(name))
+        lines.append("# TYPE {} histogram".format(name))
+        cumulative = 0
+        for bound, count in zip(histogram.bounds + ('+Inf',), histogram.counts):
+            cumulative += count
+            lines.append('{}_bucket{{le="{}"}} {}'.format(name, bound, cumulative))
+        lines.append("{}_sum {}".format(name, histogram.sum))
+        lines.append("{}_count {}".format(name, histogram.count))
+
+        for collector_name, values in self.collect().items():
+            for key, value in values.items():
+                if isinstance(value, (bool, int, float)):
+                    gauge = "{}_{}_{}".format(prefix, collector_name, key)
+                    lines.append("# TYPE {} gauge".format(gauge))
+                    lines.append("{} {}".format(gauge, float(value)))
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsEndpoint:
+    """Serves ServerMetrics.render_prometheus over plain HTTP on GET /metrics"""
+
+    def __init__(self, debug_level, metrics):
+        self.__metrics = metrics
+        self.__server = None
+
+        self.logger = logging.getLogger('MetricsEndpoint')
+        self.logger.setLevel(debug_level)
+
+    async def start(self, host = '127.0.0.1', port = 9586):
+        self.__server = await asyncio.start_server(self.__handle_client, host, port)
+        self.logger.info("Serving metrics on http://{}:{}/metrics".format(host, port))
+
+    def get_port(self):
+        """Returns the port listened on, useful when started on port 0"""
+        if self.__server is not None:
+            return self.__server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+
+    async def __handle_client(self, reader, writer):
+
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            parts = request.split(b" ", 2)
+
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1] in (b"/metrics", b"/"):
+                status = "200 OK"
+                body = self.__metrics.render_prometheus().encode()
+            else:
+                status = "404 Not Found"
+                body = b"not found\n"
+
+            writer.write("HTTP/1.0 {}\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: {}\r\n\r\n".format(
+                status, len(body)).encode() + body)
+            await writer.drain()
+
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+
+        finally:
+            writer.close()
@@ -0,0 +1,252 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+
+"""File header, magic and format version"""
+JOURNAL_MAGIC = b'S4586OWN'
+JOURNAL_VERSION = 1
+_HEADER = struct.Struct('<8sHxxxxxx')
+"""Every record is the operation, vehicle id, station number and cucs id followed by the crc32 of those bytes"""
+_BODY = struct.Struct('<BxxxiIq')
+_RECORD = struct.Struct('<BxxxiIqI')
+
+OP_CONTROL_GRANT = 1
+OP_CONTROL_RELEASE = 2
+OP_MONITOR_GRANT = 3
+OP_MONITOR_RELEASE = 4
+
+class OwnershipJournal:
+    """Append-only journal of the control and monitor grants and releases of the stations of a vehicle side server.
+
+    The journal is replayed through a memory map when opened and the resulting state, the controlling cucs and
+    the monitoring cucs of every station, is kept in memory. Every change is appended as fixed size records with
+    a crc32 each, written straight to the file without user space buffering so a crashed process loses nothing
+    it recorded, fsync additionally survives power loss. A record cut short or damaged ends the replay and is
+    truncated away. Once the journal holds more than compact_threshold records and at least twice the records
+    needed to describe the current state, it is rewritten with the state alone into a temporary file which
+    atomically replaces the journal.
+    """
+
+    def __init__(self, path, debug_level = logging.INFO, compact_threshold = 4096, fsync = False):
+        self.__path = path
+        self.__compact_threshold = compact_threshold
+        self.__fsync = fsync
+
+        """(vehicle_id, station_id): [controlling cucs id or 0, set of monitoring cucs]"""
+        self.__state = {}
+        self.__records = 0
+        """Records needed to describe the current state, a grant for every controlling and monitoring cucs"""
+        self.__live_records = 0
+        self.__compactions = 0
+        self.__truncated_bytes = 0
+        self.__replay_seconds = 0.0
+        self.__file = None
+
+        self.logger = logging.getLogger('OwnershipJournal')
+        self.logger.setLevel(debug_level)
+
+        self.__replay()
+        self.__file = open(path, 'ab', buffering=0)
+
+        if self.__file.tell() == 0:
+            self.__write(_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION))
+
+    def __replay(self):
+
+        started = time.perf_counter()
+
+        if not os.path.exists(self.__path) or os.path.getsize(self.__path) < _HEADER.size:
+            # a header cut short holds no records, start over
+            with open(self.__path, 'wb'):
+                pass
+            return
+
+        with open(self.__path, 'r+b') as file:
+            size = os.fstat(file.fileno()).st_size
+
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                magic, version = _HEADER.unpack_from(mapped, 0)
+                if magic != JOURNAL_MAGIC or version != JOURNAL_VERSION:
+                    raise ValueError("[{}] is not a version [{}] ownership journal".format(self.__path, JOURNAL_VERSION))
+
+                view = memoryview(mapped)
+                try:
+                    end = self.__apply_records(view, size)
+                finally:
+                    view.release()
+
+            if end < size:
+                self.__truncated_bytes = size - end
+                self.logger.warning("Dropping [{}] bytes of damaged or incomplete records from [{}]".format(
+                    size - end, self.__path))
+                file.truncate(end)
+
+        self.__replay_seconds = time.perf_counter() - started
+        self.logger.info("Restored [{}] stations from [{}] records in [{:.1f}] ms".format(
+            len(self.__state), self.__records, self.__replay_seconds * 1e3))
+
+    def __apply_records(self, view, size):
+        """Applies the records up to the first damaged one, returns the offset following the last valid record"""
+
+        state = self.__state
+        live_records = self.__live_records
+        crc32 = zlib.crc32
+        body_size = _BODY.size
+        offset = _HEADER.size
+        count = (size - offset) // _RECORD.size
+        end = offset + count * _RECORD.size
+
+        for op, vehicle_id, station_id, cucs_id, crc in _RECORD.iter_unpack(view[offset:end]):
+
+            if crc32(view[offset:offset + body_size]) != crc:
+                break
+
+            entry = state.get((vehicle_id, station_id))
+            if entry is None:
+                entry = state[(vehicle_id, station_id)] = [0, set()]
+
+            if op == OP_CONTROL_GRANT:
+                live_records += (cucs_id != 0) - (entry[0] != 0)
+                entry[0] = cucs_id
+            elif op == OP_CONTROL_RELEASE:
+                live_records -= entry[0] != 0
+                entry[0] = 0
+            elif op == OP_MONITOR_GRANT:
+                if cucs_id not in entry[1]:
+                    entry[1].add(cucs_id)
+                    live_records += 1
+            elif op == OP_MONITOR_RELEASE:
+                if cucs_id in entry[1]:
+                    entry[1].discard(cucs_id)
+                    live_records -= 1
+            else:
+                break
+
+            offset += _RECORD.size
+            self.__records += 1
+
+        self.__live_records = live_records
+
+        return offset
+
+    def get_state(self, vehicle_id, station_id):
+        """Returns (controlling cucs id, list of monitoring cucs) of a station as restore_loi_state takes them,
+        or None if the station holds no grants"""
+
+        entry = self.__state.get((vehicle_id, station_id))
+        if entry is not None and (entry[0] != 0 or entry[1]):
+            return entry[0], list(entry[1])
+
+    def get_states(self):
+        """Returns a dict of (vehicle_id, station_id) to (controlling cucs id, list of monitoring cucs)"""
+        return {key: (entry[0], list(entry[1])) for key, entry in self.__state.items() if entry[0] != 0 or entry[1]}
+
+    def get_stats(self):
+        """Returns a dict with the records in the journal, the stations holding grants, compactions done, bytes
+        truncated on open and the time taken to replay the journal"""
+        return {
+            'records': self.__records,
+            'stations': sum(1 for entry in self.__state.values() if entry[0] != 0 or entry[1]),
+            'compactions': self.__compactions,
+            'truncated_bytes': self.__truncated_bytes,
+            'replay_seconds': self.__replay_seconds,
+        }
+
+    def on_loi_change(self, entity):
+        """LOI change listener of ControllableEntity, records the new state of the entity"""
+        self.record(entity.getVehicleId(), entity.getStationId(), entity.getControllingCucs(), entity.getMonitoringCucs())
+
+    def record(self, vehicle_id, station_id, controlling_cucs_id, monitoring_cucs):
+        """Appends the grants and releases turning the recorded state of the station into the given one,
+        returns the number of records appended."""
+
+        key = (vehicle_id, station_id)
+        entry = self.__state.get(key)
+        if entry is None:
+            entry = self.__state[key] = [0, set()]
+
+        records = []
+        live_before = (entry[0] != 0) + len(entry[1])
+
+        if entry[0] != controlling_cucs_id:
+            if entry[0] != 0:
+                records.append((OP_CONTROL_RELEASE, entry[0]))
+            if controlling_cucs_id != 0:
+                records.append((OP_CONTROL_GRANT, controlling_cucs_id))
+            entry[0] = controlling_cucs_id
+
+        monitoring_cucs = set(monitoring_cucs)
+        for cucs_id in entry[1] - monitoring_cucs:
+            records.append((OP_MONITOR_RELEASE, cucs_id))
+        for cucs_id in monitoring_cucs - entry[1]:
+            records.append((OP_MONITOR_GRANT, cucs_id))
+        entry[1] = monitoring_cucs
+        self.__live_records += (entry[0] != 0) + len(entry[1]) - live_before
+
+        if records:
+            # one write for all the records of the change
+            self.__write(b''.join(self.__encode(op, vehicle_id, station_id, cucs_id) for op, cucs_id in records))
+            self.__records += len(records)
+
+            if self.__records > self.__compact_threshold and self.__records > 2 * self.__live_records:
+                self.compact()
+
+        return len(records)
+
+    def __encode(self, op, vehicle_id, station_id, cucs_id):
+        body = _BODY.pack(op, vehicle_id, station_id, cucs_id)
+        return body + struct.pack('<I', zlib.crc32(body))
+
+    def __write(self, data):
+        self.__file.write(data)
+        if self.__fsync:
+            os.fsync(self.__file.fileno())
+
+    def compact(self):
+        """Rewrites the journal with only the records describing the current state, returns nothing."""
+
+        started = time.perf_counter()
+        temporary_path = self.__path + '.compact'
+
+        chunks = [_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION)]
+        records = 0
+        for (vehicle_id, station_id), entry in list(self.__state.items()):
+            if entry[0] == 0 and not entry[1]:
+                del self.__state[(vehicle_id, station_id)]
+                continue
+
+            if entry[0] != 0:
+                chunks.append(self.__encode(OP_CONTROL_GRANT, vehicle_id, station_id, entry[0]))
+            for cucs_id in entry[1]:
+                chunks.append(self.__encode(OP_MONITOR_GRANT, vehicle_id, station_id, cucs_id))
+            records += (entry[0] != 0) + len(entry[1])
+
+        with open(temporary_path, 'wb') as file:
+            file.write(b''.join(chunks))
+            file.flush()
+            os.fsync(file.fileno())
+
+        # the journal is either the old one or the compacted one, never a mix
+        self.__file.close()
+        os.replace(temporary_path, self.__path)
+        self.__file = open(self.__path, 'ab', buffering=0)
+
+        self.logger.debug("Compacted [{}] records to [{}] in [{:.1f}] ms".format(
+            self.__records, records, (time.perf_counter() - started) * 1e3))
+
+        self.__records = records
+        self.__live_records = records
+        self.__compactions += 1
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
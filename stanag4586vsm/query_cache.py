@@ -0,0 +1,114 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import collections
+import logging
+
+def get_query_response(msg):
+    """Returns the response carried by a received Message 20020, including the part of a long response that
+    follows the message, without the padding of the response field"""
+
+    response = msg.get_response()
+    trailer = getattr(msg, 'trailer', None)
+    if trailer:
+        return response + trailer.decode('ascii')
+
+    return response.rstrip()
+
+class QueryResponseCache:
+    """Encoded Message 20020 query responses shared by the entities of a vehicle side StanagServer.
+
+    Entries are keyed by (vehicle_id, station_id, query_type) and hold the wrapped datagram, the entity only
+    patches the instance id and cucs id of the request into a copy before sending it. An entry expires ttl
+    seconds after it was stored, None keeps it until invalidated, and once max_entries are held the least
+    recently used entry is evicted.
+    """
+
+    def __init__(self, loop, debug_level = logging.INFO, max_entries = 1024, ttl = 60.0):
+        self.__loop = loop
+        self.__max_entries = max_entries
+        self.__ttl = ttl
+
+        """key: (datagram, loop time it expires at or None), least recently used first"""
+        self.__entries = collections.OrderedDict()
+
+        self.__hits = 0
+        self.__misses = 0
+        self.__expired = 0
+        self.__evicted = 0
+        self.__invalidated = 0
+
+        self.logger = logging.getLogger('QueryResponseCache')
+        self.logger.setLevel(debug_level)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get_default_ttl(self):
+        return self.__ttl
+
+    def get(self, key):
+        """Returns the cached datagram for key or None"""
+
+        entry = self.__entries.get(key)
+        if entry is None:
+            self.__misses += 1
+            return None
+
+        if entry[1] is not None and entry[1] <= self.__loop.time():
+            del self.__entries[key]
+            self.__expired += 1
+            self.__misses += 1
+            return None
+
+        self.__entries.move_to_end(key)
+        self.__hits += 1
+
+        return entry[0]
+
+    def put(self, key, datagram, ttl = None):
+        """Stores the datagram for key, ttl None uses the default of the cache. Returns nothing."""
+
+        if ttl is None:
+            ttl = self.__ttl
+
+        self.__entries[key] = (bytes(datagram), None if ttl is None else self.__loop.time() + ttl)
+        self.__entries.move_to_end(key)
+
+        while len(self.__entries) > self.__max_entries:
+            self.__entries.popitem(last=False)
+            self.__evicted += 1
+
+    def invalidate(self, vehicle_id = None, station_id = None, query_type = None):
+        """Drops the entries matching the arguments given, all of them when none is given. Returns the number dropped."""
+
+        if vehicle_id is None and station_id is None and query_type is None:
+            keys = list(self.__entries.keys())
+        else:
+            keys = [key for key in self.__entries.keys()
+                if (vehicle_id is None or key[0] == vehicle_id) and
+                    (station_id is None or key[1] == station_id) and
+                    (query_type is None or key[2] == query_type)]
+
+        for key in keys:
+            del self.__entries[key]
+
+        self.__invalidated += len(keys)
+
+        if len(keys) > 0 and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Invalidated [{}] responses".format(len(keys)))
+
+        return len(keys)
+
+    def get_stats(self):
+        """Returns a dict with the entries held and the hits, misses, expirations, evictions and invalidations"""
+        return {
+            'entries': len(self.__entries),
+            'hits': self.__hits,
+            'misses': self.__misses,
+            'expired': self.__expired,
+            'evicted': self.__evicted,
+            'invalidated': self.__invalidated,
+        }
@@ -0,0 +1,149 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import logging
+
+class TokenBucket:
+    """Allows rate units per second on average with bursts of up to capacity units"""
+
+    __slots__ = ('__rate', '__capacity', '__tokens', '__updated_at')
+
+    def __init__(self, rate, capacity, now):
+        self.__rate = rate
+        self.__capacity = capacity
+        self.__tokens = capacity
+        self.__updated_at = now
+
+    def consume(self, amount, now):
+        """Returns true and takes amount tokens if enough are available"""
+
+        self.__tokens = min(self.__capacity, self.__tokens + (now - self.__updated_at) * self.__rate)
+        self.__updated_at = now
+
+        if self.__tokens < amount:
+            return False
+
+        self.__tokens -= amount
+        return True
+
+
+class DiscoveryResponseLimiter:
+    """Limits the discovery responses sent by the entities of a vehicle side StanagServer.
+
+    A station answers a given cucs at most once every min_interval seconds, further discoveries from that cucs
+    are suppressed. The replies of all the stations answering in the same loop iteration are written together
+    on the next iteration, callback_tx_flush then writes them out at once rather than one iteration later.
+    When rate is given a token bucket caps them to rate bytes per second with bursts of up to burst bytes.
+    The replies of a station are sent or dropped as a whole, a dropped station answers the next discovery.
+    """
+
+    def __init__(self, loop, debug_level, callback_tx_data, min_interval = 1.0, rate = None, burst = None,
+        callback_tx_flush = None):
+        self.__loop = loop
+        self.__callback_tx_data = callback_tx_data
+        """Writes what callback_tx_data queued, the batch is already deferred so it need not wait again"""
+        self.__callback_tx_flush = callback_tx_flush
+        self.__min_interval = min_interval
+        self.__bucket = None if rate is None else TokenBucket(rate, burst if burst is not None else rate, loop.time())
+
+        """(cucs_id, vehicle_id, station_id): loop time of the last answer"""
+        self.__answered = {}
+        self.__purged_at = loop.time()
+        """(key, replies) waiting for the next loop iteration"""
+        self.__pending = []
+        self.__flush_scheduled = False
+
+        self.__requests = 0
+        self.__suppressed = 0
+        self.__dropped = 0
+        self.__batches = 0
+        self.__datagrams_sent = 0
+        self.__bytes_sent = 0
+
+        self.logger = logging.getLogger('DiscoveryResponseLimiter')
+        self.logger.setLevel(debug_level)
+
+    def get_stats(self):
+        """Returns a dict with the discoveries seen per station and how many were suppressed or dropped"""
+        return {
+            'requests': self.__requests,
+            'suppressed': self.__suppressed,
+            'dropped': self.__dropped,
+            'batches': self.__batches,
+            'datagrams_sent': self.__datagrams_sent,
+            'bytes_sent': self.__bytes_sent,
+            'tracked': len(self.__answered),
+        }
+
+    def allow(self, cucs_id, vehicle_id, station_id):
+        """Returns true if the station should answer a discovery from the cucs"""
+
+        self.__requests += 1
+
+        now = self.__loop.time()
+        key = (cucs_id, vehicle_id, station_id)
+
+        answered_at = self.__answered.get(key)
+        if answered_at is not None and now - answered_at < self.__min_interval:
+            self.__suppressed += 1
+            return False
+
+        self.__answered[key] = now
+        return True
+
+    def submit(self, cucs_id, vehicle_id, station_id, replies):
+        """Queues the replies of a station allowed to answer, returns nothing."""
+
+        self.__pending.append(((cucs_id, vehicle_id, station_id), replies))
+
+        if not self.__flush_scheduled:
+            self.__flush_scheduled = True
+            self.__loop.call_soon(self.__flush)
+
+    def __flush(self):
+
+        self.__flush_scheduled = False
+
+        pending = self.__pending
+        self.__pending = []
+
+        now = self.__loop.time()
+        bucket = self.__bucket
+        self.__batches += 1
+        sent = 0
+
+        for key, replies in pending:
+
+            size = sum(len(reply) for reply in replies)
+
+            if bucket is not None and not bucket.consume(size, now):
+                self.__dropped += 1
+                self.logger.debug("Discovery response of station [{}] dropped by the rate limit".format(key[2]))
+                # not answered, the next discovery is not suppressed
+                self.__answered.pop(key, None)
+                continue
+
+            for reply in replies:
+                self.__callback_tx_data(reply)
+
+            sent += len(replies)
+            self.__bytes_sent += size
+
+        self.__datagrams_sent += sent
+        if sent > 0 and self.__callback_tx_flush is not None:
+            self.__callback_tx_flush()
+
+        self.__purge(now)
+
+    def __purge(self, now):
+        """Forgets the answers older than min_interval, at most once per min_interval"""
+
+        if now - self.__purged_at < self.__min_interval:
+            return
+
+        self.__purged_at = now
+        self.__answered = {
+            key: answered_at for key, answered_at in self.__answered.items() if now - answered_at < self.__min_interval
+        }
@@ -0,0 +1,62 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import struct
+
+from .stanag_protocol import MESSAGE_ADDRESS_OFFSETS
+from .fragmentation import FRAGMENT_MESSAGE_TYPE, FRAGMENT_NACK_MESSAGE_TYPE
+from stanag4586edav1.message_wrapper import *
+from stanag4586edav1.message01 import *
+
+"""Maps the message type to the offset of its vehicle id, fragments and their nacks carry it first in their header"""
+VEHICLE_ID_OFFSETS = {message_type: offsets[0] for message_type, offsets in MESSAGE_ADDRESS_OFFSETS.items()}
+VEHICLE_ID_OFFSETS[FRAGMENT_MESSAGE_TYPE] = MessageWrapper.MSGLEN
+VEHICLE_ID_OFFSETS[FRAGMENT_NACK_MESSAGE_TYPE] = MessageWrapper.MSGLEN
+
+_OFFSET_MESSAGE_TYPE = MessageWrapper.message_type.offset
+_UINT32 = struct.Struct('>I')
+
+def get_shard_index(vehicle_id, shard_count):
+    """Returns the index of the shard hosting the vehicle, the vehicle id is taken as the unsigned 32 bit value on the wire"""
+    return (vehicle_id & 0xFFFFFFFF) % shard_count
+
+
+class ShardedTransport:
+    """Datagram transport writing to the vehicles of a ShardedStanagServer, one underlying transport per shard.
+
+    Shard i of a ShardedStanagServer receives on port_rx + i, so each worker only receives the traffic of its
+    own vehicles. A datagram addressed to a vehicle is written to the transport of the shard hosting it, read
+    from the header without decoding. Broadcasts, such as the discovery, and datagrams without a known vehicle
+    id are written to every shard.
+    """
+
+    __slots__ = ('__transports', '__shard_count')
+
+    def __init__(self, transports):
+        self.__transports = transports
+        self.__shard_count = len(transports)
+
+    def sendto(self, data, addr = None):
+
+        if len(data) >= MessageWrapper.MSGLEN:
+            offset = VEHICLE_ID_OFFSETS.get(_UINT32.unpack_from(data, _OFFSET_MESSAGE_TYPE)[0])
+            if offset is not None and len(data) >= offset + 4:
+                vehicle_id = _UINT32.unpack_from(data, offset)[0]
+                if vehicle_id != Message01.BROADCAST_ID:
+                    self.__transports[vehicle_id % self.__shard_count].sendto(data)
+                    return
+
+        for transport in self.__transports:
+            transport.sendto(data)
+
+    def get_write_buffer_size(self):
+        return sum(transport.get_write_buffer_size() for transport in self.__transports)
+
+    def is_closing(self):
+        return any(transport.is_closing() for transport in self.__transports)
+
+    def close(self):
+        for transport in self.__transports:
+            transport.close()
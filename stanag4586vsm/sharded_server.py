@@ -0,0 +1,225 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+
+from .stanag_server import StanagServer
+from .shard_transport import get_shard_index
+
+class ShardedStanagServer:
+    """Hosts vehicles across several worker processes, each running its own StanagServer in vehicle mode.
+
+    Vehicles are partitioned by vehicle_id % worker_count and worker i receives on port_rx + i, so the receive,
+    decode and dispatch of the traffic are all partitioned across the processes. The cucs has to address each
+    vehicle on the port of its shard, a StanagServer does so when set up with vehicle_shards equal to the worker
+    count, see benchmarks/bench_sharded.py for a generator doing it by hand. Workers also run with
+    filter_foreign_traffic so a datagram sent to the wrong port is dropped on the header.
+
+    Each vehicle is owned by exactly one worker, which keeps its LOI state authoritative. Workers publish every
+    control and monitor change on a shared queue which a thread of the parent drains while the workers run,
+    the parent keeps the latest ownership per station which is used to seed a worker that is restarted.
+    """
+
+    def __init__(self, debug_level, worker_count):
+        self.logger = logging.getLogger('ShardedStanagServer')
+        self.logger.setLevel(debug_level)
+        self.debug_level = debug_level
+
+        self.__worker_count = worker_count
+        self.__context = multiprocessing.get_context('spawn')
+
+        """Vehicles hosted by each shard as lists of add_vehicle arguments"""
+        self.__shard_vehicles = [[] for _ in range(worker_count)]
+        self.__workers = [None] * worker_count
+        self.__stop_events = [None] * worker_count
+
+        """Latest (controlling cucs id, monitoring cucs ids) published by the workers, keyed by (vehicle id, station number)"""
+        self.__ownership = {}
+        self.__ownership_lock = threading.Lock()
+        self.__ownership_queue = self.__context.Queue()
+
+        """Drains the ownership queue in the background between start and stop"""
+        self.__drain_thread = None
+        self.__drain_stop = threading.Event()
+
+        self.__worker_initializer = None
+        self.__setup_kwargs = {}
+
+    def get_worker_count(self):
+        return self.__worker_count
+
+    def get_shard_index(self, vehicle_id):
+        """Returns the index of the worker hosting the given vehicle, it receives on port_rx + that index"""
+        return get_shard_index(vehicle_id, self.__worker_count)
+
+    def add_vehicle(self, vehicle_id, vsm_id = 0, vehicle_type = 0, vehicle_sub_type = 0, stations = None):
+        """Assigns a vehicle to its shard, see StanagServer.add_vehicle. Must be called before start. Returns nothing."""
+        self.__shard_vehicles[self.get_shard_index(vehicle_id)].append(
+            (vehicle_id, vsm_id, vehicle_type, vehicle_sub_type, stations))
+
+    def start(self, worker_initializer = None, **setup_kwargs):
+        """Starts one process per shard. setup_kwargs are passed to StanagServer.setup_service in each worker, with
+        port_rx moved up by the shard index, and worker_initializer, a picklable function taking the worker's
+        StanagServer, is invoked once its vehicles are added, e.g. to register callbacks on entities.
+        Returns nothing."""
+
+        port_rx = setup_kwargs.get('port_rx', 4586)
+        port_tx = setup_kwargs.get('port_tx', 4587)
+        if self.__worker_count > 1 and port_rx <= port_tx < port_rx + self.__worker_count:
+            raise ValueError("port_tx [{}] is one of the shard ports [{}] to [{}]".format(
+                port_tx, port_rx, port_rx + self.__worker_count - 1))
+
+        self.__worker_initializer = worker_initializer
+        self.__setup_kwargs = setup_kwargs
+
+        for shard_index in range(self.__worker_count):
+            self.start_worker(shard_index)
+
+        if self.__drain_thread is None:
+            self.__drain_stop.clear()
+            self.__drain_thread = threading.Thread(target=self.__drain_ownership, name="StanagShardOwnership", daemon=True)
+            self.__drain_thread.start()
+
+    def start_worker(self, shard_index):
+        """Starts or restarts the worker of a shard, seeding it with the last known ownership of its stations. Returns nothing."""
+
+        self.poll_ownership()
+
+        worker = self.__workers[shard_index]
+        if worker is not None and worker.is_alive():
+            self.stop_worker(shard_index)
+
+        vehicles = self.__shard_vehicles[shard_index]
+        vehicle_ids = set(vehicle[0] for vehicle in vehicles)
+        with self.__ownership_lock:
+            ownership = {key: state for key, state in self.__ownership.items() if key[0] in vehicle_ids}
+
+        stop_event = self.__context.Event()
+        worker = self.__context.Process(
+            target = run_shard,
+            name = "StanagShard-{}".format(shard_index),
+            args = (shard_index, self.debug_level, vehicles, ownership, self.__setup_kwargs,
+                self.__worker_initializer, self.__ownership_queue, stop_event),
+            daemon = True)
+
+        self.__stop_events[shard_index] = stop_event
+        self.__workers[shard_index] = worker
+        worker.start()
+
+        self.logger.info("Started shard [{}] hosting [{}] vehicles".format(shard_index, len(vehicles)))
+
+    def stop_worker(self, shard_index, timeout = 5):
+        """Asks the worker of a shard to exit and waits for it, terminating it after timeout seconds. Returns nothing."""
+
+        worker = self.__workers[shard_index]
+        if worker is None:
+            return
+
+        self.__stop_events[shard_index].set()
+
+        # a worker cannot exit until what it published is read from the queue
+        deadline = time.monotonic() + timeout
+        while worker.is_alive() and time.monotonic() < deadline:
+            self.poll_ownership()
+            worker.join(0.05)
+
+        if worker.is_alive():
+            self.logger.warning("Shard [{}] did not exit, terminating".format(shard_index))
+            worker.terminate()
+            worker.join()
+
+        self.__workers[shard_index] = None
+
+    def stop(self, timeout = 5):
+        """Stops all the workers, returns nothing."""
+
+        for shard_index in range(self.__worker_count):
+            self.stop_worker(shard_index, timeout)
+
+        if self.__drain_thread is not None:
+            self.__drain_stop.set()
+            self.__drain_thread.join()
+            self.__drain_thread = None
+
+        self.poll_ownership()
+
+    def is_alive(self):
+        """Returns true if every worker is running"""
+        return all(worker is not None and worker.is_alive() for worker in self.__workers)
+
+    def poll_ownership(self):
+        """Applies the ownership changes published by the workers since the last poll, returns the number applied"""
+
+        applied = 0
+        while True:
+            try:
+                vehicle_id, station_id, controlling_cucs_id, monitoring_cucs = self.__ownership_queue.get_nowait()
+            except queue.Empty:
+                return applied
+
+            with self.__ownership_lock:
+                self.__ownership[(vehicle_id, station_id)] = (controlling_cucs_id, monitoring_cucs)
+            applied += 1
+
+    def get_ownership(self):
+        """Returns a dict of (vehicle id, station number) to (controlling cucs id, monitoring cucs ids)"""
+        self.poll_ownership()
+        with self.__ownership_lock:
+            return dict(self.__ownership)
+
+    def __drain_ownership(self):
+        """Applies ownership changes as they are published so the queue does not build up between polls"""
+
+        while not self.__drain_stop.is_set():
+            try:
+                vehicle_id, station_id, controlling_cucs_id, monitoring_cucs = self.__ownership_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            with self.__ownership_lock:
+                self.__ownership[(vehicle_id, station_id)] = (controlling_cucs_id, monitoring_cucs)
+
+
+def run_shard(shard_index, debug_level, vehicles, ownership, setup_kwargs, worker_initializer, ownership_queue, stop_event):
+    """Entry point of a shard worker process"""
+    asyncio.run(serve_shard(shard_index, debug_level, vehicles, ownership, setup_kwargs,
+        worker_initializer, ownership_queue, stop_event))
+
+
+async def serve_shard(shard_index, debug_level, vehicles, ownership, setup_kwargs, worker_initializer, ownership_queue, stop_event):
+
+    loop = asyncio.get_running_loop()
+    server = StanagServer(debug_level)
+
+    # each shard receives on a port of its own, what is sent to the wrong one is dropped on the header
+    setup_kwargs = dict(setup_kwargs, filter_foreign_traffic = True,
+        port_rx = setup_kwargs.get('port_rx', 4586) + shard_index)
+    await server.setup_service(loop, StanagServer.MODE_VEHICLE, create_default_vehicle = False, **setup_kwargs)
+
+    def publish_loi_change(entity):
+        ownership_queue.put((entity.getVehicleId(), entity.getStationId(),
+            entity.getControllingCucs(), tuple(entity.getMonitoringCucs())))
+
+    for vehicle_id, vsm_id, vehicle_type, vehicle_sub_type, stations in vehicles:
+        entities = server.add_vehicle(vehicle_id, vsm_id, vehicle_type, vehicle_sub_type, stations)
+
+        for entity in entities.values():
+            state = ownership.get((vehicle_id, entity.getStationId()))
+            if state is not None:
+                entity.restore_loi_state(*state)
+            entity.set_callback_for_loi_change(publish_loi_change)
+
+    if worker_initializer is not None:
+        worker_initializer(server)
+
+    while not stop_event.is_set():
+        await asyncio.sleep(0.1)
+
+    await server.cleanup_service()
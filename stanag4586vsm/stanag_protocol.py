@@ -1,4 +1,7 @@
+import ctypes
 import logging
+import struct
+import time
 from stanag4586edav1.message_wrapper import *
 from stanag4586edav1.message01 import *
 from stanag4586edav1.message20 import *
@@ -14,6 +17,82 @@ from stanag4586edav1.message20010 import *
 from stanag4586edav1.message20020 import *
 from stanag4586edav1.message20030 import *
 from stanag4586edav1.message20040 import *
+from .fragmentation import FRAGMENT_MESSAGE_TYPE, FRAGMENT_NACK_MESSAGE_TYPE
+
+"""Maps the message type found in the wrapper to the class used to decode the body, built once at import"""
+KNOWN_MESSAGES = {
+    1 : Message01,
+    20 : Message20,
+    21 : Message21,
+    200 : Message200,
+    201 : Message201,
+    300 : Message300,
+    301 : Message301,
+    302 : Message302,
+    1200 : Message1200,
+    20000 : Message20000,
+    20010 : Message20010,
+    20020 : Message20020,
+    20030 : Message20030,
+    20040 : Message20040,
+}
+
+def _address_offsets(cls):
+    """Returns the offsets of the vehicle id and of the station number, or None, relative to the start of the datagram"""
+
+    if hasattr(cls, 'controlled_station'):
+        station_offset = MessageWrapper.MSGLEN + cls.controlled_station.offset
+    elif hasattr(cls, 'station_number'):
+        station_offset = MessageWrapper.MSGLEN + cls.station_number.offset
+    else:
+        station_offset = None
+
+    return MessageWrapper.MSGLEN + cls.vehicle_id.offset, station_offset
+
+"""Maps the message type to the offsets of its vehicle id and station number, read without decoding the message"""
+MESSAGE_ADDRESS_OFFSETS = {message_type: _address_offsets(cls) for message_type, cls in KNOWN_MESSAGES.items()}
+
+"""Maps the message type to the length of the wrapper and body, shorter datagrams cannot be decoded"""
+MESSAGE_LENGTHS = {message_type: MessageWrapper.MSGLEN + ctypes.sizeof(cls) for message_type, cls in KNOWN_MESSAGES.items()}
+
+_OFFSET_MESSAGE_TYPE = MessageWrapper.message_type.offset
+_INT32 = struct.Struct('>i')
+_UINT32 = struct.Struct('>I')
+
+class LazyMessage:
+    """Stands in for a message body which is decoded on first access to any of its fields or methods.
+
+    The vehicle id and station number read by the prefilter are available without decoding.
+    """
+
+    __slots__ = ('__cls', '__data', '__msg', 'vehicle_id', '__station_id', 'trailer')
+
+    def __init__(self, cls, data, vehicle_id, station_id):
+        self.__cls = cls
+        """Copy of the body, the datagram buffer may be reused before the message is decoded"""
+        self.__data = data
+        self.__msg = None
+        self.vehicle_id = vehicle_id
+        self.__station_id = station_id
+
+    def getStationId(self):
+        return self.__station_id
+
+    def get_message(self):
+        """Returns the decoded message"""
+        if self.__msg is None:
+            self.__msg = self.__cls.from_buffer_copy(self.__data)
+        return self.__msg
+
+    def is_decoded(self):
+        return self.__msg is not None
+
+    def __getattr__(self, name):
+        return getattr(self.get_message(), name)
+
+    def __bytes__(self):
+        return self.__data
+
 class StanagProtocol:
 
     def __init__(self, loop, debug_level, on_msg_rx_callback, on_con_lost_callback, rx_enabled = True):
@@ -29,8 +108,60 @@ class StanagProtocol:
 
         self.rx_enabled = rx_enabled
 
+        self.on_pause_writing_callback = None
+        self.on_resume_writing_callback = None
+
+        """Called with (message_type, vehicle_id, station_id) read from the datagram, a false return drops it undecoded"""
+        self.prefilter = None
+        """Hand LazyMessage instances to the callback instead of decoding the body"""
+        self.lazy_decode = False
+        """ServerMetrics updated for every datagram, None disables the per type counters and the dispatch latency"""
+        self.metrics = None
+        """CaptureWriter recording every datagram received, None when not capturing"""
+        self.capture = None
+        """PriorityDispatcher queueing the decoded messages by priority, None schedules one callback per message"""
+        self.dispatcher = None
+        """Reassembler rebuilding fragmented datagrams and Fragmenter answering retransmit requests, None ignores
+        fragments and retransmit requests"""
+        self.reassembler = None
+        self.fragmenter = None
+
+        self.__received = 0
+        self.__unknown = 0
+        self.__filtered = 0
+        self.__decoded = 0
+        self.__decode_failures = 0
+
+    def set_prefilter(self, prefilter):
+        self.prefilter = prefilter
+
+    def get_stats(self):
+        """Returns a dict with the datagrams received, of unknown type, too short to decode, dropped by the prefilter
+        and the messages decoded and handed to the callback or the dispatcher"""
+        return {
+            'received': self.__received,
+            'unknown': self.__unknown,
+            'filtered': self.__filtered,
+            'decoded': self.__decoded,
+            'decode_failures': self.__decode_failures,
+            'filter_rate': self.__filtered / self.__received if self.__received > 0 else 0.0,
+        }
+
     def connection_made(self, transport):
         self.transport = transport
+
+    def set_flow_control_callbacks(self, on_pause_writing_callback, on_resume_writing_callback):
+        """Callbacks invoked when the transport buffer goes above the high and below the low water marks"""
+        self.on_pause_writing_callback = on_pause_writing_callback
+        self.on_resume_writing_callback = on_resume_writing_callback
+
+    def pause_writing(self):
+        if self.on_pause_writing_callback is not None:
+            self.on_pause_writing_callback()
+
+    def resume_writing(self):
+        if self.on_resume_writing_callback is not None:
+            self.on_resume_writing_callback()
     
     def error_received(self, exc):
         self.logger.error('Error received [{}]'.format(exc))
@@ -40,40 +171,107 @@ class StanagProtocol:
         self.loop.call_soon(self.on_con_lost_callback)
         
     def datagram_received(self, data, addr):
+        """Decodes the wrapper and the body of a known message, data may be bytes or any buffer such as a memoryview.
+        The prefilter sees the addressing fields first, with lazy_decode the body is decoded only when used.
+        When the wrapper message length goes past the fixed fields of the message the bytes that follow are
+        set as msg.trailer."""
 
         if not self.rx_enabled:
             self.logger.warn("Rx is disabled and yet got a message on this socket.")
             return
 
-        self.logger.debug("Got packet of len [{}]".format(len(data)))
-
-        wrapper = MessageWrapper(data)
-        self.logger.debug("Got message [{:}]".format(wrapper.message_type))
-
-        msg = None
-
-        known_messages = {
-            1 : Message01,
-            20 : Message20,
-            21 : Message21,
-            200 : Message200,
-            201 : Message201,
-            300 : Message300,
-            301 : Message301,
-            302 : Message302,
-            1200 : Message1200,
-            20000 : Message20000,
-            20010 : Message20010,
-            20020 : Message20020,
-            20030 : Message20030,
-            20040 : Message20040,
-        }
-        
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            self.logger.debug("Got packet of len [{}]".format(len(data)))
+
+        self.__received += 1
+
+        if self.capture is not None:
+            self.capture.write(data)
+
+        self.__handle_datagram(data, debug, addr)
+
+    def __handle_datagram(self, data, debug, addr):
+
+        if len(data) < MessageWrapper.MSGLEN:
+            self.__decode_failure(len(data), None)
+            return
+
+        message_type = _UINT32.unpack_from(data, _OFFSET_MESSAGE_TYPE)[0]
+        if debug:
+            self.logger.debug("Got message [{:}]".format(message_type))
+
+        msg_type_to_instantiate = KNOWN_MESSAGES.get(message_type)
+        if msg_type_to_instantiate is None:
+            if message_type == FRAGMENT_MESSAGE_TYPE and self.reassembler is not None:
+                # the rebuilt datagram goes through the same checks as one received whole
+                datagram = self.reassembler.add(data, addr)
+                if datagram is not None:
+                    self.__handle_datagram(datagram, debug, addr)
+            elif message_type == FRAGMENT_NACK_MESSAGE_TYPE and self.fragmenter is not None:
+                self.fragmenter.on_nack(data)
+            else:
+                self.__unknown += 1
+            return
 
-        if wrapper.message_type in known_messages.keys():
-            msg_type_to_instantiate = known_messages[wrapper.message_type]
-            msg = msg_type_to_instantiate(data[MessageWrapper.MSGLEN:])
+        fixed_length = MESSAGE_LENGTHS[message_type]
+        if len(data) < fixed_length:
+            self.__decode_failure(len(data), message_type)
+            return
+
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.on_rx(message_type, len(data))
+
+        lazy = self.lazy_decode
+        prefilter = self.prefilter
+
+        if prefilter is not None or lazy:
+            # only the addressing fields are read, foreign traffic is dropped without building any message
+            vehicle_offset, station_offset = MESSAGE_ADDRESS_OFFSETS[message_type]
+            vehicle_id = _INT32.unpack_from(data, vehicle_offset)[0]
+            station_id = None if station_offset is None else _UINT32.unpack_from(data, station_offset)[0]
+
+            if prefilter is not None and not prefilter(message_type, vehicle_id, station_id):
+                self.__filtered += 1
+                return
+
+        wrapper = MessageWrapper.from_buffer_copy(data)
 
-        if msg is not None:
+        if lazy:
+            size = ctypes.sizeof(msg_type_to_instantiate)
+            body = bytes(data[MessageWrapper.MSGLEN:MessageWrapper.MSGLEN + size])
+            msg = LazyMessage(msg_type_to_instantiate, body, vehicle_id, station_id)
+        else:
+            # decode the body straight out of the datagram at the wrapper offset, avoids slicing a copy of the payload
+            msg = msg_type_to_instantiate.from_buffer_copy(data, MessageWrapper.MSGLEN)
+
+        if len(data) > fixed_length:
+            # bytes following the fixed fields, e.g. the rest of a long query response
+            length = MessageWrapper.MSGLEN + wrapper.message_length
+            if length > fixed_length and len(data) >= length:
+                msg.trailer = bytes(data[fixed_length:length])
+
+        if debug:
             self.logger.debug("callback scheduled")
+
+        self.__decoded += 1
+
+        if self.dispatcher is not None:
+            self.dispatcher.submit(message_type, wrapper, msg)
+        elif metrics is not None:
+            self.loop.call_soon(self.__dispatch, time.perf_counter(), wrapper, msg)
+        else:
             self.loop.call_soon(self.on_msg_rx_callback, wrapper, msg)
+
+    def __dispatch(self, received_at, wrapper, msg):
+        """Records the time the message waited between the socket and its handler"""
+        self.metrics.on_dispatch(time.perf_counter() - received_at)
+        self.on_msg_rx_callback(wrapper, msg)
+
+    def __decode_failure(self, length, message_type):
+        self.__decode_failures += 1
+        if self.metrics is not None:
+            self.metrics.on_decode_failure(message_type)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Dropped message [{}] of [{}] bytes, too short to decode".format(message_type, length))
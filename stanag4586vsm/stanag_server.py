@@ -1,10 +1,23 @@
 import asyncio
 import socket
 import struct
-from types import coroutine
-from .stanag_protocol import StanagProtocol
+from .stanag_protocol import StanagProtocol, MESSAGE_ADDRESS_OFFSETS
 from .controllable_entity import ControllableEntity
 from .entity_controller import EntityController
+from .discovery_scheduler import DiscoveryScheduler
+from .response_limiter import DiscoveryResponseLimiter
+from .metrics import ServerMetrics, MetricsEndpoint
+from .capture import CaptureWriter
+from .loopback import LoopbackBus
+from .dispatch_queue import PriorityDispatcher
+from .loi_table import LoiTable
+from .ownership_journal import OwnershipJournal
+from .query_cache import QueryResponseCache, get_query_response
+from .fragmentation import Fragmenter, Reassembler
+from .config import load_config, compile_config
+from .batch_receiver import BatchReceiver
+from .tx_scheduler import TxScheduler
+from .shard_transport import ShardedTransport
 import logging
 from stanag4586edav1.message300 import *
 from stanag4586edav1.message_wrapper import *
@@ -13,6 +26,14 @@ from stanag4586edav1.message01 import *
 STANAG_SERVER_MODE_VEHICLE = 0
 STANAG_SERVER_MODE_CUCS = 1
 
+"""Stations created for a vehicle when none are given, as (name, station number, payload type)"""
+DEFAULT_STATIONS = [
+    ('base', 0x0, None),
+    ('eo', 0x1, Message300.PAYLOAD_TYPE_EOIR),
+    ('mast', 0x2, Message300.PAYLOAD_TYPE_MAST),
+    ('lrf', 0x4, Message300.PAYLOAD_TYPE_LRF),
+]
+
 class StanagServer:
 
     MODE_VEHICLE = 0
@@ -23,30 +44,132 @@ class StanagServer:
     __CUCS_ID = 0xFAFAFAFA
     __VEHICLE_ID = 0
     __VSM_ID = 0
-    __VEHICLE_TYPE = 0
-    __VEHICLE_SUB_TYPE = 0
-
-    """Holds reference to the current asyncio loop this class was created on"""
-    __loop = None
-    
-    __controllable_entities = {}
-    __entities_controller = None
-    __mode = MODE_VEHICLE
-
-    """Encapsulates a task that sends out periodic discover 01 messages on network"""
-    __task_discover = None
     
     def __init__(self, debug_level):
         self.logger = logging.getLogger('StanagServer')
         self.logger.setLevel(debug_level)
         self.debug_level = debug_level
 
+        self.__VEHICLE_TYPE = 0
+        self.__VEHICLE_SUB_TYPE = 0
+
+        """Holds reference to the current asyncio loop this class was created on"""
+        self.__loop = None
+        self.__mode = self.MODE_VEHICLE
+        self.__entities_controller = None
+
+        """Entities of each hosted vehicle keyed by vehicle id and then by entity name"""
+        self.__controllable_entities = {}
+        """Routing index of (vehicle id, station number) to entity, used to deliver unicast messages in constant time"""
+        self.__station_routes = {}
+        """Entities of each hosted vehicle in the order they were added, for messages that do not carry a station number"""
+        self.__vehicle_entities = {}
+        """Entities of all hosted vehicles, receive the broadcast messages"""
+        self.__broadcast_entities = []
+
+        """Encapsulates a task that sends out periodic discover 01 messages on network"""
+        self.__task_discover = None
+        """Sends the discovery broadcasts on the cucs side"""
+        self.__discovery_scheduler = None
+        """Keyword arguments of the DiscoveryScheduler"""
+        self.__discovery_options = {}
+        """Shared by the hosted entities to suppress and rate limit their discovery responses"""
+        self.__response_limiter = None
+        """Callables taking (message_type, vehicle_id, station_id), a datagram is dropped when any returns false"""
+        self.__rx_filters = []
+        """Drop traffic addressed to vehicles and stations not hosted here before decoding it, vehicle mode only"""
+        self.__filter_foreign_traffic = True
+        self.__lazy_decode = False
+        """Rx, tx and dispatch counters, None when metrics are disabled"""
+        self.__metrics = None
+        self.__metrics_endpoint = None
+        """CaptureWriter of the datagrams received while capturing"""
+        self.__capture = None
+        """Drains the rx socket in batches when batched receive is enabled"""
+        self.__batch_receiver = None
+        """Coalesces outgoing datagrams and writes them once per loop iteration"""
+        self.__tx_scheduler = None
+        """LOI state of all hosted stations for bulk queries and batch handovers, None until enabled"""
+        self.__loi_table = None
+        """OwnershipJournal recording the LOI changes of the hosted stations, None when not journaling"""
+        self.__journal = None
+        """Encoded query responses shared by the hosted entities, created with the first entity"""
+        self.__query_cache = None
+        """Splits the datagrams too long for one packet and rebuilds those received, None until enabled"""
+        self.__fragmenter = None
+        self.__reassembler = None
+        """Keyword arguments of the PriorityDispatcher, None dispatches every message in arrival order"""
+        self.__dispatch_options = None
+        """LoopbackBus used instead of the sockets and the (address, port) the rx protocol joined on it"""
+        self.__transport_bus = None
+        self.__bus_group_rx = None
+
+        self.__sock_rx = None
+        self.__transport_rx = None
+        self.__protocol_rx = None
+        self.__transport_tx = None
+        self.__protocol_tx = None
+
     async def cleanup_service(self):
         if self.__task_discover is not None:
             self.__task_discover.cancel()
 
+        if self.__batch_receiver is not None:
+            self.__batch_receiver.stop()
+
+        if self.__metrics_endpoint is not None:
+            await self.__metrics_endpoint.close()
+
+        if self.__transport_bus is not None:
+            self.__transport_bus.leave(*self.__bus_group_rx, self.__protocol_rx)
+            self.__transport_tx.close()
+
+        self.stop_capture()
+
+        if self.__reassembler is not None:
+            self.__reassembler.close()
+
+        if self.__journal is not None:
+            self.__journal.close()
+            self.__journal = None
+
     async def setup_service(self, loop, mode, vehicle_type = 0, vehicle_sub_type = 0, 
-        port_rx = 4586, port_tx = 4587, addr_rx = "224.10.10.10", addr_tx = "224.10.10.10"):
+        port_rx = 4586, port_tx = 4587, addr_rx = "224.10.10.10", addr_tx = "224.10.10.10",
+        rx_batch_size = 0, rx_buffer_size = None, create_default_vehicle = True, discovery_options = None,
+        discovery_response_options = None, filter_foreign_traffic = True, lazy_decode = False,
+        metrics = False, metrics_port = None, metrics_host = '127.0.0.1', transport_bus = None, dispatch_options = None,
+        journal_path = None, query_cache_options = None, fragmentation_options = None, vehicle_shards = 1):
+        """Creates the entities or controller for the given mode and opens the multicast sockets.
+
+        rx_batch_size greater than 0 drains up to that many datagrams per wakeup instead of one datagram per
+        event loop callback, rx_buffer_size when given is applied to the rx socket as SO_RCVBUF.
+        In vehicle mode more vehicles can be hosted on the same sockets with add_vehicle, pass
+        create_default_vehicle as False to host only those.
+        In cucs mode discovery_options is a dict of DiscoveryScheduler keyword arguments, e.g. min_interval.
+        In vehicle mode discovery_response_options, a dict of DiscoveryResponseLimiter keyword arguments, enables
+        suppression and rate limiting of the discovery responses.
+        In vehicle mode filter_foreign_traffic drops messages for vehicles and stations not hosted here from the
+        header alone, lazy_decode passes LazyMessage bodies which are decoded when a field is first used.
+        metrics enables the counters returned by get_metrics, they cost about a microsecond per datagram and are
+        off by default. metrics_port enables them as well and serves them in the Prometheus text format on
+        http://metrics_host:metrics_port/metrics.
+        transport_bus, a LoopbackBus, replaces the sockets, the addresses and ports then only name the groups on
+        the bus and servers set up on the same bus in the same loop exchange datagrams in memory.
+        dispatch_options, a dict of PriorityDispatcher keyword arguments, e.g. queue_sizes, enables priority
+        dispatch of the received messages so control traffic is not delayed by bulk telemetry.
+        In vehicle mode journal_path enables the OwnershipJournal at that path, the control and monitoring granted
+        before a restart are restored on the hosted stations and every change is recorded.
+        In vehicle mode query_cache_options, a dict of QueryResponseCache keyword arguments e.g. max_entries and
+        ttl, configures the cache of the responses to the queries answered by registered query handlers.
+        fragmentation_options, a dict of enable_fragmentation keyword arguments, splits the datagrams longer than
+        max_datagram_size and rebuilds the fragmented datagrams received.
+        In cucs mode vehicle_shards greater than 1 talks to a ShardedStanagServer with that many workers, shard i
+        receiving on port_rx + i. Datagrams for a vehicle are sent to the port of its shard, broadcasts to all.
+        """
+
+        if mode is self.MODE_CUCS and vehicle_shards > 1 and port_rx <= port_tx < port_rx + vehicle_shards:
+            raise ValueError("port_tx [{}] is one of the shard ports [{}] to [{}]".format(
+                port_tx, port_rx, port_rx + vehicle_shards - 1))
 
         self.logger.info("Server setup Started.")
 
@@ -54,126 +177,600 @@ class StanagServer:
         self.__mode = mode
         self.__VEHICLE_TYPE = vehicle_type
         self.__VEHICLE_SUB_TYPE = vehicle_sub_type
+        self.__discovery_options = discovery_options or {}
+        self.__filter_foreign_traffic = filter_foreign_traffic
+        self.__lazy_decode = lazy_decode
+        self.__dispatch_options = dispatch_options
+
+        if metrics or metrics_port is not None:
+            self.enable_metrics()
+
+        if fragmentation_options is not None:
+            self.enable_fragmentation(**fragmentation_options)
+
+        if mode is self.MODE_VEHICLE and discovery_response_options is not None:
+            self.set_discovery_response_limiter(
+                DiscoveryResponseLimiter(loop, self.debug_level, self.tx_data, callback_tx_flush=self.flush_tx,
+                    **discovery_response_options))
+
+        if mode is self.MODE_VEHICLE and journal_path is not None:
+            self.open_journal(journal_path)
 
-        if mode is self.MODE_VEHICLE:
+        if mode is self.MODE_VEHICLE and query_cache_options is not None:
+            self.set_query_cache(QueryResponseCache(loop, self.debug_level, **query_cache_options))
+
+        if mode is self.MODE_VEHICLE and create_default_vehicle:
             self.logger.info("Creating entities.")
             self.create_entities(loop)
 
 
-        if mode is self.MODE_VEHICLE:
+        if transport_bus is not None:
+            self.logger.info("Setting up loopback i/o.")
+            if mode is self.MODE_VEHICLE:
+                self.create_loopback_endpoints(loop, transport_bus, port_rx, addr_rx, port_tx, addr_tx)
+            else:
+                self.create_loopback_endpoints(loop, transport_bus, port_tx, addr_tx, port_rx, addr_rx, vehicle_shards)
+        elif mode is self.MODE_VEHICLE:
             self.logger.info("Setting up network i/o on vehicle side.")
-            await self.create_rx_socket(loop, port_rx, addr_rx)
+            await self.create_rx_socket(loop, port_rx, addr_rx, rx_batch_size, rx_buffer_size)
             await self.create_tx_socket(loop, port_tx, addr_tx)
         else:
             self.logger.info("Setting up network i/o on cucs side.")
-            await self.create_rx_socket(loop, port_tx, addr_tx)
-            await self.create_tx_socket(loop, port_rx, addr_rx)
+            await self.create_rx_socket(loop, port_tx, addr_tx, rx_batch_size, rx_buffer_size)
+            await self.create_tx_socket(loop, port_rx, addr_rx, vehicle_shards)
 
         if mode is self.MODE_CUCS:
             self.create_cucs_tasks()
+
+        if metrics_port is not None:
+            self.__metrics_endpoint = MetricsEndpoint(self.debug_level, self.__metrics)
+            await self.__metrics_endpoint.start(metrics_host, metrics_port)
         
         self.logger.info("Server setup completed.")
 
+    async def setup_from_config(self, loop, config, **setup_kwargs):
+        """Sets the server up from a fleet configuration, a dict or the path of a .json, .yaml or .toml file, see
+        config.compile_config. The vehicles are hosted and their reply templates encoded before the sockets are
+        opened, setup_kwargs override the server section, e.g. transport_bus. Returns nothing."""
+
+        if not isinstance(config, dict):
+            config = load_config(config)
+
+        mode, config_kwargs, liveness, vehicles = compile_config(config)
+        config_kwargs.update(setup_kwargs)
+
+        self.__loop = loop
+        self.__mode = self.MODE_VEHICLE if mode == 'vehicle' else self.MODE_CUCS
+
+        if self.__mode is self.MODE_VEHICLE:
+            for vehicle in vehicles:
+                self.add_vehicle(**vehicle)
+
+            # encodes the discovery replies now rather than on the first discovery
+            for entity in self.__broadcast_entities:
+                entity.get_reply_template(21)
+
+            self.logger.info("Configured [{}] vehicles with [{}] stations".format(
+                len(self.__controllable_entities), len(self.__broadcast_entities)))
+
+        await self.setup_service(loop, self.__mode, create_default_vehicle = False, **config_kwargs)
+
+        if liveness is not None and self.__mode is self.MODE_CUCS:
+            self.__entities_controller.enable_liveness(**liveness)
+
     def on_rx_con_lost(self):
         pass
 
-    async def create_rx_socket(self, loop, port_rx, addr_rx):
+    async def create_rx_socket(self, loop, port_rx, addr_rx, rx_batch_size = 0, rx_buffer_size = None):
 
         self.logger.info("Binding to port 0.0.0.0:{}".format(port_rx))
 
         self.__sock_rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # reuse options only take effect for sockets that set them before binding
+        self.__sock_rx.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.__sock_rx.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.__sock_rx.bind(('', port_rx))
         group = socket.inet_aton(addr_rx)
         mreq = struct.pack('4sL', group, socket.INADDR_ANY)
         self.__sock_rx.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
-        self.__sock_rx.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.__sock_rx.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+        if rx_buffer_size is not None:
+            self.__sock_rx.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rx_buffer_size)
+            self.logger.info("Rx buffer size is [{}]".format(self.__sock_rx.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)))
+
+        if rx_batch_size > 0:
+            self.logger.info("Using batched receive of up to [{}] datagrams per wakeup".format(rx_batch_size))
+            self.__protocol_rx = self.create_rx_protocol(loop)
+            self.__batch_receiver = BatchReceiver(loop, self.debug_level, self.__sock_rx, self.__protocol_rx, rx_batch_size)
+            self.__batch_receiver.start()
+            return
 
         self.__transport_rx, self.__protocol_rx = await loop.create_datagram_endpoint(
-            lambda: StanagProtocol(loop, self.debug_level, self.on_msg_rx, self.on_rx_con_lost, True),
+            lambda: self.create_rx_protocol(loop),
             sock=self.__sock_rx,
         )
+
+    def create_rx_protocol(self, loop):
+        """Returns a StanagProtocol delivering to on_msg_rx through the rx filters"""
+
+        protocol = StanagProtocol(loop, self.debug_level, self.on_msg_rx, self.on_rx_con_lost, True)
+        protocol.set_prefilter(self.rx_prefilter)
+        protocol.lazy_decode = self.__lazy_decode
+        protocol.metrics = self.__metrics
+        protocol.capture = self.__capture
+        protocol.reassembler = self.__reassembler
+        protocol.fragmenter = self.__fragmenter
+
+        if self.__dispatch_options is not None:
+            # delivers through the protocol callback so wrapping it, as the replay engine does, still works
+            protocol.dispatcher = PriorityDispatcher(loop, self.debug_level,
+                lambda wrapper, msg: protocol.on_msg_rx_callback(wrapper, msg), **self.__dispatch_options)
+            protocol.dispatcher.metrics = self.__metrics
+
+        return protocol
+
+    def add_rx_filter(self, rx_filter):
+        """rx_filter(message_type, vehicle_id, station_id) is called for every known message before it is decoded,
+        station_id is None for messages without a station number. Returning false drops the message."""
+        self.__rx_filters.append(rx_filter)
+
+    def remove_rx_filter(self, rx_filter):
+        if rx_filter in self.__rx_filters:
+            self.__rx_filters.remove(rx_filter)
+
+    def rx_prefilter(self, message_type, vehicle_id, station_id):
+        """Returns false for the messages this server has no use for"""
+
+        if self.__mode is self.MODE_VEHICLE and self.__filter_foreign_traffic and \
+            (vehicle_id & Message01.BROADCAST_ID) != Message01.BROADCAST_ID:
+
+            if station_id is None or station_id == Message01.BROADCAST_ID:
+                if vehicle_id not in self.__vehicle_entities:
+                    return False
+            elif (vehicle_id, station_id) not in self.__station_routes:
+                return False
+
+        for rx_filter in self.__rx_filters:
+            if not rx_filter(message_type, vehicle_id, station_id):
+                return False
+
+        return True
     
     def on_tx_con_lost(self):
         pass
 
-    async def create_tx_socket(self, loop, port_tx, addr_tx):
+    async def create_tx_socket(self, loop, port_tx, addr_tx, shard_count = 1):
+        """Opens the tx socket, or one per shard sending to port_tx + shard index wrapped in a ShardedTransport"""
 
-        self.__transport_tx, self.__protocol_tx = await loop.create_datagram_endpoint(
-            lambda: StanagProtocol(loop, self.debug_level, self.on_msg_rx, self.on_tx_con_lost, False),
-            remote_addr=(addr_tx, port_tx)
-        )
+        self.__tx_scheduler = TxScheduler(loop, self.debug_level)
+
+        transports = []
+        for shard_index in range(shard_count):
+            self.__transport_tx, self.__protocol_tx = await loop.create_datagram_endpoint(
+                lambda: StanagProtocol(loop, self.debug_level, self.on_msg_rx, self.on_tx_con_lost, False),
+                remote_addr=(addr_tx, port_tx + shard_index)
+            )
+            self.__protocol_tx.set_flow_control_callbacks(self.__tx_scheduler.pause_writing, self.__tx_scheduler.resume_writing)
+            transports.append(self.__transport_tx)
+
+        if shard_count > 1:
+            self.__transport_tx = ShardedTransport(transports)
+
+        self.__tx_scheduler.set_transport(self.__transport_tx)
+
+    def create_loopback_endpoints(self, loop, transport_bus, port_rx, addr_rx, port_tx, addr_tx, shard_count = 1):
+        """Joins the rx protocol to (addr_rx, port_rx) on the bus and sends to (addr_tx, port_tx), or to
+        port_tx + shard index for each shard, returns nothing."""
+
+        self.__transport_bus = transport_bus
+        self.__bus_group_rx = (addr_rx, port_rx)
+
+        self.__protocol_rx = self.create_rx_protocol(loop)
+        transport_bus.join(addr_rx, port_rx, self.__protocol_rx)
+
+        self.__tx_scheduler = TxScheduler(loop, self.debug_level)
+        if shard_count > 1:
+            self.__transport_tx = ShardedTransport(
+                [transport_bus.create_transport(addr_tx, port_tx + shard_index) for shard_index in range(shard_count)])
+        else:
+            self.__transport_tx = transport_bus.create_transport(addr_tx, port_tx)
+        self.__tx_scheduler.set_transport(self.__transport_tx)
 
     def tx_data(self, data):
-        """Transmit the data on network using __transport_tx, returns nothing."""
-        if self.__transport_tx is not None:
-            self.__transport_tx.sendto(data)
+        """Queues the data to be transmitted on network on the next loop iteration, returns nothing.
+        With fragmentation enabled data longer than max_datagram_size is sent as fragments."""
+        if self.__fragmenter is not None and len(data) > self.__fragmenter.get_max_datagram_size():
+            for fragment in self.__fragmenter.split(data):
+                self.tx_data(fragment)
+            return
+
+        if self.__metrics is not None:
+            self.__metrics.on_tx(data)
+        if self.__tx_scheduler is not None:
+            self.__tx_scheduler.enqueue(data)
+
+    def flush_tx(self):
+        """Writes the queued data now rather than on the next loop iteration, returns nothing."""
+        if self.__tx_scheduler is not None:
+            self.__tx_scheduler.flush()
+
+    def get_tx_stats(self):
+        """Returns the tx queue depth and flush latency metrics, or None before the tx socket is created"""
+        if self.__tx_scheduler is not None:
+            return self.__tx_scheduler.get_stats()
 
     def create_cucs_tasks(self):
         self.__entities_controller = EntityController(self.__loop, self.debug_level, self.__CUCS_ID, self.__VSM_ID, self.tx_data)
-        self.__task_discover = self.__loop.create_task(self.task_discover())
+        self.__discovery_scheduler = DiscoveryScheduler(
+            self.__loop, self.debug_level, self.__CUCS_ID, self.tx_data, **self.__discovery_options)
+        self.__entities_controller.add_listener_for_vehicle_events(self.__discovery_scheduler.on_vehicle_events)
+        self.__discovery_scheduler.set_liveness_source(self.__entities_controller)
+        self.__task_discover = self.__loop.create_task(self.__discovery_scheduler.run())
 
         
     def create_entities(self, loop):
         """Creates all the sensors and stations that can be controlled by CUCS. Returns nothing."""
-        
-        self.__controllable_entities['base'] = ControllableEntity(
-            loop, 
-            self.debug_level, 0x0, 
-            self.__VSM_ID, self.__VEHICLE_ID, 
-            self.__VEHICLE_TYPE, self.__VEHICLE_SUB_TYPE,
-            self.tx_data)
-            
-        self.__controllable_entities['eo'] = ControllableEntity(
-            loop, 
-            self.debug_level, 0x1, 
-            self.__VSM_ID, self.__VEHICLE_ID, 
-            self.__VEHICLE_TYPE, self.__VEHICLE_SUB_TYPE,
-            self.tx_data)
-
-        self.__controllable_entities['mast'] = ControllableEntity(
-            loop, 
-            self.debug_level, 0x2,
-            self.__VSM_ID, self.__VEHICLE_ID, 
-            self.__VEHICLE_TYPE, self.__VEHICLE_SUB_TYPE,
-            self.tx_data)
-
-        self.__controllable_entities['lrf'] = ControllableEntity(
-            loop, 
-            self.debug_level, 0x4,
-            self.__VSM_ID, self.__VEHICLE_ID, 
-            self.__VEHICLE_TYPE, self.__VEHICLE_SUB_TYPE,
-            self.tx_data)
-        
-        self.__controllable_entities['base'].set_available_stations(0x01 | 0x02 | 0x04)
-        self.__controllable_entities['eo'].set_payload_type(Message300.PAYLOAD_TYPE_EOIR)
-        self.__controllable_entities['mast'].set_payload_type(Message300.PAYLOAD_TYPE_MAST)
-        self.__controllable_entities['lrf'].set_payload_type(Message300.PAYLOAD_TYPE_LRF)
-
-    def get_entity(self, entity_name):
-        if entity_name in self.__controllable_entities.keys():
-            return self.__controllable_entities[entity_name]
+
+        self.__loop = loop
+        self.add_vehicle(self.__VEHICLE_ID, self.__VSM_ID, self.__VEHICLE_TYPE, self.__VEHICLE_SUB_TYPE)
+
+    def add_vehicle(self, vehicle_id, vsm_id = 0, vehicle_type = 0, vehicle_sub_type = 0, stations = None,
+        tail_number = None, mission_id = None, call_sign = None):
+        """Hosts a vehicle on this server, stations is a list of (name, station number, payload type) and
+        defaults to DEFAULT_STATIONS. tail_number, mission_id and call_sign are reported in Message 20.
+        Returns the dict of entity name to entity created for the vehicle."""
+
+        if stations is None:
+            stations = DEFAULT_STATIONS
+
+        if vehicle_id in self.__controllable_entities.keys():
+            self.remove_vehicle(vehicle_id)
+
+        available_stations = 0x00
+        base = None
+
+        for name, station_id, payload_type in stations:
+            entity = ControllableEntity(
+                self.__loop,
+                self.debug_level, station_id,
+                vsm_id, vehicle_id,
+                vehicle_type, vehicle_sub_type,
+                self.tx_data)
+
+            if station_id == 0x0:
+                base = entity
+            else:
+                # station numbers are bit flags, the base platform advertises them all in one field
+                available_stations |= station_id
+                entity.set_payload_type(payload_type)
+
+            self.add_entity(name, entity)
+
+        if base is not None:
+            base.set_available_stations(available_stations)
+            base.set_vehicle_meta(tail_number, mission_id, call_sign)
+
+        return self.__controllable_entities[vehicle_id]
+
+    def remove_vehicle(self, vehicle_id):
+        """Removes all the entities of a hosted vehicle, returns nothing."""
+
+        for entity_name in list(self.__controllable_entities.get(vehicle_id, {}).keys()):
+            self.remove_entity(entity_name, vehicle_id)
+
+    def get_vehicle_ids(self):
+        """Returns the ids of the vehicles hosted on this server"""
+        return list(self.__controllable_entities.keys())
+
+    def add_entity(self, entity_name, entity):
+        """Registers an entity under the given name for its vehicle and indexes it by vehicle id and station number. Returns nothing."""
+
+        vehicle_id = entity.getVehicleId()
+
+        if entity_name in self.__controllable_entities.get(vehicle_id, {}).keys():
+            self.remove_entity(entity_name, vehicle_id)
+
+        self.__controllable_entities.setdefault(vehicle_id, {})[entity_name] = entity
+        self.__vehicle_entities.setdefault(vehicle_id, []).append(entity)
+        self.__station_routes[(vehicle_id, entity.getStationId())] = entity
+        self.__broadcast_entities.append(entity)
+
+        if self.__response_limiter is not None:
+            entity.set_discovery_response_limiter(self.__response_limiter)
+
+        if self.__query_cache is None:
+            self.__query_cache = QueryResponseCache(self.__loop, self.debug_level)
+        entity.set_query_cache(self.__query_cache)
+
+        if self.__metrics is not None:
+            self.__metrics.register_entity(vehicle_id, entity.getStationId())
+
+        if self.__journal is not None:
+            state = self.__journal.get_state(vehicle_id, entity.getStationId())
+            if state is not None:
+                entity.restore_loi_state(*state)
+            entity.add_listener_for_loi_change(self.__journal.on_loi_change)
+
+        if self.__loi_table is not None:
+            self.__loi_table.add_entity(entity)
+
+    def remove_entity(self, entity_name, vehicle_id = None):
+        """Removes the named entity of a vehicle, by default of the default vehicle, from the server and the
+        routing index. Returns the removed entity or None."""
+
+        if vehicle_id is None:
+            vehicle_id = self.__VEHICLE_ID
+
+        entities = self.__controllable_entities.get(vehicle_id)
+        if entities is None or entity_name not in entities.keys():
+            return None
+
+        entity = entities.pop(entity_name)
+
+        route = (vehicle_id, entity.getStationId())
+        self.__vehicle_entities[vehicle_id].remove(entity)
+        self.__broadcast_entities.remove(entity)
+
+        if self.__station_routes.get(route) is entity:
+            del self.__station_routes[route]
+            # another entity of the vehicle on the same station takes over the route
+            for other in self.__vehicle_entities[vehicle_id]:
+                if other.getStationId() == route[1]:
+                    self.__station_routes[route] = other
+                    break
+
+        if len(entities) == 0:
+            del self.__controllable_entities[vehicle_id]
+            del self.__vehicle_entities[vehicle_id]
+
+        if self.__metrics is not None and route not in self.__station_routes:
+            self.__metrics.unregister_entity(*route)
+
+        if self.__loi_table is not None:
+            self.__loi_table.remove_entity(entity)
+
+        if self.__query_cache is not None and route not in self.__station_routes:
+            self.__query_cache.invalidate(*route)
+
+        if self.__journal is not None:
+            entity.remove_listener_for_loi_change(self.__journal.on_loi_change)
+
+        return entity
+
+    def get_entity(self, entity_name, vehicle_id = None):
+        """Returns the named entity of a vehicle, by default of the default vehicle, or None"""
+
+        if vehicle_id is None:
+            vehicle_id = self.__VEHICLE_ID
+
+        entities = self.__controllable_entities.get(vehicle_id)
+        if entities is not None and entity_name in entities.keys():
+            return entities[entity_name]
                 
+    def set_discovery_response_limiter(self, limiter):
+        """Shares the DiscoveryResponseLimiter with the hosted entities and those added later, returns nothing."""
+        self.__response_limiter = limiter
+        for entity in self.__broadcast_entities:
+            entity.set_discovery_response_limiter(limiter)
+
+    def get_discovery_response_limiter(self):
+        return self.__response_limiter
+
+    def get_discovery_response_stats(self):
+        """Returns the counters of the DiscoveryResponseLimiter, or None when responses are not limited"""
+
+        if self.__response_limiter is not None:
+            return self.__response_limiter.get_stats()
+
+    def set_query_cache(self, cache):
+        """Shares the QueryResponseCache with the hosted entities and those added later, returns nothing."""
+        self.__query_cache = cache
+        for entity in self.__broadcast_entities:
+            entity.set_query_cache(cache)
+
+    def get_query_cache(self):
+        return self.__query_cache
+
+    def get_query_stats(self):
+        """Returns the counters of the query response cache along with the responses computed and the queries
+        collapsed into a computation in flight by all hosted entities, or None before any entity is hosted"""
+
+        if self.__query_cache is None:
+            return None
+
+        stats = self.__query_cache.get_stats()
+        for key in ('computed', 'collapsed', 'in_flight'):
+            stats[key] = 0
+        for entity in self.__broadcast_entities:
+            for key, value in entity.get_query_stats().items():
+                stats[key] += value
+
+        return stats
+
+    def enable_fragmentation(self, max_datagram_size = 1400, retain_seconds = 5.0, max_retained_bytes = 16 * 1024 * 1024,
+        **reassembly_options):
+        """Sends the datagrams longer than max_datagram_size as Message 20900 fragments, kept retain_seconds for
+        selective retransmission, and rebuilds the fragmented datagrams received before decoding them.
+        reassembly_options are Reassembler keyword arguments, e.g. max_pending_bytes or nack_interval. Returns nothing."""
+
+        self.__fragmenter = Fragmenter(self.__loop, self.debug_level, self.tx_data, MESSAGE_ADDRESS_OFFSETS,
+            max_datagram_size, retain_seconds, max_retained_bytes)
+
+        if self.__reassembler is not None:
+            self.__reassembler.close()
+        self.__reassembler = Reassembler(self.__loop, self.debug_level, self.tx_data,
+            max_datagram_size = max_datagram_size, **reassembly_options)
+
+        if self.__protocol_rx is not None:
+            self.__protocol_rx.reassembler = self.__reassembler
+            self.__protocol_rx.fragmenter = self.__fragmenter
+
+    def get_fragmentation_stats(self):
+        """Returns the Fragmenter counters prefixed with tx_ and the Reassembler counters prefixed with rx_, or
+        None when fragmentation is not enabled"""
+
+        if self.__fragmenter is None:
+            return None
+
+        stats = {'tx_' + key: value for key, value in self.__fragmenter.get_stats().items()}
+        stats.update({'rx_' + key: value for key, value in self.__reassembler.get_stats().items()})
+
+        return stats
+
+    def get_discovery_scheduler(self):
+        """Returns the DiscoveryScheduler on the cucs side, e.g. for its stats, or None"""
+        return self.__discovery_scheduler
+
+    def get_discovery_stats(self):
+        """Returns the counters of the DiscoveryScheduler, or None outside cucs mode"""
+
+        if self.__discovery_scheduler is not None:
+            return self.__discovery_scheduler.get_stats()
+
+    def open_journal(self, path, **journal_options):
+        """Opens the OwnershipJournal at path, journal_options are its keyword arguments e.g. compact_threshold.
+        Hosted stations and those added later are restored from it and record their LOI changes. Returns the journal."""
+
+        if self.__journal is not None:
+            for entity in self.__broadcast_entities:
+                entity.remove_listener_for_loi_change(self.__journal.on_loi_change)
+            self.__journal.close()
+
+        self.__journal = OwnershipJournal(path, self.debug_level, **journal_options)
+
+        for entity in self.__broadcast_entities:
+            state = self.__journal.get_state(entity.getVehicleId(), entity.getStationId())
+            if state is not None:
+                entity.set_loi_state(*state)
+            entity.add_listener_for_loi_change(self.__journal.on_loi_change)
+
+        return self.__journal
+
+    def get_journal(self):
+        """Returns the OwnershipJournal, or None when not journaling"""
+        return self.__journal
+
+    def enable_loi_table(self):
+        """Creates the LoiTable of the hosted stations if needed and returns it, entities added later join it"""
+
+        if self.__loi_table is None:
+            self.__loi_table = LoiTable(self.debug_level)
+            for entity in self.__broadcast_entities:
+                self.__loi_table.add_entity(entity)
+
+        return self.__loi_table
+
+    def get_loi_table(self):
+        """Returns the LoiTable, or None when it is not enabled"""
+        return self.__loi_table
+
     def get_entity_controller(self):
         return self.__entities_controller
 
+    def start_capture(self, path):
+        """Appends every datagram received from now on to the capture file at path, see capture.ReplayEngine.
+        Returns nothing."""
+
+        self.stop_capture()
+        self.__capture = CaptureWriter(path)
+        if self.__protocol_rx is not None:
+            self.__protocol_rx.capture = self.__capture
+
+        self.logger.info("Capturing rx traffic to [{}]".format(path))
+
+    def stop_capture(self):
+        """Closes the capture file, returns the number of datagrams captured"""
+
+        if self.__capture is None:
+            return 0
+
+        if self.__protocol_rx is not None:
+            self.__protocol_rx.capture = None
+
+        records = self.__capture.get_record_count()
+        self.__capture.close()
+        self.__capture = None
+
+        return records
+
+    def enable_metrics(self):
+        """Creates the ServerMetrics if needed and returns it, the rx socket picks them up when it is created"""
+
+        if self.__metrics is None:
+            self.__metrics = ServerMetrics()
+            self.__metrics.add_collector('tx', self.get_tx_stats)
+            self.__metrics.add_collector('rx', self.get_rx_stats)
+
+            for vehicle_id, station_id in self.__station_routes.keys():
+                self.__metrics.register_entity(vehicle_id, station_id)
+
+            self.__metrics.add_collector('dispatch', self.get_dispatch_stats)
+            self.__metrics.add_collector('query', self.get_query_stats)
+            self.__metrics.add_collector('fragmentation', self.get_fragmentation_stats)
+            self.__metrics.add_collector('discovery', self.get_discovery_stats)
+            self.__metrics.add_collector('discovery_response', self.get_discovery_response_stats)
+
+            if self.__protocol_rx is not None:
+                self.__protocol_rx.metrics = self.__metrics
+                if self.__protocol_rx.dispatcher is not None:
+                    self.__protocol_rx.dispatcher.metrics = self.__metrics
+
+        return self.__metrics
+
+    def get_metrics(self):
+        """Returns the ServerMetrics, or None when metrics are disabled"""
+        return self.__metrics
+
+    def get_rx_stats(self):
+        """Returns the datagrams received, of unknown type and dropped by the rx filters along with, when batched
+        receive is in use, the batch counters including kernel drops. None before the rx socket is created."""
+
+        if self.__protocol_rx is None:
+            return None
+
+        stats = self.__protocol_rx.get_stats()
+        if self.__batch_receiver is not None:
+            stats.update(self.__batch_receiver.get_stats())
+
+        return stats
+
+    def get_dispatch_stats(self):
+        """Returns the queue depth, drops and queue wait percentiles of every priority class, or None when
+        priority dispatch is not enabled"""
+
+        if self.__protocol_rx is not None and self.__protocol_rx.dispatcher is not None:
+            return self.__protocol_rx.dispatcher.get_stats()
+
     def on_msg_rx(self, wrapper, msg):
         """Callback passed to stanag protocal and is invoked when a known message arrives."""
-        self.logger.debug("Got message [{}]".format(wrapper.message_type))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Got message [{}]".format(wrapper.message_type))
 
         if self.__mode is self.MODE_VEHICLE:
             """If running on the vehicle end"""
             station_id = msg.getStationId()
-
-            #preferred and optimized approach to redirect message to the intended station
-            #works for most of the msgs
-            if station_id not in [None, Message01.BROADCAST_ID] and station_id in self.__controllable_entities.keys():
-                self.__controllable_entities[station_id].handle_message(wrapper, msg)
+            vehicle_id = msg.vehicle_id
+
+            if (vehicle_id & Message01.BROADCAST_ID) == Message01.BROADCAST_ID:
+                #broadcast messages such as discovery are offered to every hosted station
+                entities = self.__broadcast_entities
+            elif station_id is not None and station_id != Message01.BROADCAST_ID:
+                #unicast messages are delivered to the intended station through the routing index
+                entity = self.__station_routes.get((vehicle_id, station_id))
+                if entity is not None and entity.handle_message(wrapper, msg):
+                    if self.__metrics is not None:
+                        self.__metrics.on_handled(vehicle_id, station_id)
+                    return
+                entities = ()
             else:
-                #for broadcast messages and others that are not directed towards a station
-                for k,v in self.__controllable_entities.items():
-                    if True == v.handle_message(wrapper, msg):
-                        return
+                #for messages that are not directed towards a station of the vehicle
+                entities = self.__vehicle_entities.get(vehicle_id, ())
+
+            for entity in entities:
+                if True == entity.handle_message(wrapper, msg):
+                    if self.__metrics is not None:
+                        self.__metrics.on_handled(entity.getVehicleId(), entity.getStationId())
+                    return
 
             if wrapper.message_type != 1:
                 # got a message that was not handled....
@@ -182,23 +779,3 @@ class StanagServer:
         elif self.__mode is self.MODE_CUCS:
             """If running on the cucs side"""
             self.__entities_controller.handle_message(wrapper, msg)
-
-
-    @coroutine
-    def task_discover(self):
-        self.logger.debug("Started discover task")
-        while True:
-            """Send Msg 01 to discover vehicles on the network"""
-
-            msg01 = Message01(Message01.MSGNULL)
-            msg01.make_discovery_message(self.__CUCS_ID)
-            
-            wrapper = MessageWrapper(MessageWrapper.MSGNULL)
-            wrapped_msg = wrapper.wrap_message(1, 0x01, msg01, False)
-
-            self.__loop.call_soon(self.tx_data, wrapped_msg)
-            
-            self.logger.debug("Discover message sent")
-
-            """Should be read from the config file"""
-            yield from asyncio.sleep(5)
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import math
+
+"""Each level of the wheel has 2**SLOT_BITS slots"""
+SLOT_BITS = 6
+SLOT_COUNT = 1 << SLOT_BITS
+SLOT_MASK = SLOT_COUNT - 1
+
+class TimerWheel:
+    """Hierarchical timer wheel keeping deadlines for hashable keys.
+
+    Level 0 has one slot per tick, every slot of level n spans SLOT_COUNT slots of level n - 1. A key is placed
+    on the lowest level whose range covers its deadline and moves down a level each time the wheel turns over
+    the slot holding it, so schedule, cancel and advancing by one tick cost the same for 10 or 10000 keys.
+    Deadlines past the range of the top level are kept on the top level and re-placed when their slot is reached.
+    """
+
+    def __init__(self, tick, now, levels = 4):
+        """tick is the resolution in seconds, now the current time on the clock used by schedule and advance"""
+        self.__tick = tick
+        self.__levels = levels
+        self.__wheels = [[{} for _ in range(SLOT_COUNT)] for _ in range(levels)]
+        """Current tick, every deadline up to it has expired"""
+        self.__current = math.floor(now / tick)
+        """key: (deadline tick, slot dict holding the key)"""
+        self.__timers = {}
+
+    def __len__(self):
+        return len(self.__timers)
+
+    def __contains__(self, key):
+        return key in self.__timers
+
+    def get_tick(self):
+        return self.__tick
+
+    def schedule(self, key, deadline):
+        """Expires key at the given time, replacing any previous deadline of the key. Returns nothing."""
+
+        self.cancel(key)
+        self.__place(key, max(self.__to_tick(deadline), self.__current + 1))
+
+    def cancel(self, key):
+        """Returns true if the key was scheduled"""
+
+        timer = self.__timers.pop(key, None)
+        if timer is None:
+            return False
+
+        del timer[1][key]
+        return True
+
+    def advance(self, now):
+        """Turns the wheel up to the given time, returns the list of keys whose deadline has passed"""
+
+        expired = []
+        target = math.floor(now / self.__tick)
+
+        while self.__current < target:
+            # nothing scheduled, jump instead of turning over empty slots
+            if len(self.__timers) == 0:
+                self.__current = target
+                break
+
+            self.__current += 1
+            current = self.__current
+
+            # cascade the upper levels whose slot has just been reached, highest first
+            for level in range(self.__levels - 1, 0, -1):
+                if current & ((1 << (SLOT_BITS * level)) - 1) == 0:
+                    self.__cascade(level, (current >> (SLOT_BITS * level)) & SLOT_MASK)
+
+            slot = self.__wheels[0][current & SLOT_MASK]
+            if len(slot) > 0:
+                for key in slot:
+                    del self.__timers[key]
+                expired.extend(slot.keys())
+                slot.clear()
+
+        return expired
+
+    def __to_tick(self, when):
+        """Deadlines are rounded up so a key never expires early"""
+        return math.ceil(when / self.__tick)
+
+    def __place(self, key, deadline):
+
+        delta = deadline - self.__current
+
+        level = 0
+        while level < self.__levels - 1 and delta >= (1 << (SLOT_BITS * (level + 1))):
+            level += 1
+
+        slot = self.__wheels[level][(deadline >> (SLOT_BITS * level)) & SLOT_MASK]
+        slot[key] = deadline
+        self.__timers[key] = (deadline, slot)
+
+    def __cascade(self, level, index):
+        """Moves the keys of a slot down to the levels matching their remaining time"""
+
+        slot = self.__wheels[level][index]
+        if len(slot) == 0:
+            return
+
+        timers = list(slot.items())
+        slot.clear()
+
+        for key, deadline in timers:
+            del self.__timers[key]
+            self.__place(key, max(deadline, self.__current))
@@ -0,0 +1,180 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import collections
+import logging
+import struct
+import time
+
+from stanag4586edav1.message_wrapper import *
+from .dispatch_queue import DEFAULT_PRIORITIES, PRIORITY_TELEMETRY
+from .fragmentation import FRAGMENT_MESSAGE_TYPE
+
+"""Message types of periodic and bulk traffic, the first to go when the queue is full"""
+BULK_MESSAGE_TYPES = frozenset(
+    [message_type for message_type, priority in DEFAULT_PRIORITIES.items() if priority == PRIORITY_TELEMETRY] +
+    [FRAGMENT_MESSAGE_TYPE])
+
+_OFFSET_MESSAGE_TYPE = MessageWrapper.message_type.offset
+_UINT32 = struct.Struct('>I')
+
+class TxScheduler:
+    """Queues outgoing datagrams and writes them to the transport once per loop iteration.
+
+    Writing stops while the transport reports its buffer is above the high water mark (pause_writing) and
+    resumes once it drains (resume_writing). Bulk traffic, the message types in bulk_message_types, is queued
+    apart and written after the rest. When the queue is full the oldest bulk datagram is dropped, a bulk
+    datagram arriving with no bulk queued is dropped itself, and only a queue full of other traffic drops
+    its oldest datagram, so control and LOI replies go last. Drops are counted per message type.
+    """
+
+    def __init__(self, loop, debug_level, max_queue_size = 4096, bulk_message_types = BULK_MESSAGE_TYPES):
+        self.__loop = loop
+        self.__transport = None
+        self.__queue = collections.deque()
+        self.__bulk_queue = collections.deque()
+        self.__bulk_message_types = bulk_message_types
+        self.__max_queue_size = max_queue_size
+        self.__flush_scheduled = False
+        self.__paused = False
+        """perf_counter value of the oldest datagram waiting in the queue"""
+        self.__first_enqueued_at = 0.0
+
+        self.__datagrams_sent = 0
+        self.__bytes_sent = 0
+        self.__flushes = 0
+        self.__dropped = 0
+        """message type: datagrams of that type dropped, None for datagrams too short to carry one"""
+        self.__dropped_by_type = {}
+        self.__max_queue_depth = 0
+        self.__last_flush_latency = 0.0
+        self.__max_flush_latency = 0.0
+        self.__total_flush_latency = 0.0
+
+        self.logger = logging.getLogger('TxScheduler')
+        self.logger.setLevel(debug_level)
+
+    def set_transport(self, transport):
+        self.__transport = transport
+        self.__schedule_flush()
+
+    def enqueue(self, data):
+        """Queues data to be written on the next loop iteration, returns nothing."""
+
+        queue = self.__queue
+        bulk_queue = self.__bulk_queue
+        depth = len(queue) + len(bulk_queue)
+
+        message_type = _UINT32.unpack_from(data, _OFFSET_MESSAGE_TYPE)[0] if len(data) >= MessageWrapper.MSGLEN else None
+        if message_type in self.__bulk_message_types:
+            queue = bulk_queue
+
+        if depth == 0:
+            self.__first_enqueued_at = time.perf_counter()
+        elif depth >= self.__max_queue_size:
+            if bulk_queue:
+                self.__drop(bulk_queue.popleft())
+            elif queue is bulk_queue:
+                self.__drop(data)
+                return
+            else:
+                self.__drop(queue.popleft())
+            depth -= 1
+
+        queue.append(data)
+
+        if depth + 1 > self.__max_queue_depth:
+            self.__max_queue_depth = depth + 1
+
+        if not self.__flush_scheduled:
+            self.__schedule_flush()
+
+    def flush(self):
+        """Writes the queued datagrams now instead of on the next loop iteration, for callers which already
+        batched them in a deferred call of their own, returns nothing."""
+
+        if not self.__paused:
+            self.__flush()
+
+    def __drop(self, data):
+
+        message_type = _UINT32.unpack_from(data, _OFFSET_MESSAGE_TYPE)[0] if len(data) >= MessageWrapper.MSGLEN else None
+        self.__dropped_by_type[message_type] = self.__dropped_by_type.get(message_type, 0) + 1
+
+        if self.__dropped == 0:
+            self.logger.warning("Tx queue full at [{}] datagrams, dropping message [{}], further drops are counted "
+                "in the stats".format(self.__max_queue_size, message_type))
+
+        self.__dropped += 1
+
+    def pause_writing(self):
+        """Invoked when the transport buffer goes above the high water mark"""
+        self.logger.debug("Transport buffer full, pausing tx")
+        self.__paused = True
+
+    def resume_writing(self):
+        """Invoked when the transport buffer drains below the low water mark"""
+        self.logger.debug("Transport buffer drained, resuming tx")
+        self.__paused = False
+        self.__schedule_flush()
+
+    def get_stats(self):
+        """Returns a dict with the queue depth and flush latency metrics, latencies are in seconds, and the
+        datagrams dropped in total and per message type, e.g. dropped_302"""
+        stats = {
+            'queue_depth': len(self.__queue) + len(self.__bulk_queue),
+            'bulk_queue_depth': len(self.__bulk_queue),
+            'max_queue_depth': self.__max_queue_depth,
+            'datagrams_sent': self.__datagrams_sent,
+            'bytes_sent': self.__bytes_sent,
+            'flushes': self.__flushes,
+            'dropped': self.__dropped,
+            'paused': self.__paused,
+            'last_flush_latency': self.__last_flush_latency,
+            'max_flush_latency': self.__max_flush_latency,
+            'avg_flush_latency': self.__total_flush_latency / self.__flushes if self.__flushes > 0 else 0.0,
+        }
+
+        for message_type, dropped in self.__dropped_by_type.items():
+            stats['dropped_{}'.format('unknown' if message_type is None else message_type)] = dropped
+
+        return stats
+
+    def __schedule_flush(self):
+        if self.__flush_scheduled or self.__paused or self.__transport is None or not (self.__queue or self.__bulk_queue):
+            return
+
+        self.__flush_scheduled = True
+        self.__loop.call_soon(self.__flush)
+
+    def __flush(self):
+        """Writes queued datagrams until the queue is empty or the transport asks us to pause"""
+
+        self.__flush_scheduled = False
+
+        queue = self.__queue
+        bulk_queue = self.__bulk_queue
+        transport = self.__transport
+        if not (queue or bulk_queue) or transport is None:
+            return
+
+        latency = time.perf_counter() - self.__first_enqueued_at
+        self.__flushes += 1
+        self.__last_flush_latency = latency
+        self.__total_flush_latency += latency
+        if latency > self.__max_flush_latency:
+            self.__max_flush_latency = latency
+
+        # bulk traffic goes out once everything else is written
+        for pending in (queue, bulk_queue):
+            while pending and not self.__paused:
+                data = pending.popleft()
+                transport.sendto(data)
+                self.__datagrams_sent += 1
+                self.__bytes_sent += len(data)
+
+        if queue or bulk_queue:
+            # paused with datagrams left, resume_writing will schedule the next flush
+            self.__first_enqueued_at = time.perf_counter()
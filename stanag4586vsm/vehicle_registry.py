@@ -0,0 +1,360 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+from collections import namedtuple
+from types import MappingProxyType
+
+"""Keys of the legacy nested dict representation, still accepted when indexing a VehicleView or StationView"""
+KEY_META = 0
+KEY_STATIONS = 1
+KEY_CONTROLLED = 2
+KEY_MONITORED = 3
+KEY_TYPE = 4
+KEY_SUB_TYPE = 5
+KEY_TAIL_NUMBER = 6
+KEY_MISSION_ID = 7
+KEY_CALL_SIGN = 8
+#whether if the station can be controlled by this cucs
+KEY_CONTROLLABLE = 9
+
+"""Kinds of VehicleEvent raised by the EntityController"""
+EVENT_VEHICLE_ADDED = 0
+EVENT_VEHICLE_REMOVED = 1
+EVENT_LOI_CHANGED = 2
+EVENT_STATION_CHANGED = 3
+EVENT_VEHICLE_UPDATED = 4
+"""Raised when the liveness timeout of a vehicle or a station expires, the vehicle or station is evicted"""
+EVENT_VEHICLE_LOST = 5
+EVENT_STATION_LOST = 6
+
+class StationRecord:
+    """Mutable state of a payload station, owned by the registry"""
+
+    __slots__ = ('station_id', 'type', 'controlled', 'monitored', 'controllable')
+
+    def __init__(self, station_id, station_type):
+        self.station_id = station_id
+        self.type = station_type
+        self.controlled = False
+        self.monitored = False
+        self.controllable = False
+
+class VehicleRecord:
+    """Mutable state of a discovered vehicle, owned by the registry"""
+
+    __slots__ = (
+        'vehicle_id', 'type', 'sub_type', 'controlled', 'monitored', 'controllable',
+        'has_meta', 'call_sign', 'mission_id', 'tail_number', 'stations',
+    )
+
+    def __init__(self, vehicle_id):
+        self.vehicle_id = vehicle_id
+        self.type = None
+        self.sub_type = None
+        self.controlled = False
+        self.monitored = False
+        self.controllable = False
+        """Set once a Message 20 has been seen for the vehicle"""
+        self.has_meta = False
+        self.call_sign = None
+        self.mission_id = None
+        self.tail_number = None
+        """station_id: StationRecord, stations are only known after a Message 300"""
+        self.stations = {}
+
+class StationView(namedtuple('StationView', ['station_id', 'type', 'controlled', 'monitored', 'controllable'])):
+    """Immutable snapshot of a payload station"""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        """Indexing takes the legacy KEY_* constants for backward compatibility, prefer the attributes"""
+        return getattr(self, _STATION_KEYS[key])
+
+class VehicleView(namedtuple('VehicleView', [
+        'vehicle_id', 'type', 'sub_type', 'controlled', 'monitored', 'controllable',
+        'has_meta', 'call_sign', 'mission_id', 'tail_number', 'stations'])):
+    """Immutable snapshot of a discovered vehicle, stations is a read only mapping of station_id to StationView"""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        """Indexing takes the legacy KEY_* constants for backward compatibility, prefer the attributes"""
+        if key == KEY_META:
+            if not self.has_meta:
+                return None
+            return {
+                KEY_CALL_SIGN: self.call_sign,
+                KEY_MISSION_ID: self.mission_id,
+                KEY_TAIL_NUMBER: self.tail_number,
+            }
+        return getattr(self, _VEHICLE_KEYS[key])
+
+class VehicleEvent(namedtuple('VehicleEvent', ['kind', 'vehicle_id', 'station_id', 'vehicle'])):
+    """A change to a single vehicle or station.
+
+    station_id is None for changes to the vehicle itself, vehicle is the VehicleView after the change or,
+    for EVENT_VEHICLE_REMOVED and EVENT_VEHICLE_LOST, the last view of the evicted vehicle.
+    """
+
+    __slots__ = ()
+
+_STATION_KEYS = {
+    KEY_CONTROLLED: 'controlled',
+    KEY_MONITORED: 'monitored',
+    KEY_TYPE: 'type',
+    KEY_CONTROLLABLE: 'controllable',
+}
+
+_VEHICLE_KEYS = {
+    KEY_STATIONS: 'stations',
+    KEY_CONTROLLED: 'controlled',
+    KEY_MONITORED: 'monitored',
+    KEY_TYPE: 'type',
+    KEY_SUB_TYPE: 'sub_type',
+    KEY_CONTROLLABLE: 'controllable',
+}
+
+class VehicleRegistry:
+    """Holds the discovered vehicles and their stations with indexes by vehicle type and by controlled/monitored state.
+
+    All changes go through the update methods, which return whether anything changed so callers can avoid raising
+    events for repeated messages. snapshot() returns an immutable mapping which is rebuilt only for the vehicles
+    that changed since the previous snapshot, consumers holding an older snapshot keep a consistent view.
+    """
+
+    __slots__ = (
+        '__vehicles', '__by_type', '__controlled', '__monitored',
+        '__version', '__views', '__snapshot', '__snapshot_version', '__dirty',
+    )
+
+    def __init__(self):
+        """vehicle_id: VehicleRecord"""
+        self.__vehicles = {}
+        """vehicle type: set of vehicle ids"""
+        self.__by_type = {}
+        self.__controlled = set()
+        self.__monitored = set()
+
+        """Incremented on every change"""
+        self.__version = 0
+        """vehicle_id: VehicleView as of the last snapshot, copied before being changed once handed out"""
+        self.__views = {}
+        self.__snapshot = MappingProxyType(self.__views)
+        self.__snapshot_version = 0
+        """Ids of the vehicles changed or removed since the last snapshot"""
+        self.__dirty = set()
+
+    def __len__(self):
+        return len(self.__vehicles)
+
+    def __contains__(self, vehicle_id):
+        return vehicle_id in self.__vehicles
+
+    def get_version(self):
+        return self.__version
+
+    def get(self, vehicle_id):
+        """Returns the VehicleRecord or None, the record must not be modified directly"""
+        return self.__vehicles.get(vehicle_id)
+
+    def get_vehicle_ids(self):
+        return self.__vehicles.keys()
+
+    def get_vehicles_by_type(self, vehicle_type):
+        """Returns a frozenset of the ids of the vehicles of the given type"""
+        return frozenset(self.__by_type.get(vehicle_type, ()))
+
+    def get_controlled_vehicles(self):
+        """Returns a frozenset of the ids of the vehicles controlled by this cucs"""
+        return frozenset(self.__controlled)
+
+    def get_monitored_vehicles(self):
+        """Returns a frozenset of the ids of the vehicles monitored by this cucs"""
+        return frozenset(self.__monitored)
+
+    def add_vehicle(self, vehicle_id):
+        """Returns the record of the vehicle and true if it was created by this call"""
+
+        record = self.__vehicles.get(vehicle_id)
+        if record is not None:
+            return record, False
+
+        record = VehicleRecord(vehicle_id)
+        self.__vehicles[vehicle_id] = record
+        self.__by_type.setdefault(None, set()).add(vehicle_id)
+        self.__changed(vehicle_id)
+
+        return record, True
+
+    def remove_vehicle(self, vehicle_id):
+        """Returns the removed record or None"""
+
+        record = self.__vehicles.pop(vehicle_id, None)
+        if record is None:
+            return None
+
+        self.__discard_from_type_index(record)
+        self.__controlled.discard(vehicle_id)
+        self.__monitored.discard(vehicle_id)
+        self.__changed(vehicle_id)
+
+        return record
+
+    def update_vehicle_type(self, record, vehicle_type, vehicle_sub_type):
+        """Returns true if the type or sub type changed"""
+
+        if record.type == vehicle_type and record.sub_type == vehicle_sub_type:
+            return False
+
+        if record.type != vehicle_type:
+            self.__discard_from_type_index(record)
+            self.__by_type.setdefault(vehicle_type, set()).add(record.vehicle_id)
+
+        record.type = vehicle_type
+        record.sub_type = vehicle_sub_type
+        self.__changed(record.vehicle_id)
+
+        return True
+
+    def update_vehicle_loi(self, record, controllable, controlled, monitored):
+        """Returns true if any of the LOI flags of the vehicle changed"""
+
+        if record.controllable == controllable and record.controlled == controlled and record.monitored == monitored:
+            return False
+
+        record.controllable = controllable
+        record.controlled = controlled
+        record.monitored = monitored
+
+        if controlled:
+            self.__controlled.add(record.vehicle_id)
+        else:
+            self.__controlled.discard(record.vehicle_id)
+
+        if monitored:
+            self.__monitored.add(record.vehicle_id)
+        else:
+            self.__monitored.discard(record.vehicle_id)
+
+        self.__changed(record.vehicle_id)
+
+        return True
+
+    def update_vehicle_meta(self, record, call_sign, mission_id, tail_number):
+        """Returns true if the call sign, mission id or tail number changed"""
+
+        if record.has_meta and record.call_sign == call_sign and \
+            record.mission_id == mission_id and record.tail_number == tail_number:
+            return False
+
+        record.has_meta = True
+        record.call_sign = call_sign
+        record.mission_id = mission_id
+        record.tail_number = tail_number
+        self.__changed(record.vehicle_id)
+
+        return True
+
+    def update_station(self, record, station_id, station_type):
+        """Adds the station or updates its type, returns the StationRecord and true if anything changed"""
+
+        station = record.stations.get(station_id)
+        if station is None:
+            station = StationRecord(station_id, station_type)
+            record.stations[station_id] = station
+        elif station.type != station_type:
+            station.type = station_type
+        else:
+            return station, False
+
+        self.__changed(record.vehicle_id)
+
+        return station, True
+
+    def remove_station(self, record, station_id):
+        """Returns the removed StationRecord or None"""
+
+        station = record.stations.pop(station_id, None)
+        if station is None:
+            return None
+
+        self.__changed(record.vehicle_id)
+
+        return station
+
+    def update_station_loi(self, record, station, controllable, controlled, monitored):
+        """Returns true if any of the LOI flags of the station changed"""
+
+        if station.controllable == controllable and station.controlled == controlled and station.monitored == monitored:
+            return False
+
+        station.controllable = controllable
+        station.controlled = controlled
+        station.monitored = monitored
+        self.__changed(record.vehicle_id)
+
+        return True
+
+    def view(self, vehicle_id):
+        """Returns an immutable VehicleView of the current state of a vehicle or None"""
+
+        record = self.__vehicles.get(vehicle_id)
+        if record is None:
+            return None
+
+        if vehicle_id not in self.__dirty:
+            view = self.__views.get(vehicle_id)
+            if view is not None:
+                return view
+
+        return self.__make_view(record)
+
+    def snapshot(self):
+        """Returns an immutable mapping of vehicle_id to VehicleView, the same object is returned until something changes"""
+
+        if self.__snapshot_version == self.__version:
+            return self.__snapshot
+
+        # copy on write, the previous snapshot may still be referenced by a consumer
+        views = dict(self.__views)
+
+        for vehicle_id in self.__dirty:
+            record = self.__vehicles.get(vehicle_id)
+            if record is None:
+                views.pop(vehicle_id, None)
+            else:
+                views[vehicle_id] = self.__make_view(record)
+
+        self.__dirty.clear()
+        self.__views = views
+        self.__snapshot = MappingProxyType(views)
+        self.__snapshot_version = self.__version
+
+        return self.__snapshot
+
+    def __make_view(self, record):
+        stations = MappingProxyType({
+            station.station_id: StationView(
+                station.station_id, station.type, station.controlled, station.monitored, station.controllable)
+            for station in record.stations.values()
+        })
+
+        return VehicleView(
+            record.vehicle_id, record.type, record.sub_type,
+            record.controlled, record.monitored, record.controllable,
+            record.has_meta, record.call_sign, record.mission_id, record.tail_number,
+            stations)
+
+    def __discard_from_type_index(self, record):
+        ids = self.__by_type.get(record.type)
+        if ids is not None:
+            ids.discard(record.vehicle_id)
+            if len(ids) == 0:
+                del self.__by_type[record.type]
+
+    def __changed(self, vehicle_id):
+        self.__version += 1
+        self.__dirty.add(vehicle_id)
@@ -0,0 +1,128 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+
+from stanag4586vsm.stanag_server import StanagServer
+from stanag4586edav1.message_wrapper import MessageWrapper
+from stanag4586edav1.message01 import Message01
+
+"""Cucs id of a StanagServer in cucs mode"""
+CUCS_ID = 0xFAFAFAFA
+
+"""A single discovery burst when the cucs starts, the tests send any further discovery themselves"""
+DISCOVERY_OPTIONS = {'burst_count': 1, 'min_interval': 3600.0, 'max_interval': 3600.0}
+
+OFFSET_MESSAGE_TYPE = MessageWrapper.message_type.offset
+
+
+class RawBody:
+    """Raw body handed to MessageWrapper.wrap_message"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def encode(self):
+        return self.data
+
+
+def make_datagram(message_type, body = b'\x00' * 16, instance_id = 0):
+    """Returns a wrapped datagram of message_type carrying body as is"""
+    return MessageWrapper(MessageWrapper.MSGNULL).wrap_message(instance_id, message_type, RawBody(body), False)
+
+
+def make_control_request(vehicle_id, station_id, instance_id = 5):
+    """Returns a Message 01 datagram from cucs 0xA0 requesting control of the station"""
+
+    msg01 = Message01(Message01.MSGNULL)
+    msg01.vehicle_id = vehicle_id
+    msg01.cucs_id = 0xA0
+    msg01.controlled_station = station_id
+    msg01.requested_handover_loi = Message01.LOI_04
+    return MessageWrapper(MessageWrapper.MSGNULL).wrap_message(instance_id, 1, msg01, False)
+
+
+def message_type_of(data):
+    return int.from_bytes(bytes(data[OFFSET_MESSAGE_TYPE:OFFSET_MESSAGE_TYPE + 4]), 'big')
+
+
+class NullLoop:
+    """Runs callbacks right away so handler calls can be checked without an event loop"""
+
+    def call_soon(self, callback, *args):
+        callback(*args)
+
+
+class ManualLoop:
+    """Holds the callbacks scheduled with call_soon until run is called, time is whatever the test sets in now"""
+
+    def __init__(self):
+        self.callbacks = []
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def call_soon(self, callback, *args):
+        self.callbacks.append((callback, args))
+
+    def run(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback, args in callbacks:
+            callback(*args)
+
+
+class RecordingTransport:
+    """Transport keeping the datagrams sent to it"""
+
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr = None):
+        self.sent.append(bytes(data))
+
+    def get_write_buffer_size(self):
+        return 0
+
+
+async def create_vehicle_server(bus, *vehicle_ids, **setup_kwargs):
+    """Returns a vehicle mode server on bus hosting the given vehicles, the default vehicle when none is given"""
+
+    server = StanagServer(logging.ERROR)
+    setup_kwargs.setdefault('metrics', False)
+    await server.setup_service(asyncio.get_running_loop(), StanagServer.MODE_VEHICLE,
+        create_default_vehicle=len(vehicle_ids) == 0, transport_bus=bus, **setup_kwargs)
+
+    for vehicle_id in vehicle_ids:
+        server.add_vehicle(vehicle_id)
+
+    return server
+
+
+async def create_cucs_server(bus, **setup_kwargs):
+    """Returns a cucs mode server on bus which discovers once when it starts"""
+
+    server = StanagServer(logging.ERROR)
+    setup_kwargs.setdefault('metrics', False)
+    setup_kwargs.setdefault('discovery_options', DISCOVERY_OPTIONS)
+    await server.setup_service(asyncio.get_running_loop(), StanagServer.MODE_CUCS, transport_bus=bus, **setup_kwargs)
+
+    return server
+
+
+async def cleanup(*servers):
+    for server in servers:
+        await server.cleanup_service()
+
+
+async def wait_for(condition, timeout = 1.0):
+    """Yields to the loop until condition() holds, failing the test after timeout seconds"""
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.001)
@@ -0,0 +1,63 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+import socket
+
+from stanag4586vsm.batch_receiver import BatchReceiver
+
+from .helpers import wait_for
+
+
+class RecordingProtocol:
+    """Copies the views handed to it as the receiver reuses their buffers"""
+
+    def __init__(self):
+        self.received = []
+        self.connected = False
+
+    def connection_made(self, transport):
+        self.connected = True
+
+    def datagram_received(self, data, addr):
+        self.received.append((bytes(data), addr))
+
+    def error_received(self, exc):
+        raise exc
+
+
+async def test_datagrams_are_drained_in_batches():
+
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender.bind(('127.0.0.1', 0))
+
+    protocol = RecordingProtocol()
+    receiver = BatchReceiver(loop, logging.ERROR, sock, protocol, batch_size = 4, max_datagram_size = 64)
+
+    # queued before the receiver starts so the first wakeup finds more than a batch
+    datagrams = [bytes([index]) * (index + 1) for index in range(10)]
+    for data in datagrams:
+        sender.sendto(data, sock.getsockname())
+
+    receiver.start()
+    await wait_for(lambda: len(protocol.received) == len(datagrams))
+    receiver.stop()
+
+    stats = receiver.get_stats()
+    sender_address = sender.getsockname()
+    sender.close()
+    sock.close()
+
+    assert protocol.connected
+    assert [data for data, addr in protocol.received] == datagrams
+    assert set(addr for data, addr in protocol.received) == {sender_address}
+    assert stats['packets'] == 10
+    assert stats['bytes'] == sum(len(data) for data in datagrams)
+    assert stats['max_batch'] == 4
+    assert stats['wakeups'] == 3
@@ -0,0 +1,35 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUITE = os.path.join(ROOT, 'benchmarks', 'suite.py')
+
+
+def run_suite(*args):
+    """Runs the benchmark suite as the README says, returns its output"""
+    return subprocess.run([sys.executable, SUITE, '--quick'] + list(args), cwd=ROOT, env=dict(os.environ, PYTHONPATH=ROOT),
+        capture_output=True, text=True, check=True).stdout
+
+
+def test_quick_run_reports_every_case_and_compares_with_a_baseline(tmp_path):
+
+    results_path = str(tmp_path / 'results.json')
+    run_suite('--output', results_path)
+
+    with open(results_path) as results:
+        report = json.load(results)
+
+    cases = set(result['case'] for result in report['results'])
+    assert cases == {'decode', 'vehicle_dispatch', 'cucs_dispatch', 'loi_handshake', 'discovery_fanout', 'message_mix'}
+    assert all(result['ns_per_message'] > 0 for result in report['results'])
+
+    output = run_suite('--filter', 'decode', '--compare', results_path)
+    assert "compared with" in output
+    assert output.count('%') == sum(1 for result in report['results'] if result['case'] == 'decode')
@@ -0,0 +1,164 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import collections
+import logging
+import os
+
+import pytest
+
+from stanag4586vsm.stanag_server import *
+from stanag4586vsm.stanag_protocol import StanagProtocol
+from stanag4586vsm.capture import CaptureReader, CaptureWriter, ReplayEngine
+
+from .helpers import CUCS_ID, DISCOVERY_OPTIONS, NullLoop, OFFSET_MESSAGE_TYPE, cleanup, create_cucs_server, \
+    create_vehicle_server, message_type_of
+
+
+async def record_traffic(path):
+    """Captures on a cucs the replies of the default vehicle to a discovery and a control request, returns the
+    number of datagrams captured and the vehicles the cucs discovered live"""
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus)
+
+    # capturing starts before the cucs sends its first discovery
+    cucs = StanagServer(logging.ERROR)
+    cucs.start_capture(path)
+    await cucs.setup_service(asyncio.get_running_loop(), StanagServer.MODE_CUCS, metrics=False, transport_bus=bus,
+        discovery_options=DISCOVERY_OPTIONS)
+    await cucs.get_entity_controller().control_request_async(0x1, 0)
+    records = cucs.stop_capture()
+
+    discovered = cucs.get_entity_controller().get_discovered_vehicles()
+    await cleanup(vehicle, cucs)
+
+    return records, discovered
+
+
+"""One Message 20 from the base platform, a Message 21 per station plus the control reply, a Message 300 per payload"""
+CAPTURED_TYPES = {20: 1, 21: len(DEFAULT_STATIONS) + 1, 300: len(DEFAULT_STATIONS) - 1}
+
+
+async def test_capture_records_every_datagram(tmp_path):
+
+    path = str(tmp_path / "traffic.cap")
+    records, discovered = await record_traffic(path)
+
+    assert 0 in discovered.keys()
+
+    with CaptureReader(path) as reader:
+        types = collections.Counter(message_type_of(data) for _, data in reader)
+
+    assert sum(types.values()) == records
+    assert types == CAPTURED_TYPES
+
+
+async def test_replay_decodes_and_dispatches_the_capture(tmp_path):
+
+    path = str(tmp_path / "traffic.cap")
+    records, _ = await record_traffic(path)
+
+    # a datagram too short to decode and one of an unknown type are counted but never dispatched
+    writer = CaptureWriter(path)
+    writer.write(b'\x00' * 10)
+    writer.write(b'\x00' * OFFSET_MESSAGE_TYPE + (4242).to_bytes(4, 'big') + b'\x00' * 40)
+    writer.close()
+
+    handled = []
+    protocol = StanagProtocol(NullLoop(), logging.ERROR, lambda wrapper, msg: handled.append((wrapper, msg)), None)
+
+    results = await ReplayEngine(asyncio.get_running_loop(), logging.ERROR, protocol).replay(path, batch_size=4)
+
+    assert results['datagrams'] == records + 2
+    assert results['messages'] == records
+    assert len(handled) == records
+
+    assert collections.Counter(wrapper.message_type for wrapper, _ in handled) == CAPTURED_TYPES
+
+    # the bodies are decoded as the live cucs decoded them
+    for wrapper, msg in handled:
+        assert msg.vehicle_id == 0
+        assert msg.cucs_id & 0xFFFFFFFF == CUCS_ID
+
+    stations = sorted(msg.controlled_station for wrapper, msg in handled if wrapper.message_type == 21)
+    assert stations == sorted([station for _, station, _ in DEFAULT_STATIONS] + [0x1])
+
+    stats = protocol.get_stats()
+    assert stats['received'] == records + 2
+    assert stats['unknown'] == 1
+    assert stats['decode_failures'] == 1
+
+    # the protocol callback is restored once the replay is done
+    assert protocol.on_msg_rx_callback is not None
+    assert protocol.on_msg_rx_callback.__name__ == '<lambda>'
+
+
+async def test_replay_through_a_server_waits_for_the_dispatcher(tmp_path):
+
+    path = str(tmp_path / "traffic.cap")
+    records, _ = await record_traffic(path)
+
+    # the dispatcher hands out two messages per loop iteration, the capture takes several to drain
+    bus = LoopbackBus(logging.ERROR)
+    cucs = await create_cucs_server(bus, dispatch_options={'batch_size': 2})
+    loop = asyncio.get_running_loop()
+    protocol = cucs.create_rx_protocol(loop)
+
+    handled = []
+    callback = protocol.on_msg_rx_callback
+    def handle(wrapper, msg):
+        handled.append(wrapper.message_type)
+        callback(wrapper, msg)
+    protocol.on_msg_rx_callback = handle
+
+    results = await ReplayEngine(loop, logging.ERROR, protocol).replay(path, batch_size=records)
+
+    assert results['datagrams'] == records
+    assert results['messages'] == records
+    assert collections.Counter(handled) == CAPTURED_TYPES
+    assert protocol.dispatcher.get_stats()['control_dispatched'] + \
+        protocol.dispatcher.get_stats()['command_dispatched'] == records
+    assert protocol.on_msg_rx_callback is handle
+
+    await cleanup(cucs)
+
+
+def test_reader_ignores_a_record_cut_short(tmp_path):
+
+    path = str(tmp_path / "traffic.cap")
+    writer = CaptureWriter(path)
+    writer.write(b'first', timestamp = 1.0)
+    writer.write(b'second', timestamp = 2.0)
+    writer.close()
+
+    with open(path, 'r+b') as file:
+        file.truncate(os.path.getsize(path) - 2)
+
+    with CaptureReader(path) as reader:
+        records = [(timestamp, bytes(data)) for timestamp, data in reader]
+
+    assert records == [(1.0, b'first')]
+
+    # appending continues the same file
+    writer = CaptureWriter(path)
+    assert writer.get_record_count() == 0
+    writer.close()
+
+
+def test_writer_refuses_to_append_to_another_file(tmp_path):
+
+    path = str(tmp_path / "notes.txt")
+    with open(path, 'wb') as file:
+        file.write(b'not a capture file at all')
+
+    with pytest.raises(ValueError):
+        CaptureWriter(path)
+    with pytest.raises(ValueError):
+        CaptureReader(path)
+
+    with open(path, 'rb') as file:
+        assert file.read() == b'not a capture file at all'
@@ -0,0 +1,78 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+import os
+
+import pytest
+
+from stanag4586vsm.stanag_server import *
+from stanag4586vsm.config import load_config, compile_config
+from stanag4586vsm.dispatch_queue import PRIORITY_TELEMETRY
+from stanag4586edav1.message21 import Message21
+
+from .helpers import cleanup, create_cucs_server, wait_for
+
+SAMPLE_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sample', 'fleet_config.json')
+
+
+def test_sample_config_compiles_with_ranges_expanded():
+
+    mode, setup_kwargs, liveness, vehicles = compile_config(load_config(SAMPLE_CONFIG))
+
+    assert mode == 'vehicle'
+    assert setup_kwargs['port_rx'] == 4586
+    assert setup_kwargs['discovery_response_options'] == {'min_interval': 1.0}
+    assert liveness is None
+
+    assert [vehicle['vehicle_id'] for vehicle in vehicles] == [1] + list(range(100, 116))
+    assert vehicles[0]['vehicle_type'] == Message21.VEHICLE_TYPE_UGV
+    assert vehicles[0]['stations'][1] == ('eo', 1, Message300.PAYLOAD_TYPE_EOIR)
+    assert vehicles[1]['tail_number'] == 'MULE-0100'
+    assert vehicles[2]['call_sign'] == 'MULE1'
+
+
+def test_named_priority_classes_and_liveness():
+
+    mode, setup_kwargs, liveness, vehicles = compile_config({'server': {
+        'mode': 'cucs', 'liveness': {'timeout': 10.0}, 'dispatch': {'queue_sizes': {'telemetry': 16}}}})
+
+    assert mode == 'cucs'
+    assert setup_kwargs['dispatch_options'] == {'queue_sizes': {PRIORITY_TELEMETRY: 16}}
+    assert liveness == {'timeout': 10.0}
+    assert vehicles == []
+
+
+@pytest.mark.parametrize('config, field', [
+    ({'server': {'port': 4586}}, 'server: unknown key [port]'),
+    ({'server': {'mode': 'ground'}}, 'server.mode'),
+    ({'vehicles': [{'vehicle_id': 1, 'stations': 'missing'}]}, 'vehicles[0]: unknown station set'),
+    ({'vehicles': [{'vehicle_id': 1, 'stations': [{'name': 'eo', 'station': 3}]}]}, 'vehicles[0].stations[0]'),
+    ({'vehicles': [{'vehicle_id': 1, 'vehicle_type': 'SUBMARINE'}]}, 'vehicles[0].vehicle_type'),
+    ({'vehicles': [{'vehicle_id': 1}, {'first_vehicle_id': 0, 'count': 2}]}, 'configured twice'),
+    ({'vehicles': [{'vehicle_id': 1, 'tail_number': 'x' * 17}]}, 'vehicles[0].tail_number'),
+    ({'server': {'mode': 'cucs'}, 'vehicles': [{'vehicle_id': 1}]}, 'vehicle mode'),
+])
+def test_bad_configs_name_the_field(config, field):
+
+    with pytest.raises(ValueError) as error:
+        compile_config(config)
+
+    assert field in str(error.value)
+
+
+async def test_server_is_set_up_from_the_sample_config():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = StanagServer(logging.ERROR)
+    await vehicle.setup_from_config(asyncio.get_running_loop(), SAMPLE_CONFIG, transport_bus = bus)
+    cucs = await create_cucs_server(bus)
+    controller = cucs.get_entity_controller()
+
+    await wait_for(lambda: len(controller.get_discovered_vehicles()) == 17)
+    assert controller.get_discovered_vehicles()[1].tail_number == 'UGV-0001'
+
+    await cleanup(vehicle, cucs)
@@ -0,0 +1,69 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+
+from stanag4586vsm.discovery_scheduler import DiscoveryScheduler
+from stanag4586vsm.vehicle_registry import VehicleEvent, EVENT_VEHICLE_LOST
+
+from .helpers import CUCS_ID, NullLoop, message_type_of
+
+
+class LivenessSource:
+    """Stands in for the EntityController whose liveness timeout caps the interval"""
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def get_liveness_timeout(self):
+        return self.timeout
+
+
+def gaps_of(times):
+    return [later - earlier for earlier, later in zip(times, times[1:])]
+
+
+async def test_interval_backs_off_after_the_burst_and_a_lost_vehicle_restarts_it():
+
+    loop = asyncio.get_running_loop()
+    sent_at = []
+    scheduler = DiscoveryScheduler(loop, logging.ERROR, CUCS_ID, lambda data: sent_at.append(loop.time()),
+        burst_count = 3, burst_interval = 0.01, min_interval = 0.02, max_interval = 0.08, backoff = 2.0, jitter = 0.0)
+    assert message_type_of(scheduler.get_datagram()) == 1
+
+    task = asyncio.ensure_future(scheduler.run())
+    await asyncio.sleep(0.3)
+
+    # the delays are never shorter than the schedule, only late by the loop
+    for gap, expected in zip(gaps_of(sent_at), (0.01, 0.01, 0.02, 0.02, 0.04, 0.08)):
+        assert expected - 0.002 <= gap < expected + 0.05
+    assert scheduler.get_stats()['interval'] == 0.08
+
+    del sent_at[:]
+    lost_at = loop.time()
+    scheduler.on_vehicle_events(None, [VehicleEvent(EVENT_VEHICLE_LOST, 1, None, None)])
+    await asyncio.sleep(0.05)
+    task.cancel()
+
+    # the burst starts right away instead of after the 0.08 interval
+    assert sent_at[0] - lost_at < 0.02
+    for gap in gaps_of(sent_at)[:2]:
+        assert 0.01 - 0.002 <= gap < 0.01 + 0.05
+    assert scheduler.get_stats()['bursts'] == 2
+
+
+def test_liveness_timeout_caps_the_interval():
+
+    scheduler = DiscoveryScheduler(NullLoop(), logging.ERROR, CUCS_ID, lambda data: None,
+        max_interval = 60.0, jitter = 0.25)
+    assert scheduler.get_stats()['max_interval'] == 60.0
+
+    source = LivenessSource(10.0)
+    scheduler.set_liveness_source(source)
+    assert scheduler.get_stats()['max_interval'] == 4.0
+
+    source.timeout = None
+    assert scheduler.get_stats()['max_interval'] == 60.0
@@ -0,0 +1,80 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import logging
+
+import pytest
+
+from stanag4586vsm.dispatch_queue import PriorityDispatcher, PRIORITY_CONTROL, PRIORITY_TELEMETRY
+
+from .helpers import ManualLoop
+
+
+def create_dispatcher(**options):
+    loop = ManualLoop()
+    dispatched = []
+    dispatcher = PriorityDispatcher(loop, logging.ERROR, lambda wrapper, msg: dispatched.append(msg), **options)
+    return loop, dispatcher, dispatched
+
+
+def test_control_goes_before_the_telemetry_received_earlier():
+
+    loop, dispatcher, dispatched = create_dispatcher(batch_size = 3)
+
+    for index in range(4):
+        dispatcher.submit(302, None, 'telemetry {}'.format(index))
+    dispatcher.submit(200, None, 'command')
+    dispatcher.submit(1, None, 'control')
+
+    loop.run()
+    assert dispatched == ['control', 'command', 'telemetry 0']
+
+    # a control message arriving while telemetry is left still goes first
+    dispatcher.submit(21, None, 'late control')
+    loop.run()
+    assert dispatched[3:] == ['late control', 'telemetry 1', 'telemetry 2']
+
+    loop.run()
+    assert dispatched[6:] == ['telemetry 3']
+    assert loop.callbacks == []
+
+    stats = dispatcher.get_stats()
+    assert stats['control_dispatched'] == 2
+    assert stats['telemetry_dispatched'] == 4
+    assert stats['telemetry_max_depth'] == 4
+    assert stats['telemetry_queued'] == 0
+
+
+def test_full_queues_drop_the_oldest_telemetry_and_the_newest_of_the_rest():
+
+    loop, dispatcher, dispatched = create_dispatcher(queue_sizes = {PRIORITY_CONTROL: 1, PRIORITY_TELEMETRY: 2})
+
+    assert dispatcher.submit(1, None, 'control 0')
+    assert not dispatcher.submit(1, None, 'control 1')
+    for index in range(3):
+        assert dispatcher.submit(302, None, 'telemetry {}'.format(index))
+
+    loop.run()
+
+    assert dispatched == ['control 0', 'telemetry 1', 'telemetry 2']
+    assert dispatcher.get_dropped() == 2
+    assert dispatcher.get_stats()['control_dropped'] == 1
+    assert dispatcher.get_stats()['telemetry_dropped'] == 1
+
+
+def test_priorities_can_be_reassigned_but_only_to_known_classes():
+
+    loop, dispatcher, dispatched = create_dispatcher()
+    dispatcher.set_priority(302, PRIORITY_CONTROL)
+    dispatcher.submit(200, None, 'command')
+    dispatcher.submit(302, None, 'telemetry')
+    loop.run()
+
+    assert dispatched == ['telemetry', 'command']
+
+    with pytest.raises(ValueError):
+        dispatcher.set_priority(302, 7)
+    with pytest.raises(ValueError):
+        create_dispatcher(priorities = {302: 7})
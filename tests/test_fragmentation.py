@@ -0,0 +1,82 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+
+from stanag4586vsm.fragmentation import Fragmenter, Reassembler, FRAGMENT_NACK_MESSAGE_TYPE
+
+from .helpers import make_datagram, message_type_of
+
+
+def make_response(instance_id, fill, size):
+    """A Message 20020 datagram with instance_id whose body is size bytes of fill"""
+    return make_datagram(20020, fill * size, instance_id)
+
+
+async def test_responses_sharing_an_instance_id_are_rebuilt_side_by_side():
+
+    loop = asyncio.get_running_loop()
+    sent = []
+
+    fragmenter = Fragmenter(loop, logging.ERROR, sent.append, {}, max_datagram_size = 200)
+    reassembler = Reassembler(loop, logging.ERROR, sent.append, max_datagram_size = 200)
+
+    # two long responses of one entity go out concurrently under the same instance id
+    first = make_response(1, b'a', 1000)
+    second = make_response(1, b'b', 1500)
+    first_fragments = fragmenter.split(first)
+    second_fragments = fragmenter.split(second)
+    assert fragmenter.get_stats()['retained'] == 2
+
+    rebuilt = []
+    for index in range(max(len(first_fragments), len(second_fragments))):
+        for fragments in (first_fragments, second_fragments):
+            if index < len(fragments):
+                datagram = reassembler.add(fragments[index], ('10.0.0.1', 4000))
+                if datagram is not None:
+                    rebuilt.append(datagram)
+
+    reassembler.close()
+
+    assert sorted(rebuilt) == sorted([first, second])
+
+
+async def test_senders_are_reassembled_separately_and_retransmit_by_transfer():
+
+    loop = asyncio.get_running_loop()
+    nacks = []
+    resent = []
+
+    first_sender = Fragmenter(loop, logging.ERROR, resent.append, {}, max_datagram_size = 200)
+    second_sender = Fragmenter(loop, logging.ERROR, resent.append, {}, max_datagram_size = 200)
+    reassembler = Reassembler(loop, logging.ERROR, nacks.append, nack_interval = 0.01, max_datagram_size = 200)
+
+    first = make_response(7, b'a', 800)
+    second = make_response(7, b'b', 800)
+    first_fragments = first_sender.split(first)
+    second_fragments = second_sender.split(second)
+
+    # the last fragment of the first sender is lost
+    for fragment in first_fragments[:-1]:
+        assert reassembler.add(fragment, ('10.0.0.1', 4000)) is None
+    rebuilt = [reassembler.add(fragment, ('10.0.0.2', 4000)) for fragment in second_fragments]
+    assert rebuilt[-1] == second
+
+    await asyncio.sleep(0.05)
+    assert len(nacks) > 0
+    assert message_type_of(nacks[0]) == FRAGMENT_NACK_MESSAGE_TYPE
+
+    # only the sender of the transfer has the fragments asked for
+    assert second_sender.on_nack(nacks[0]) == 0
+    assert first_sender.on_nack(nacks[0]) == 1
+
+    assert reassembler.add(resent[0], ('10.0.0.1', 4000)) == first
+
+    stats = reassembler.get_stats()
+    reassembler.close()
+
+    assert stats['messages'] == 2
+    assert stats['pending'] == 0
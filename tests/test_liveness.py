@@ -0,0 +1,71 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+
+from stanag4586vsm.stanag_server import *
+from stanag4586vsm.timer_wheel import TimerWheel, SLOT_COUNT
+from stanag4586vsm.vehicle_registry import EVENT_VEHICLE_LOST
+
+from .helpers import cleanup, create_cucs_server, create_vehicle_server, wait_for
+
+
+def test_keys_expire_on_the_tick_of_their_deadline():
+
+    wheel = TimerWheel(1.0, 0.0)
+    wheel.schedule('a', 3.0)
+    wheel.schedule('b', 2.5)
+    wheel.schedule('c', 5.0)
+    wheel.schedule('a', 4.0)
+    assert wheel.cancel('c')
+    assert not wheel.cancel('c')
+
+    assert wheel.advance(2.0) == []
+    assert wheel.advance(3.0) == ['b']
+    assert wheel.advance(3.9) == []
+    assert wheel.advance(4.0) == ['a']
+    assert len(wheel) == 0
+
+
+def test_deadlines_on_the_upper_levels_cascade_down():
+
+    wheel = TimerWheel(1.0, 0.0, levels = 2)
+    # past the first level, and past the range of the whole wheel
+    far = SLOT_COUNT * 3 + 5
+    beyond = SLOT_COUNT * SLOT_COUNT * 2 + 7
+    wheel.schedule('far', far)
+    wheel.schedule('beyond', beyond)
+
+    expired = {}
+    for now in range(1, beyond + 1):
+        for key in wheel.advance(now):
+            expired[key] = now
+
+    assert expired == {'far': far, 'beyond': beyond}
+
+
+async def test_a_silent_vehicle_is_lost_after_the_timeout():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1)
+    cucs = await create_cucs_server(bus, discovery_options = {'burst_count': 1, 'min_interval': 0.02, 'max_interval': 0.02})
+    controller = cucs.get_entity_controller()
+    controller.enable_liveness(timeout = 0.1, tick = 0.01)
+
+    events = []
+    controller.add_listener_for_vehicle_events(lambda controller, batch: events.extend(batch))
+    await wait_for(lambda: 1 in controller.get_discovered_vehicles())
+
+    # answering the discoveries keeps the vehicle alive past the timeout
+    await asyncio.sleep(0.2)
+    assert 1 in controller.get_discovered_vehicles()
+
+    await cleanup(vehicle)
+    await wait_for(lambda: 1 not in controller.get_discovered_vehicles())
+
+    assert [event.vehicle_id for event in events if event.kind == EVENT_VEHICLE_LOST] == [1]
+
+    await cleanup(cucs)
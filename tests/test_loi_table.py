@@ -0,0 +1,80 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import logging
+
+from stanag4586vsm.controllable_entity import ControllableEntity
+from stanag4586vsm.loi_table import LoiTable
+from stanag4586edav1.message01 import *
+
+from .helpers import NullLoop
+
+FIRST_CUCS = 0xA0
+SECOND_CUCS = 0xB0
+
+"""(vehicle id, station number) of the rows, in the order they are added"""
+KEYS = [(1, 0x0), (1, 0x1), (1, 0x2), (2, 0x1)]
+
+
+def create_table():
+    entities = {}
+    table = LoiTable(logging.ERROR)
+    for vehicle_id, station_id in KEYS:
+        entity = ControllableEntity(NullLoop(), logging.ERROR, station_id, 0, vehicle_id, 0, 0, lambda data: None)
+        entities[(vehicle_id, station_id)] = entity
+        table.add_entity(entity)
+    return table, entities
+
+
+def assert_matches_the_entities(table, entities):
+    for cucs_id in (FIRST_CUCS, SECOND_CUCS):
+        assert table.get_granted(cucs_id, KEYS) == bytes(entities[key].get_loi_granted(cucs_id) for key in KEYS)
+        assert table.get_authorized(cucs_id, KEYS) == bytes(entities[key].get_loi_authorized(cucs_id) for key in KEYS)
+
+
+def test_handover_batch_grants_free_stations_to_the_first_asking():
+
+    table, entities = create_table()
+
+    changed = table.apply_handover([
+        (1, 0x1, FIRST_CUCS, Message01.LOI_03 | Message01.LOI_02, 0x01),
+        (1, 0x1, SECOND_CUCS, Message01.LOI_03, 0x01),
+        (1, 0x0, SECOND_CUCS, Message01.LOI_05 | Message01.LOI_02, 0x01),
+        (9, 0x1, SECOND_CUCS, Message01.LOI_03, 0x01),
+    ])
+
+    assert sorted(changed) == [(1, 0x0), (1, 0x1)]
+    assert entities[(1, 0x1)].getControllingCucs() == FIRST_CUCS
+    assert set(entities[(1, 0x1)].getMonitoringCucs()) == {FIRST_CUCS}
+    assert entities[(1, 0x0)].getControllingCucs() == SECOND_CUCS
+    assert table.get_controlled_rows(FIRST_CUCS) == 0b0010
+    assert table.get_granted(FIRST_CUCS) == bytes([0, Message01.LOI_05 | Message01.LOI_02, 0, 0])
+    assert_matches_the_entities(table, entities)
+
+
+def test_control_moves_within_a_batch_and_follows_the_entities():
+
+    table, entities = create_table()
+    table.apply_handover([(1, 0x1, FIRST_CUCS, Message01.LOI_03, 0x01)])
+
+    # the release is applied before the request whatever their order in the batch
+    changed = table.apply_handover([
+        (1, 0x1, SECOND_CUCS, Message01.LOI_03, 0x01),
+        (1, 0x1, FIRST_CUCS, Message01.LOI_03, 0x00),
+    ])
+
+    assert changed == [(1, 0x1)]
+    assert table.get_controlling_cucs(1, 0x1) == SECOND_CUCS
+    assert entities[(1, 0x1)].getControllingCucs() == SECOND_CUCS
+
+    # changes made on an entity reach the table
+    entities[(2, 0x1)].set_loi_state(FIRST_CUCS, [FIRST_CUCS, SECOND_CUCS])
+    assert table.get_controlling_cucs(2, 0x1) == FIRST_CUCS
+    assert table.get_monitoring_cucs(2, 0x1) == {FIRST_CUCS, SECOND_CUCS}
+    assert_matches_the_entities(table, entities)
+
+    table.remove_entity(entities[(1, 0x1)])
+    assert table.get_controlling_cucs(1, 0x1) is None
+    assert len(table) == len(KEYS) - 1
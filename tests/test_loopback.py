@@ -0,0 +1,100 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+import random
+
+from stanag4586vsm.loopback import LoopbackBus
+from stanag4586vsm.fragmentation import Fragmenter, Reassembler
+
+from .helpers import make_datagram
+
+
+class RecordingProtocol:
+    """Keeps every datagram received with the address it came from"""
+
+    def __init__(self):
+        self.received = []
+
+    def datagram_received(self, data, addr):
+        self.received.append((bytes(data), addr))
+
+
+def test_datagrams_reach_the_protocols_joined_to_the_group():
+
+    bus = LoopbackBus(logging.ERROR)
+    first = RecordingProtocol()
+    second = RecordingProtocol()
+    other = RecordingProtocol()
+    bus.join('224.10.10.10', 50000, first)
+    bus.join('224.10.10.10', 50000, second)
+    bus.join('224.10.10.10', 50001, other)
+
+    transport = bus.create_transport('224.10.10.10', 50000)
+    transport.sendto(b'first')
+    bus.leave('224.10.10.10', 50000, second)
+    transport.sendto(b'second')
+    transport.close()
+    transport.sendto(b'closed')
+
+    assert [data for data, addr in first.received] == [b'first', b'second']
+    assert [data for data, addr in second.received] == [b'first']
+    assert other.received == []
+    assert bus.get_stats() == {'datagrams': 2, 'bytes': 11, 'deliveries': 3, 'groups': 2}
+
+
+def test_every_transport_has_a_source_address_of_its_own():
+
+    bus = LoopbackBus(logging.ERROR)
+    protocol = RecordingProtocol()
+    bus.join('224.10.10.10', 50000, protocol)
+
+    first = bus.create_transport('224.10.10.10', 50000)
+    second = bus.create_transport('224.10.10.10', 50000)
+    first.sendto(b'a')
+    second.sendto(b'b')
+    first.sendto(b'c')
+
+    addresses = [addr for data, addr in protocol.received]
+    assert addresses[0] == first.get_extra_info('sockname')
+    assert addresses[1] == second.get_extra_info('sockname')
+    assert addresses[0] == addresses[2]
+    assert addresses[0] != addresses[1]
+
+
+async def test_colliding_transfers_of_two_senders_are_rebuilt_on_the_bus():
+
+    loop = asyncio.get_running_loop()
+    bus = LoopbackBus(logging.ERROR)
+
+    rebuilt = []
+    reassembler = Reassembler(loop, logging.ERROR, lambda data: None, max_datagram_size = 200)
+
+    class ReassemblingProtocol:
+        def datagram_received(self, data, addr):
+            datagram = reassembler.add(data, addr)
+            if datagram is not None:
+                rebuilt.append(datagram)
+
+    bus.join('224.10.10.10', 50000, ReassemblingProtocol())
+
+    # both senders start at the same transfer id so their fragments carry the same key
+    senders = []
+    for fill in (b'a', b'b'):
+        random.seed(4586)
+        fragmenter = Fragmenter(loop, logging.ERROR, lambda data: None, {}, max_datagram_size = 200)
+        datagram = make_datagram(20020, fill * 800, 7)
+        senders.append((bus.create_transport('224.10.10.10', 50000), datagram, fragmenter.split(datagram)))
+
+    assert senders[0][2][0][30:46] == senders[1][2][0][30:46]
+
+    for index in range(len(senders[0][2])):
+        for transport, datagram, fragments in senders:
+            transport.sendto(fragments[index])
+
+    reassembler.close()
+
+    assert sorted(rebuilt) == sorted([datagram for transport, datagram, fragments in senders])
@@ -0,0 +1,110 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+
+from stanag4586vsm.stanag_server import *
+from stanag4586vsm.controllable_entity import ControllableEntity
+from stanag4586vsm.metrics import Histogram, ServerMetrics
+
+from .helpers import CUCS_ID, cleanup, create_cucs_server, create_vehicle_server, wait_for
+
+
+def test_histogram_percentiles_are_bucket_bounds():
+
+    histogram = Histogram((0.001, 0.01, 0.1))
+    for value in (0.0005, 0.0005, 0.005, 0.05, 1.0):
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.percentile(0.4) == 0.001
+    assert histogram.percentile(0.6) == 0.01
+    assert histogram.percentile(1.0) is None
+    assert Histogram((1.0,)).percentile(0.5) == 0.0
+
+
+def test_collectors_are_exported_as_gauges():
+
+    metrics = ServerMetrics()
+    metrics.add_collector('tx', lambda: {'queue_depth': 3, 'paused': False, 'name': 'not a number'})
+    metrics.add_collector('missing', lambda: None)
+    metrics.add_collector('failing', lambda: 1 / 0)
+
+    assert metrics.collect() == {'tx': {'queue_depth': 3, 'paused': False, 'name': 'not a number'}}
+
+    text = metrics.render_prometheus()
+    assert 'stanag_tx_queue_depth 3.0' in text
+    assert 'stanag_tx_paused 0.0' in text
+    assert 'stanag_tx_name' not in text
+    assert 'stanag_missing' not in text
+
+
+def test_handled_counter_of_an_unregistered_entity_starts_at_zero():
+
+    metrics = ServerMetrics()
+    metrics.on_handled(1, 2)
+    metrics.on_handled(1, 2)
+
+    assert metrics.entity_handled == {(1, 2): 2}
+
+
+async def test_metrics_are_off_by_default():
+
+    bus = LoopbackBus(logging.ERROR)
+    server = StanagServer(logging.ERROR)
+    await server.setup_service(asyncio.get_running_loop(), StanagServer.MODE_VEHICLE, transport_bus=bus)
+
+    assert server.get_metrics() is None
+
+    await cleanup(server)
+
+
+async def test_rx_tx_handled_and_discovery_counters():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1, metrics=True, discovery_response_options={})
+    cucs = await create_cucs_server(bus, metrics=True)
+
+    await wait_for(lambda: 1 in cucs.get_entity_controller().get_discovered_vehicles())
+    await cucs.get_entity_controller().control_request_async(0x1, 1)
+
+    vehicle_metrics = vehicle.get_metrics().snapshot()
+    cucs_metrics = cucs.get_metrics().snapshot()
+
+    assert vehicle_metrics['rx_packets'][1] >= 2
+    assert vehicle_metrics['entity_handled'][(1, 0x1)] >= 1
+    assert vehicle_metrics['tx_packets'][21] == cucs_metrics['rx_packets'][21]
+    assert cucs_metrics['dispatch_latency']['count'] > 0
+
+    # the discovery counters of both sides reach the exported metrics
+    assert cucs_metrics['collected']['discovery']['sent'] >= 1
+    assert vehicle_metrics['collected']['discovery_response']['requests'] >= 1
+    assert 'stanag_discovery_sent' in cucs.get_metrics().render_prometheus()
+    assert 'stanag_discovery_response_requests' in vehicle.get_metrics().render_prometheus()
+
+    await cleanup(vehicle, cucs)
+
+
+async def test_removing_one_of_two_entities_on_a_station_keeps_it_routed():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1, metrics=True)
+    loop = asyncio.get_running_loop()
+
+    # the entity added last takes the route of the station, removing it hands the route back to the first
+    backup = ControllableEntity(loop, logging.ERROR, 0x1, 0, 1, 0, 0, vehicle.tx_data)
+    vehicle.add_entity('eo_backup', backup)
+    vehicle.remove_entity('eo_backup', 1)
+
+    # the station is still reachable and its handled counter still exists
+    cucs = await create_cucs_server(bus)
+    await wait_for(lambda: 1 in cucs.get_entity_controller().get_discovered_vehicles())
+    await cucs.get_entity_controller().control_request_async(0x1, 1)
+
+    assert vehicle.get_entity('eo', 1).getControllingCucs() & 0xFFFFFFFF == CUCS_ID
+    assert vehicle.get_metrics().entity_handled[(1, 0x1)] >= 1
+
+    await cleanup(vehicle, cucs)
@@ -0,0 +1,50 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import logging
+
+from stanag4586vsm.stanag_server import *
+
+from .helpers import cleanup, create_cucs_server, create_vehicle_server, wait_for
+
+
+async def test_every_hosted_vehicle_is_discovered_with_its_stations():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, *range(1, 21))
+    vehicle.add_vehicle(30, stations = [('base', 0x0, None), ('mast', 0x2, Message300.PAYLOAD_TYPE_MAST)],
+        tail_number = 'T-30')
+    cucs = await create_cucs_server(bus)
+    controller = cucs.get_entity_controller()
+
+    await wait_for(lambda: len(controller.get_discovered_vehicles()) == 21)
+
+    vehicles = controller.get_discovered_vehicles()
+    assert sorted(vehicle.get_vehicle_ids()) == list(range(1, 21)) + [30]
+    assert sorted(vehicles[30].stations.keys()) == [0x2]
+    assert all(len(vehicles[vehicle_id].stations) == len(DEFAULT_STATIONS) - 1 for vehicle_id in range(1, 21))
+
+    await cleanup(vehicle, cucs)
+
+
+async def test_removed_and_replaced_vehicles():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1, 2)
+
+    vehicle.remove_vehicle(1)
+    assert vehicle.get_vehicle_ids() == [2]
+    assert vehicle.get_entity('eo', 1) is None
+
+    # hosting a vehicle again replaces its stations
+    vehicle.add_vehicle(2, stations = [('base', 0x0, None)])
+    assert vehicle.get_entity('eo', 2) is None
+    assert vehicle.get_entity('base', 2).getVehicleId() == 2
+
+    cucs = await create_cucs_server(bus)
+    await wait_for(lambda: 2 in cucs.get_entity_controller().get_discovered_vehicles())
+    assert 1 not in cucs.get_entity_controller().get_discovered_vehicles()
+
+    await cleanup(vehicle, cucs)
@@ -0,0 +1,101 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+
+from stanag4586vsm.stanag_server import *
+
+from .helpers import CUCS_ID, cleanup, create_cucs_server, create_vehicle_server, wait_for
+
+
+async def test_servers_hold_separate_entities_and_routes():
+
+    bus = LoopbackBus(logging.ERROR)
+    first = await create_vehicle_server(bus, 1)
+    second = await create_vehicle_server(bus, 2)
+
+    assert first.get_vehicle_ids() == [1]
+    assert second.get_vehicle_ids() == [2]
+
+    assert first.get_entity('eo', vehicle_id=1) is not None
+    assert first.get_entity('eo', vehicle_id=2) is None
+    assert second.get_entity('eo', vehicle_id=1) is None
+    assert second.get_entity('eo', vehicle_id=2) is not None
+
+    # removing a vehicle from one server leaves the other untouched
+    first.remove_vehicle(1)
+    assert first.get_vehicle_ids() == []
+    assert second.get_vehicle_ids() == [2]
+    assert second.get_entity('base', vehicle_id=2) is not None
+
+    await cleanup(first, second)
+
+
+async def test_loi_state_is_per_server():
+
+    bus = LoopbackBus(logging.ERROR)
+    first = await create_vehicle_server(bus, 1)
+    second = await create_vehicle_server(bus, 2)
+    cucs = await create_cucs_server(bus)
+    controller = cucs.get_entity_controller()
+
+    await controller.control_request_async(0x1, 1)
+    await controller.monitor_request_async(0x1, 2)
+
+    eo_first = first.get_entity('eo', vehicle_id=1)
+    eo_second = second.get_entity('eo', vehicle_id=2)
+
+    assert eo_first.getControllingCucs() & 0xFFFFFFFF == CUCS_ID
+    assert eo_second.getControllingCucs() == 0
+    assert [cucs_id & 0xFFFFFFFF for cucs_id in eo_second.getMonitoringCucs()] == [CUCS_ID]
+    assert eo_first.getMonitoringCucs() == []
+
+    await cleanup(first, second, cucs)
+
+
+async def test_controllers_keep_separate_registries():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 7)
+    first = await create_cucs_server(bus)
+    await wait_for(lambda: 7 in first.get_entity_controller().get_discovered_vehicles())
+
+    # the second controller starts empty and discovers the vehicle on its own
+    assert StanagServer(logging.ERROR).get_entity_controller() is None
+
+    second = await create_cucs_server(bus)
+    assert second.get_entity_controller() is not first.get_entity_controller()
+    await wait_for(lambda: 7 in second.get_entity_controller().get_discovered_vehicles())
+
+    assert first.get_entity_controller().remove_vehicle(7)
+    assert 7 not in first.get_entity_controller().get_discovered_vehicles()
+    assert 7 in second.get_entity_controller().get_discovered_vehicles()
+
+    await cleanup(vehicle, first, second)
+
+
+async def test_shutting_down_one_server_leaves_the_other_running():
+
+    bus = LoopbackBus(logging.ERROR)
+    first = await create_vehicle_server(bus, 1)
+    second = await create_vehicle_server(bus, 2)
+    cucs = await create_cucs_server(bus)
+    controller = cucs.get_entity_controller()
+
+    await first.cleanup_service()
+
+    # the stopped server no longer answers, the other one still grants control
+    await controller.control_request_async(0x1, 2, timeout=0.2, retries=0)
+    assert second.get_entity('eo', vehicle_id=2).getControllingCucs() & 0xFFFFFFFF == CUCS_ID
+
+    try:
+        await controller.control_request_async(0x1, 1, timeout=0.05, retries=0)
+        assert False, "a stopped server answered"
+    except asyncio.TimeoutError:
+        pass
+    assert first.get_entity('eo', vehicle_id=1).getControllingCucs() == 0
+
+    await cleanup(second, cucs)
@@ -0,0 +1,121 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import logging
+import os
+
+import pytest
+
+from stanag4586vsm.stanag_server import *
+from stanag4586vsm.ownership_journal import OwnershipJournal
+
+from .helpers import CUCS_ID, cleanup, create_cucs_server, create_vehicle_server, wait_for
+
+"""Sizes of the file header and of a record"""
+HEADER_SIZE = 16
+RECORD_SIZE = 24
+
+
+def test_state_survives_a_reopen(tmp_path):
+
+    path = str(tmp_path / 'journal')
+    journal = OwnershipJournal(path, logging.ERROR)
+    assert journal.record(1, 0x1, 0xA0, [0xB0, 0xC0]) == 3
+    assert journal.record(1, 0x1, 0xA0, [0xB0, 0xC0]) == 0
+    assert journal.record(1, 0x2, 0xB0, []) == 1
+    assert journal.record(1, 0x2, 0, []) == 1
+    journal.close()
+
+    journal = OwnershipJournal(path, logging.ERROR)
+    controlling_cucs_id, monitoring_cucs = journal.get_state(1, 0x1)
+    assert controlling_cucs_id == 0xA0
+    assert sorted(monitoring_cucs) == [0xB0, 0xC0]
+    assert journal.get_state(1, 0x2) is None
+    assert journal.get_stats()['records'] == 5
+    assert journal.get_stats()['stations'] == 1
+    journal.close()
+
+
+def test_a_torn_or_damaged_tail_is_truncated(tmp_path):
+
+    path = str(tmp_path / 'journal')
+    journal = OwnershipJournal(path, logging.ERROR)
+    journal.record(1, 0x1, 0xA0, [])
+    journal.record(1, 0x2, 0xB0, [])
+    journal.close()
+
+    # the last record written only in part, as by a crash in the middle of a write
+    with open(path, 'r+b') as file:
+        file.truncate(HEADER_SIZE + RECORD_SIZE + RECORD_SIZE // 2)
+
+    journal = OwnershipJournal(path, logging.ERROR)
+    assert journal.get_states() == {(1, 0x1): (0xA0, [])}
+    assert journal.get_stats()['truncated_bytes'] == RECORD_SIZE // 2
+    journal.record(1, 0x3, 0xC0, [])
+    journal.close()
+    assert os.path.getsize(path) == HEADER_SIZE + 2 * RECORD_SIZE
+
+    # a flipped bit fails the crc of its record, it and everything after it are dropped
+    with open(path, 'r+b') as file:
+        file.seek(HEADER_SIZE + RECORD_SIZE + 4)
+        byte = file.read(1)
+        file.seek(HEADER_SIZE + RECORD_SIZE + 4)
+        file.write(bytes([byte[0] ^ 0x01]))
+
+    journal = OwnershipJournal(path, logging.ERROR)
+    assert journal.get_states() == {(1, 0x1): (0xA0, [])}
+    assert journal.get_stats()['truncated_bytes'] == RECORD_SIZE
+    journal.close()
+
+
+def test_journal_is_compacted_to_the_current_state(tmp_path):
+
+    path = str(tmp_path / 'journal')
+    journal = OwnershipJournal(path, logging.ERROR, compact_threshold = 10)
+    # a grant, then a release and a grant for every change of controller, the 11th record compacts
+    for index in range(6):
+        journal.record(1, 0x1, 0xA0 + index % 2, [])
+
+    stats = journal.get_stats()
+    assert stats['compactions'] == 1
+    assert stats['records'] == 1
+    assert not os.path.exists(path + '.compact')
+
+    journal.close()
+    journal = OwnershipJournal(path, logging.ERROR)
+    assert journal.get_states() == {(1, 0x1): (0xA1, [])}
+    assert os.path.getsize(path) == HEADER_SIZE + RECORD_SIZE
+    journal.close()
+
+
+def test_a_foreign_file_is_refused(tmp_path):
+
+    path = str(tmp_path / 'journal')
+    with open(path, 'wb') as file:
+        file.write(b'not a journal at all')
+
+    with pytest.raises(ValueError):
+        OwnershipJournal(path, logging.ERROR)
+
+    # and left as it was
+    with open(path, 'rb') as file:
+        assert file.read() == b'not a journal at all'
+
+
+async def test_control_is_restored_when_the_vehicle_restarts(tmp_path):
+
+    path = str(tmp_path / 'journal')
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1, journal_path = path)
+    cucs = await create_cucs_server(bus)
+    await wait_for(lambda: 1 in cucs.get_entity_controller().get_discovered_vehicles())
+    await cucs.get_entity_controller().control_request_async(0x1, 1)
+    await cleanup(vehicle)
+
+    restarted = await create_vehicle_server(bus, 1, journal_path = path)
+    assert restarted.get_entity('eo', 1).getControllingCucs() & 0xFFFFFFFF == CUCS_ID
+    assert restarted.get_entity('mast', 1).getControllingCucs() == 0
+
+    await cleanup(restarted, cucs)
@@ -0,0 +1,71 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import logging
+
+from stanag4586vsm.stanag_server import *
+from stanag4586vsm.stanag_protocol import StanagProtocol, LazyMessage
+
+from .helpers import CUCS_ID, NullLoop, cleanup, create_cucs_server, create_vehicle_server, make_control_request, wait_for
+
+
+def test_prefilter_sees_the_addressing_fields_before_decoding():
+
+    seen = []
+    received = []
+    protocol = StanagProtocol(NullLoop(), logging.ERROR, lambda wrapper, msg: received.append(msg), None)
+    protocol.set_prefilter(lambda message_type, vehicle_id, station_id:
+        seen.append((message_type, vehicle_id, station_id)) or vehicle_id == 3)
+
+    protocol.datagram_received(make_control_request(3, 0x1), None)
+    protocol.datagram_received(make_control_request(4, 0x2), None)
+
+    assert seen == [(1, 3, 0x1), (1, 4, 0x2)]
+    assert [msg.vehicle_id for msg in received] == [3]
+    assert protocol.get_stats()['filtered'] == 1
+    assert protocol.get_stats()['filter_rate'] == 0.5
+
+
+def test_lazy_message_is_decoded_on_first_use():
+
+    received = []
+    protocol = StanagProtocol(NullLoop(), logging.ERROR, lambda wrapper, msg: received.append(msg), None)
+    protocol.lazy_decode = True
+    buffer = bytearray(make_control_request(3, 0x1))
+
+    protocol.datagram_received(memoryview(buffer), None)
+    buffer[:] = bytes(len(buffer))
+
+    msg = received[0]
+    assert isinstance(msg, LazyMessage)
+    assert msg.vehicle_id == 3
+    assert msg.getStationId() == 0x1
+    assert not msg.is_decoded()
+
+    assert msg.cucs_id == 0xA0
+    assert msg.is_decoded()
+
+
+async def test_vehicle_drops_foreign_traffic_and_handles_lazy_messages():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1, lazy_decode = True)
+    other = await create_vehicle_server(bus, 2)
+    cucs = await create_cucs_server(bus)
+    controller = cucs.get_entity_controller()
+    await wait_for(lambda: len(controller.get_discovered_vehicles()) == 2)
+
+    await controller.control_request_async(0x1, 1)
+    await controller.control_request_async(0x1, 2)
+
+    assert vehicle.get_entity('eo', 1).getControllingCucs() & 0xFFFFFFFF == CUCS_ID
+    assert vehicle.get_rx_stats()['filtered'] == 1
+
+    # further rules apply to the messages of hosted vehicles as well
+    vehicle.add_rx_filter(lambda message_type, vehicle_id, station_id: station_id != 0x2)
+    cucs.tx_data(make_control_request(1, 0x2))
+    await wait_for(lambda: vehicle.get_rx_stats()['filtered'] == 2)
+
+    await cleanup(vehicle, other, cucs)
@@ -0,0 +1,67 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import logging
+
+from stanag4586vsm.stanag_protocol import StanagProtocol
+from stanag4586edav1.message_wrapper import *
+
+from .helpers import NullLoop, make_control_request, make_datagram
+
+
+def create_protocol():
+    received = []
+    protocol = StanagProtocol(NullLoop(), logging.ERROR, lambda wrapper, msg: received.append((wrapper, msg)), None)
+    return protocol, received
+
+
+def test_message_is_decoded_from_bytes_and_from_a_memoryview():
+
+    protocol, received = create_protocol()
+    data = make_control_request(3, 0x1)
+
+    protocol.datagram_received(data, None)
+    buffer = bytearray(data)
+    protocol.datagram_received(memoryview(buffer), None)
+    # the decoded message does not refer to the buffer of the datagram
+    buffer[:] = bytes(len(buffer))
+
+    assert len(received) == 2
+    for wrapper, msg in received:
+        assert wrapper.message_type == 1
+        assert wrapper.msg_instance_id == 5
+        assert msg.vehicle_id == 3
+        assert msg.controlled_station == 0x1
+        assert msg.cucs_id == 0xA0
+
+    assert protocol.get_stats()['decoded'] == 2
+
+
+def test_unknown_and_short_datagrams_are_counted_and_dropped():
+
+    protocol, received = create_protocol()
+
+    protocol.datagram_received(make_datagram(9999), None)
+    protocol.datagram_received(b'\x00' * 10, None)
+    protocol.datagram_received(make_control_request(3, 0x1)[:-4], None)
+
+    assert received == []
+    stats = protocol.get_stats()
+    assert stats['received'] == 3
+    assert stats['unknown'] == 1
+    assert stats['decode_failures'] == 2
+    assert stats['decoded'] == 0
+
+
+def test_bytes_past_the_fixed_fields_are_set_as_the_trailer():
+
+    protocol, received = create_protocol()
+    data = bytearray(make_control_request(3, 0x1) + b'extra')
+    wrapper = MessageWrapper.from_buffer(data)
+    wrapper.message_length += 5
+
+    protocol.datagram_received(bytes(data) + b'ignored', None)
+
+    assert received[0][1].trailer == b'extra'
@@ -0,0 +1,146 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+
+from stanag4586vsm.stanag_server import *
+from stanag4586vsm.query_cache import QueryResponseCache, get_query_response
+from stanag4586edav1.message20010 import Message20010
+
+from .helpers import ManualLoop, cleanup, create_cucs_server, create_vehicle_server
+
+CONFIG = Message20010.QUERY_TYPE_SEND_CONFIG
+
+
+def test_entries_expire_after_their_ttl():
+
+    loop = ManualLoop()
+    cache = QueryResponseCache(loop, logging.ERROR, ttl = 10.0)
+    cache.put((1, 0x1, CONFIG), b'default')
+    cache.put((1, 0x2, CONFIG), b'short', 2.0)
+
+    loop.now = 1.9
+    assert cache.get((1, 0x1, CONFIG)) == b'default'
+    assert cache.get((1, 0x2, CONFIG)) == b'short'
+
+    loop.now = 2.0
+    assert cache.get((1, 0x2, CONFIG)) is None
+    assert cache.get((1, 0x1, CONFIG)) == b'default'
+
+    loop.now = 10.0
+    assert cache.get((1, 0x1, CONFIG)) is None
+    assert len(cache) == 0
+
+    stats = cache.get_stats()
+    assert stats['hits'] == 3
+    assert stats['misses'] == 2
+    assert stats['expired'] == 2
+
+
+def test_entries_without_ttl_are_kept_until_invalidated():
+
+    loop = ManualLoop()
+    cache = QueryResponseCache(loop, logging.ERROR, ttl = None)
+    cache.put((1, 0x1, CONFIG), b'kept')
+
+    loop.now = 1e9
+    assert cache.get((1, 0x1, CONFIG)) == b'kept'
+    assert cache.get_stats()['expired'] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+
+    cache = QueryResponseCache(ManualLoop(), logging.ERROR, max_entries = 2)
+    cache.put((1, 0x1, CONFIG), b'first')
+    cache.put((1, 0x2, CONFIG), b'second')
+
+    # reading the first makes the second the least recently used
+    assert cache.get((1, 0x1, CONFIG)) == b'first'
+    cache.put((1, 0x3, CONFIG), b'third')
+
+    assert cache.get((1, 0x2, CONFIG)) is None
+    assert cache.get((1, 0x1, CONFIG)) == b'first'
+    assert cache.get((1, 0x3, CONFIG)) == b'third'
+    assert cache.get_stats()['evicted'] == 1
+    assert len(cache) == 2
+
+
+def test_invalidate_drops_the_matching_entries():
+
+    cache = QueryResponseCache(ManualLoop(), logging.ERROR)
+    for key in [(1, 0x1, CONFIG), (1, 0x1, CONFIG + 1), (1, 0x2, CONFIG), (2, 0x1, CONFIG)]:
+        cache.put(key, b'response')
+
+    assert cache.invalidate(1, 0x1, CONFIG) == 1
+    assert cache.invalidate(vehicle_id = 1) == 2
+    assert cache.invalidate(vehicle_id = 3) == 0
+    assert cache.invalidate() == 1
+
+    assert len(cache) == 0
+    assert cache.get_stats()['invalidated'] == 4
+
+
+async def test_responses_are_computed_once_and_invalidated_with_the_handler():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1)
+    cucs = await create_cucs_server(bus)
+    controller = cucs.get_entity_controller()
+    entity = vehicle.get_entity('eo', 1)
+
+    calls = []
+    def handler(entity, msg):
+        calls.append(msg.query_type)
+        return 'x' * 300
+
+    entity.register_query_handler(CONFIG, handler)
+
+    # the response is longer than the response field, the rest follows the message
+    for _ in range(3):
+        msg = await controller.query_request_async(1, 0x1)
+        assert get_query_response(msg) == 'x' * 300
+
+    assert calls == [CONFIG]
+    stats = vehicle.get_query_stats()
+    assert stats['computed'] == 1
+    assert stats['hits'] == 2
+    assert stats['entries'] == 1
+
+    entity.invalidate_query(CONFIG)
+    await controller.query_request_async(1, 0x1)
+    assert calls == [CONFIG, CONFIG]
+
+    await cleanup(vehicle, cucs)
+
+
+async def test_queries_arriving_during_a_computation_share_its_response():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1)
+    cucs = await create_cucs_server(bus)
+    controller = cucs.get_entity_controller()
+
+    release = asyncio.Event()
+    async def handler(entity, msg):
+        await release.wait()
+        return 'computed once'
+
+    # a ttl of 0 answers the queries waiting for the computation but caches nothing
+    vehicle.get_entity('eo', 1).register_query_handler(CONFIG, handler, 0)
+
+    requests = [asyncio.ensure_future(controller.query_request_async(1, 0x1, timeout = 2.0)) for _ in range(3)]
+    await asyncio.sleep(0.05)
+    release.set()
+    responses = await asyncio.gather(*requests)
+
+    assert [get_query_response(msg) for msg in responses] == ['computed once'] * 3
+    stats = vehicle.get_query_stats()
+    assert stats['computed'] == 1
+    assert stats['collapsed'] == 2
+    assert stats['in_flight'] == 0
+    assert stats['entries'] == 0
+
+    await cleanup(vehicle, cucs)
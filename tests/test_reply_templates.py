@@ -0,0 +1,77 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import logging
+
+from stanag4586vsm.controllable_entity import ControllableEntity
+from stanag4586edav1.message01 import *
+from stanag4586edav1.message20 import *
+from stanag4586edav1.message21 import *
+from stanag4586edav1.message300 import *
+from stanag4586edav1.message_wrapper import *
+
+from .helpers import CUCS_ID, NullLoop
+
+
+def make_request(instance_id, cucs_id = CUCS_ID):
+    """The wrapper and Message 01 a reply answers, only the instance id and cucs id are read"""
+
+    wrapper = MessageWrapper(MessageWrapper.MSGNULL)
+    wrapper.msg_instance_id = instance_id
+    msg = Message01(Message01.MSGNULL)
+    msg.cucs_id = cucs_id
+    return wrapper, msg
+
+
+def create_entity():
+    entity = ControllableEntity(NullLoop(), logging.ERROR, 0x1, 0, 3, 2, 1, lambda data: None)
+    entity.set_payload_type(Message300.PAYLOAD_TYPE_EOIR)
+    return entity
+
+
+def test_replies_carry_the_fields_of_the_request_and_the_station():
+
+    entity = create_entity()
+
+    reply = entity.build_reply_21(*make_request(9))
+    wrapper = MessageWrapper.from_buffer_copy(reply)
+    msg21 = Message21.from_buffer_copy(reply, MessageWrapper.MSGLEN)
+
+    assert wrapper.message_type == 21
+    assert wrapper.msg_instance_id == 9
+    assert msg21.vehicle_id == 3
+    assert msg21.controlled_station == 0x1
+    assert msg21.vehicle_type == 2
+    assert msg21.vehicle_sub_type == 1
+    assert msg21.cucs_id & 0xFFFFFFFF == CUCS_ID
+    assert msg21.loi_granted == 0
+    assert msg21.loi_authorized == Message01.LOI_02 | Message01.LOI_05
+
+    # the template is reused, the next reply carries its own request fields
+    reply = entity.build_reply_300(*make_request(10, 0xA0))
+    assert MessageWrapper.from_buffer_copy(reply).msg_instance_id == 10
+    assert Message300.from_buffer_copy(reply, MessageWrapper.MSGLEN).cucs_id == 0xA0
+    assert Message300.from_buffer_copy(reply, MessageWrapper.MSGLEN).payload_type == Message300.PAYLOAD_TYPE_EOIR
+
+
+def test_changes_of_the_station_rebuild_the_templates():
+
+    entity = create_entity()
+    template = entity.get_reply_template(20)
+    assert entity.get_reply_template(20) is template
+
+    entity.set_vehicle_meta(tail_number = 'TAIL-7')
+    msg20 = Message20.from_buffer_copy(entity.build_reply_20(*make_request(1)), MessageWrapper.MSGLEN)
+    assert msg20.get_tail_number() == 'TAIL-7'
+
+    entity.set_loi_state(0xB0, [0xB0])
+    msg21 = Message21.from_buffer_copy(entity.build_reply_21(*make_request(1, 0xB0)), MessageWrapper.MSGLEN)
+    assert msg21.loi_granted == Message01.LOI_05 | Message01.LOI_02
+    assert msg21.controlled_station_mode == 1
+
+    # another cucs may only monitor while the station is controlled
+    msg21 = Message21.from_buffer_copy(entity.build_reply_21(*make_request(1, 0xA0)), MessageWrapper.MSGLEN)
+    assert msg21.loi_granted == 0
+    assert msg21.loi_authorized == Message01.LOI_02
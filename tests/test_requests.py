@@ -0,0 +1,89 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+
+import pytest
+
+from stanag4586vsm.stanag_server import *
+from stanag4586vsm.query_cache import get_query_response
+from stanag4586edav1.message20010 import Message20010
+
+from .helpers import CUCS_ID, cleanup, create_cucs_server, create_vehicle_server
+
+
+async def test_concurrent_requests_resolve_with_their_own_replies():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1, 2, 3)
+    cucs = await create_cucs_server(bus)
+    controller = cucs.get_entity_controller()
+
+    replies = await asyncio.gather(*[controller.control_request_async(0x1, vehicle_id) for vehicle_id in (1, 2, 3)])
+
+    assert [msg.vehicle_id for msg in replies] == [1, 2, 3]
+    assert all(msg.controlled_station == 0x1 for msg in replies)
+    assert all(msg.cucs_id & 0xFFFFFFFF == CUCS_ID for msg in replies)
+    assert controller.get_request_stats() == {'sent': 3, 'completed': 3, 'retransmits': 0, 'timeouts': 0, 'in_flight': 0}
+
+    await cleanup(vehicle, cucs)
+
+
+async def test_lost_request_is_retransmitted():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1)
+    cucs = await create_cucs_server(bus)
+    controller = cucs.get_entity_controller()
+
+    # the vehicle misses the first LOI request
+    dropped = []
+    def drop_first_request(message_type, vehicle_id, station_id):
+        if message_type == 1 and station_id == 0x1 and not dropped:
+            dropped.append(message_type)
+            return False
+        return True
+    vehicle.add_rx_filter(drop_first_request)
+
+    msg = await controller.monitor_request_async(0x1, 1, timeout=0.05, retries=2)
+
+    assert msg.controlled_station == 0x1
+    assert dropped == [1]
+    assert controller.get_request_stats()['retransmits'] == 1
+    assert controller.get_request_stats()['completed'] == 1
+
+    await cleanup(vehicle, cucs)
+
+
+async def test_unanswered_request_times_out_after_the_retries():
+
+    bus = LoopbackBus(logging.ERROR)
+    cucs = await create_cucs_server(bus)
+    controller = cucs.get_entity_controller()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await controller.control_request_async(0x1, 42, timeout=0.02, retries=1)
+
+    assert controller.get_request_stats() == {'sent': 1, 'completed': 0, 'retransmits': 1, 'timeouts': 1, 'in_flight': 0}
+
+    await cleanup(cucs)
+
+
+async def test_query_is_answered_by_the_registered_handler():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1)
+    cucs = await create_cucs_server(bus)
+
+    vehicle.get_entity('eo', 1).register_query_handler(
+        Message20010.QUERY_TYPE_SEND_CONFIG, lambda entity, msg: '{"stream": "rtsp://10.0.0.1/eo"}')
+
+    msg = await cucs.get_entity_controller().query_request_async(1, 0x1)
+
+    assert msg.station_number == 0x1
+    assert get_query_response(msg) == '{"stream": "rtsp://10.0.0.1/eo"}'
+
+    await cleanup(vehicle, cucs)
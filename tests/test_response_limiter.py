@@ -0,0 +1,81 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import logging
+
+from stanag4586vsm.stanag_server import *
+from stanag4586vsm.response_limiter import DiscoveryResponseLimiter, TokenBucket
+
+from .helpers import CUCS_ID, ManualLoop, cleanup, create_cucs_server, create_vehicle_server, wait_for
+
+
+def test_token_bucket_refills_at_its_rate():
+
+    bucket = TokenBucket(100, 50, 0.0)
+    assert bucket.consume(50, 0.0)
+    assert not bucket.consume(1, 0.0)
+    assert bucket.consume(10, 0.1)
+    # never holds more than its capacity
+    assert not bucket.consume(51, 10.0)
+    assert bucket.consume(50, 10.0)
+
+
+def test_a_station_answers_a_cucs_once_per_interval():
+
+    loop = ManualLoop()
+    limiter = DiscoveryResponseLimiter(loop, logging.ERROR, lambda data: None, min_interval = 1.0)
+
+    assert limiter.allow(CUCS_ID, 1, 0x1)
+    assert not limiter.allow(CUCS_ID, 1, 0x1)
+    # other stations and other cucs are not affected
+    assert limiter.allow(CUCS_ID, 1, 0x2)
+    assert limiter.allow(0xA0, 1, 0x1)
+
+    loop.now = 1.0
+    assert limiter.allow(CUCS_ID, 1, 0x1)
+
+    stats = limiter.get_stats()
+    assert stats['requests'] == 5
+    assert stats['suppressed'] == 1
+
+
+def test_rate_limit_drops_whole_stations_which_answer_the_next_discovery():
+
+    loop = ManualLoop()
+    sent = []
+    limiter = DiscoveryResponseLimiter(loop, logging.ERROR, sent.append, min_interval = 1.0, rate = 100, burst = 100)
+
+    for station_id in (1, 2, 3):
+        assert limiter.allow(CUCS_ID, 1, station_id)
+        limiter.submit(CUCS_ID, 1, station_id, [bytes([station_id]) * 30, bytes([station_id]) * 10])
+    loop.run()
+
+    # two stations fit in the burst, the third is dropped with both its replies
+    assert [data[0] for data in sent] == [1, 1, 2, 2]
+    stats = limiter.get_stats()
+    assert stats['dropped'] == 1
+    assert stats['batches'] == 1
+    assert stats['datagrams_sent'] == 4
+    assert stats['bytes_sent'] == 80
+
+    assert not limiter.allow(CUCS_ID, 1, 1)
+    assert limiter.allow(CUCS_ID, 1, 3)
+
+
+async def test_repeated_discoveries_are_suppressed_on_the_server():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1, discovery_response_options = {'min_interval': 60.0})
+    cucs = await create_cucs_server(bus)
+    await wait_for(lambda: 1 in cucs.get_entity_controller().get_discovered_vehicles())
+
+    cucs.tx_data(cucs.get_discovery_scheduler().get_datagram())
+    await wait_for(lambda: vehicle.get_discovery_response_stats()['requests'] == 2 * len(DEFAULT_STATIONS))
+
+    stats = vehicle.get_discovery_response_stats()
+    assert stats['suppressed'] == len(DEFAULT_STATIONS)
+    assert stats['datagrams_sent'] == vehicle.get_tx_stats()['datagrams_sent']
+
+    await cleanup(vehicle, cucs)
@@ -0,0 +1,53 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+
+import pytest
+
+from stanag4586vsm.stanag_server import *
+
+from .helpers import CUCS_ID, cleanup, create_cucs_server, create_vehicle_server, wait_for
+
+
+async def test_unicast_reaches_only_the_addressed_station():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1, 2)
+    cucs = await create_cucs_server(bus)
+    controller = cucs.get_entity_controller()
+    await wait_for(lambda: len(controller.get_discovered_vehicles()) == 2)
+
+    await controller.control_request_async(0x2, 2)
+
+    for vehicle_id in (1, 2):
+        for name, station_id, payload_type in DEFAULT_STATIONS:
+            controlling = vehicle.get_entity(name, vehicle_id).getControllingCucs() & 0xFFFFFFFF
+            assert controlling == (CUCS_ID if (vehicle_id, station_id) == (2, 0x2) else 0)
+
+    await cleanup(vehicle, cucs)
+
+
+async def test_stations_added_and_removed_are_routed():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1)
+    cucs = await create_cucs_server(bus)
+    controller = cucs.get_entity_controller()
+    await wait_for(lambda: 1 in controller.get_discovered_vehicles())
+
+    vehicle.remove_entity('eo', 1)
+    assert vehicle.get_entity('eo', 1) is None
+    with pytest.raises(asyncio.TimeoutError):
+        await controller.control_request_async(0x1, 1, timeout=0.02, retries=0)
+
+    vehicle.add_vehicle(7)
+    msg = await controller.control_request_async(0x1, 7)
+
+    assert msg.vehicle_id == 7
+    assert vehicle.get_entity('eo', 7).getControllingCucs() & 0xFFFFFFFF == CUCS_ID
+
+    await cleanup(vehicle, cucs)
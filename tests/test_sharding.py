@@ -0,0 +1,77 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import logging
+import struct
+
+import pytest
+
+from stanag4586vsm.stanag_server import *
+from stanag4586vsm.sharded_server import ShardedStanagServer
+from stanag4586vsm.shard_transport import ShardedTransport, VEHICLE_ID_OFFSETS, get_shard_index
+
+from .helpers import CUCS_ID, RecordingTransport, cleanup, create_cucs_server, create_vehicle_server, make_datagram, wait_for
+
+"""Ports of the two shards, the replies go out on a port outside of them"""
+SHARD_PORTS = {'port_rx': 4586, 'port_tx': 4600}
+
+
+def make_request(vehicle_id):
+    """A Message 01 datagram addressed to vehicle_id, the rest of the body is zeroed"""
+    offset = VEHICLE_ID_OFFSETS[1] - MessageWrapper.MSGLEN
+    return make_datagram(1, b'\x00' * offset + struct.pack('>I', vehicle_id) + b'\x00' * 16)
+
+
+def test_datagrams_are_written_to_the_shard_of_their_vehicle():
+
+    shards = [RecordingTransport() for _ in range(3)]
+    transport = ShardedTransport(shards)
+
+    for vehicle_id in range(6):
+        transport.sendto(make_request(vehicle_id))
+    transport.sendto(make_request(0xFFFFFFFF))
+    transport.sendto(make_datagram(9999))
+
+    for shard_index, shard in enumerate(shards):
+        assert shard.sent[:2] == [make_request(shard_index), make_request(shard_index + 3)]
+        assert shard.sent[2:] == [make_request(0xFFFFFFFF), make_datagram(9999)]
+
+    assert get_shard_index(-1, 3) == 0xFFFFFFFF % 3
+
+
+async def test_each_shard_only_receives_the_traffic_of_its_vehicles():
+
+    bus = LoopbackBus(logging.ERROR)
+    shards = [
+        await create_vehicle_server(bus, *[vehicle_id for vehicle_id in range(1, 7) if vehicle_id % 2 == shard_index],
+            port_rx = SHARD_PORTS['port_rx'] + shard_index, port_tx = SHARD_PORTS['port_tx'])
+        for shard_index in range(2)
+    ]
+    cucs = await create_cucs_server(bus, vehicle_shards = 2, **SHARD_PORTS)
+    controller = cucs.get_entity_controller()
+
+    # the discovery is broadcast to both shards
+    await wait_for(lambda: len(controller.get_discovered_vehicles()) == 6)
+
+    for vehicle_id in range(1, 7):
+        msg = await controller.control_request_async(0x1, vehicle_id)
+        assert msg.cucs_id & 0xFFFFFFFF == CUCS_ID
+
+    for shard in shards:
+        stats = shard.get_rx_stats()
+        # the discovery and the requests for its three vehicles
+        assert stats['received'] == 4
+        assert stats['filtered'] == 0
+
+    await cleanup(cucs, *shards)
+
+
+async def test_reply_port_must_be_outside_of_the_shard_ports():
+
+    with pytest.raises(ValueError):
+        await create_cucs_server(LoopbackBus(logging.ERROR), vehicle_shards = 2)
+
+    with pytest.raises(ValueError):
+        ShardedStanagServer(logging.ERROR, 4).start(port_rx = 4586, port_tx = 4589)
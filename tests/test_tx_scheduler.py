@@ -0,0 +1,73 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import logging
+
+from stanag4586vsm.tx_scheduler import TxScheduler
+from stanag4586vsm.response_limiter import DiscoveryResponseLimiter
+
+from .helpers import CUCS_ID, ManualLoop, RecordingTransport, make_datagram, message_type_of
+
+
+def test_full_queue_drops_bulk_traffic_before_control_replies():
+
+    loop = ManualLoop()
+    transport = RecordingTransport()
+    scheduler = TxScheduler(loop, logging.ERROR, max_queue_size = 4)
+    scheduler.set_transport(transport)
+
+    for message_type in (302, 21, 302, 21, 21, 21, 302):
+        scheduler.enqueue(make_datagram(message_type))
+
+    stats = scheduler.get_stats()
+    assert stats['queue_depth'] == 4
+    assert stats['dropped'] == 3
+    assert stats['dropped_302'] == 3
+    assert 'dropped_21' not in stats
+
+    # with no bulk left to drop the oldest reply goes
+    scheduler.enqueue(make_datagram(1))
+    assert scheduler.get_stats()['dropped_21'] == 1
+
+    loop.run()
+    assert [message_type_of(data) for data in transport.sent] == [21, 21, 21, 1]
+
+
+def test_bulk_traffic_is_written_after_the_rest():
+
+    loop = ManualLoop()
+    transport = RecordingTransport()
+    scheduler = TxScheduler(loop, logging.ERROR)
+    scheduler.set_transport(transport)
+
+    for message_type in (302, 20900, 21, 302, 1):
+        scheduler.enqueue(make_datagram(message_type))
+
+    loop.run()
+
+    assert [message_type_of(data) for data in transport.sent] == [21, 1, 302, 20900, 302]
+    assert scheduler.get_stats()['dropped'] == 0
+
+
+def test_discovery_responses_are_written_in_the_iteration_of_their_batch():
+
+    loop = ManualLoop()
+    transport = RecordingTransport()
+    scheduler = TxScheduler(loop, logging.ERROR)
+    scheduler.set_transport(transport)
+    limiter = DiscoveryResponseLimiter(loop, logging.ERROR, scheduler.enqueue, callback_tx_flush = scheduler.flush)
+
+    for station_id in (1, 2):
+        assert limiter.allow(CUCS_ID, 1, station_id)
+        limiter.submit(CUCS_ID, 1, station_id, [make_datagram(21), make_datagram(300)])
+
+    # one iteration runs the batch of the limiter, the scheduler writes it without deferring it again
+    loop.run()
+
+    assert [message_type_of(data) for data in transport.sent] == [21, 300, 21, 300]
+    assert scheduler.get_stats()['flushes'] == 1
+
+    loop.run()
+    assert scheduler.get_stats()['flushes'] == 1
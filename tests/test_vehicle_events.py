@@ -0,0 +1,39 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+import asyncio
+import logging
+
+from stanag4586vsm.stanag_server import *
+from stanag4586vsm.vehicle_registry import EVENT_LOI_CHANGED, EVENT_STATION_CHANGED
+
+from .helpers import cleanup, create_cucs_server, create_vehicle_server
+
+
+async def test_repeated_discovery_raises_no_loi_change_for_new_stations():
+
+    bus = LoopbackBus(logging.ERROR)
+    vehicle = await create_vehicle_server(bus, 1)
+    cucs = await create_cucs_server(bus)
+
+    controller = cucs.get_entity_controller()
+    events = []
+    controller.add_listener_for_vehicle_events(lambda controller, batch: events.extend(batch))
+
+    await asyncio.sleep(0.05)
+    first_events = list(events)
+    del events[:]
+
+    # the Message 21 of every station now precedes a known station
+    cucs.tx_data(cucs.get_discovery_scheduler().get_datagram())
+    await asyncio.sleep(0.05)
+
+    stations = controller.get_discovered_vehicles()[1].stations
+    await cleanup(cucs, vehicle)
+
+    assert any(event.kind == EVENT_STATION_CHANGED for event in first_events)
+    assert not any(event.kind == EVENT_LOI_CHANGED for event in first_events + events)
+    assert len(stations) > 0
+    assert all(station.controllable for station in stations.values())
@@ -0,0 +1,79 @@
+"""
+ Copyright (c) 2021 Faisal Thaheem (https://github.com/faisalthaheem/python-stanag-4586-EDA-v1)
+ License GNU GENERAL PUBLIC LICENSE Version 3, 29 June 2007
+"""
+
+from stanag4586vsm.vehicle_registry import *
+
+
+def test_indexes_follow_the_updates():
+
+    registry = VehicleRegistry()
+    first, created = registry.add_vehicle(1)
+    assert created
+    assert registry.add_vehicle(1) == (first, False)
+    second, _ = registry.add_vehicle(2)
+
+    assert registry.update_vehicle_type(first, 7, 1)
+    assert not registry.update_vehicle_type(first, 7, 1)
+    registry.update_vehicle_type(second, 7, 2)
+    assert registry.get_vehicles_by_type(7) == {1, 2}
+    assert registry.get_vehicles_by_type(None) == frozenset()
+
+    registry.update_vehicle_type(second, 8, 2)
+    assert registry.get_vehicles_by_type(7) == {1}
+
+    assert registry.update_vehicle_loi(first, True, True, True)
+    assert not registry.update_vehicle_loi(first, True, True, True)
+    assert registry.get_controlled_vehicles() == {1}
+    assert registry.get_monitored_vehicles() == {1}
+
+    registry.remove_vehicle(1)
+    assert 1 not in registry
+    assert registry.get_vehicles_by_type(7) == frozenset()
+    assert registry.get_controlled_vehicles() == frozenset()
+    assert registry.remove_vehicle(1) is None
+
+
+def test_snapshots_are_immutable_and_rebuilt_only_on_change():
+
+    registry = VehicleRegistry()
+    record, _ = registry.add_vehicle(1)
+    station, changed = registry.update_station(record, 0x1, 2)
+    assert changed
+    assert registry.update_station(record, 0x1, 2) == (station, False)
+
+    snapshot = registry.snapshot()
+    assert registry.snapshot() is snapshot
+    version = registry.get_version()
+
+    registry.update_station_loi(record, station, True, True, False)
+    later = registry.snapshot()
+
+    assert registry.get_version() == version + 1
+    # the earlier snapshot still shows the state it was taken at
+    assert not snapshot[1].stations[0x1].controlled
+    assert later[1].stations[0x1].controlled
+    assert registry.view(1) is later[1]
+
+    registry.remove_station(record, 0x1)
+    assert registry.snapshot()[1].stations == {}
+
+
+def test_views_accept_the_legacy_keys():
+
+    registry = VehicleRegistry()
+    record, _ = registry.add_vehicle(1)
+    registry.update_vehicle_type(record, 7, 3)
+    station, _ = registry.update_station(record, 0x2, 4)
+    registry.update_station_loi(record, station, True, False, True)
+
+    view = registry.view(1)
+    assert view[KEY_META] is None
+    assert view[KEY_TYPE] == 7
+    assert view[KEY_SUB_TYPE] == 3
+    assert view[KEY_STATIONS][0x2][KEY_MONITORED]
+    assert view[KEY_STATIONS][0x2][KEY_CONTROLLABLE]
+
+    registry.update_vehicle_meta(record, 'CALL', 'MISSION', 'TAIL')
+    assert registry.view(1)[KEY_META] == {KEY_CALL_SIGN: 'CALL', KEY_MISSION_ID: 'MISSION', KEY_TAIL_NUMBER: 'TAIL'}